@@ -1,3 +1,5 @@
 # __init__.py
 
-from .gpt import Gpt
\ No newline at end of file
+from .gpt import Gpt
+from .errors import GptError, GptTimeoutError, GptRateLimitError, GptUnavailableError, GptResponseError
+from .usage import UsageStats, set_usage_context
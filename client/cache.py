@@ -0,0 +1,190 @@
+# cache.py - кэш ответов GPT для детерминированных промптов
+#
+# Некоторые промпты - чистые функции своих входных данных (метрики и ресурсы по описанию мира),
+# и один и тот же промпт приходит повторно: для миров из пула, при повторах, в тестах.
+# Такие ответы берём из кэша: сначала из LRU в памяти, затем из SQLite-файла на диске, если он задан
+# (GPT_CACHE_PATH). Файл открывается при первом обращении к кэшу, а не при создании клиента GPT.
+# Ключ - хэш (модель, температура, сообщения, max_tokens, формат ответа). Кэш включается
+# для каждого вызова отдельно: Gpt.prompt(..., cache=True).
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько ответов держим в памяти
+GPT_CACHE_SIZE = int(os.getenv("GPT_CACHE_SIZE", 1000))
+# Сколько ответов держим на диске
+GPT_CACHE_DISK_SIZE = int(os.getenv("GPT_CACHE_DISK_SIZE", 100000))
+# Сколько секунд ответ считается свежим (по умолчанию неделя)
+GPT_CACHE_TTL = float(os.getenv("GPT_CACHE_TTL", 7 * 24 * 3600))
+# Файл кэша на диске, например /var/cache/bot/gpt_cache.sqlite (пусто - только память)
+GPT_CACHE_PATH = os.getenv("GPT_CACHE_PATH", "")
+
+
+def make_cache_key(model, temperature, messages, max_tokens, response_format=None):
+    """Хэш всего, от чего зависит ответ GPT."""
+    payload = json.dumps(
+        [model, temperature, messages, max_tokens, response_format],
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Хранилище на диске: одна таблица в SQLite
+class DiskStore:
+    def __init__(self, path, max_entries=GPT_CACHE_DISK_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS gpt_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS gpt_cache_accessed_idx ON gpt_cache (accessed_at)")
+        self._db.commit()
+
+    # Возвращает (value, created_at) или None
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM gpt_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._db.execute("UPDATE gpt_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        return row
+
+    def set(self, key, value, created_at):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO gpt_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, created_at, created_at)
+            )
+            # Вытесняем давно не использованные ответы сверх лимита
+            self._db.execute("""
+                DELETE FROM gpt_cache WHERE key IN (
+                    SELECT key FROM gpt_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM gpt_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResponseCache:
+    def __init__(self, max_entries=GPT_CACHE_SIZE, ttl=GPT_CACHE_TTL, path=GPT_CACHE_PATH):
+        """
+        :param max_entries: Сколько ответов держим в памяти
+        :param ttl: Сколько секунд ответ считается свежим
+        :param path: Файл SQLite для хранения на диске (None или пусто - только память), открывается при первом обращении
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path or None
+        self._memory = OrderedDict()
+        self._disk = None
+        self._disk_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    # Открываем файл на диске при первом обращении: клиент GPT создаётся при импорте, и файл не должен
+    # появляться у скриптов и тестов, которые кэшем не пользуются
+    def _open_disk(self):
+        with self._disk_lock:
+            if self._disk is None and self.path:
+                try:
+                    self._disk = DiskStore(self.path)
+                except sqlite3.Error as e:
+                    logger.warning(f"Не удалось открыть кэш GPT на диске ({self.path}), работаем только в памяти: {e}")
+                    self.path = None
+
+        return self._disk
+
+    async def _disk_store(self):
+        if self._disk is None and self.path:
+            await asyncio.to_thread(self._open_disk)
+        return self._disk
+
+    def _fresh(self, created_at):
+        return time.time() - created_at < self.ttl
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key):
+        """Ответ из кэша или None."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if self._fresh(entry[1]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self._memory[key]
+
+        disk = await self._disk_store()
+        if disk is not None:
+            row = await asyncio.to_thread(disk.get, key)
+            if row is not None:
+                if self._fresh(row[1]):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+                await asyncio.to_thread(disk.delete, key)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, value):
+        created_at = time.time()
+        self._remember(key, value, created_at)
+
+        disk = await self._disk_store()
+        if disk is not None:
+            try:
+                await asyncio.to_thread(disk.set, key, value, created_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Не удалось записать ответ GPT в кэш на диске: {e}")
+
+    def stats(self):
+        """Счётчики кэша для логов и мониторинга."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from client.cache import ResponseCache, make_cache_key
+from client.gpt import Gpt
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    async def test_key_depends_on_every_parameter(self):
+        messages = [{"role": "user", "content": "мир"}]
+        key = make_cache_key("gpt-4o", 0.7, messages, 100)
+
+        self.assertEqual(key, make_cache_key("gpt-4o", 0.7, [{"role": "user", "content": "мир"}], 100))
+        self.assertNotEqual(key, make_cache_key("gpt-4o-mini", 0.7, messages, 100))
+        self.assertNotEqual(key, make_cache_key("gpt-4o", 0.2, messages, 100))
+        self.assertNotEqual(key, make_cache_key("gpt-4o", 0.7, messages, 200))
+
+    async def test_lru_eviction_and_counters(self):
+        cache = ResponseCache(max_entries=2, path=None)
+
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        await cache.get("a")  # "a" свежее "b"
+        await cache.set("c", "3")
+
+        self.assertIsNone(await cache.get("b"))
+        self.assertEqual(await cache.get("a"), "1")
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    async def test_ttl(self):
+        cache = ResponseCache(ttl=0.05, path=self.path)
+
+        await cache.set("a", "1")
+        self.assertEqual(await cache.get("a"), "1")
+
+        await asyncio.sleep(0.06)
+        self.assertIsNone(await cache.get("a"))
+        cache.close()
+
+    async def test_disk_survives_restart(self):
+        cache = ResponseCache(path=self.path)
+        await cache.set("a", "ответ")
+        cache.close()
+
+        cache = ResponseCache(path=self.path)
+        self.assertEqual(await cache.get("a"), "ответ")
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+        cache.close()
+
+    async def test_disk_file_is_opened_on_first_use(self):
+        cache = ResponseCache(path=self.path)
+        self.assertFalse(os.path.exists(self.path))  # Создание клиента GPT при импорте файл не трогает
+
+        self.assertIsNone(await cache.get("a"))
+        self.assertTrue(os.path.exists(self.path))
+        cache.close()
+
+    async def test_prompt_is_cached_only_on_request(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0, cache=ResponseCache(path=None))
+        calls = []
+
+        async def create(**params):
+            calls.append(params)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=f"ответ {len(calls)}"))],
+                usage=None
+            )
+
+        gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        self.assertEqual(await gpt.prompt("метрики", 10, cache=True), "ответ 1")
+        self.assertEqual(await gpt.prompt("метрики", 10, cache=True), "ответ 1")
+        self.assertEqual(await gpt.prompt("метрики", 10), "ответ 2")
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+# errors.py - типизированные ошибки клиента GPT
+#
+# Вместо строк "Произошла ошибка..." вызывающий получает исключение и сам решает, что показать игроку.
+
+
+class GptError(Exception):
+    """Запрос к GPT не удался."""
+
+
+class GptTimeoutError(GptError):
+    """Запрос к GPT не уложился в отведённое время."""
+
+
+class GptRateLimitError(GptError):
+    """GPT отвечает 429 и после всех повторов."""
+
+
+class GptUnavailableError(GptError):
+    """GPT недоступен: ошибки сети или 5xx после всех повторов."""
+
+
+class GptResponseError(GptError):
+    """Запрос отклонён (4xx) или GPT вернул пустой ответ. Повторять бессмысленно."""
@@ -1,17 +1,367 @@
-from openai import AsyncOpenAI
+# gpt.py - клиент GPT
+#
+# Все запросы идут через общие ограничения:
+#  - не больше GPT_MAX_CONCURRENCY запросов одновременно (семафор),
+#  - не больше GPT_RPM запросов и GPT_TPM токенов в минуту (ведра с токенами),
+#  - 429, 5xx и ошибки сети повторяются с экспоненциальной задержкой и случайным разбросом,
+#  - у каждого вызова есть общий дедлайн, включая повторы,
+#  - по желанию: если ответа нет дольше GPT_HEDGE_AFTER секунд, отправляется дублирующий запрос
+#    и берётся тот ответ, что придёт первым.
+# Модель, температура и потолок токенов выбираются по классу задачи (client.routing): Gpt.chat(..., task=...).
+# Ответы на детерминированные промпты можно брать из кэша (client.cache): Gpt.prompt(..., cache=True).
+# После каждого вызова в лог пишется, сколько входных токенов пришло из кэша провайдера (см. prompts.py),
+# а токены, время ответа и результат записываются в статистику (client.usage).
+# Ошибки поднимаются как исключения из client.errors.
+
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, RateLimitError
+
+from .cache import ResponseCache, make_cache_key
+from .errors import GptError, GptRateLimitError, GptResponseError, GptTimeoutError, GptUnavailableError
+from .rate_limit import RateLimiter
+from .routing import ModelRouter
+from .usage import UsageStats
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько запросов к GPT может идти одновременно
+GPT_MAX_CONCURRENCY = int(os.getenv("GPT_MAX_CONCURRENCY", 8))
+# Лимиты аккаунта OpenAI: запросов и токенов в минуту (0 - без ограничения)
+GPT_RPM = int(os.getenv("GPT_RPM", 500))
+GPT_TPM = int(os.getenv("GPT_TPM", 30000))
+# Сколько раз повторяем запрос после 429, 5xx и ошибок сети
+GPT_MAX_RETRIES = int(os.getenv("GPT_MAX_RETRIES", 3))
+# Задержка перед повтором: случайная от 0 до min(GPT_BACKOFF_MAX, GPT_BACKOFF_BASE * 2^попытка), секунды
+GPT_BACKOFF_BASE = float(os.getenv("GPT_BACKOFF_BASE", 1.0))
+GPT_BACKOFF_MAX = float(os.getenv("GPT_BACKOFF_MAX", 20.0))
+# Дедлайн вызова вместе с повторами, секунды
+GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", 90))
+# Дедлайн потоковой генерации целиком, секунды
+GPT_STREAM_TIMEOUT = float(os.getenv("GPT_STREAM_TIMEOUT", 180))
+# Через сколько секунд без ответа отправлять дублирующий запрос (0 - не отправлять)
+GPT_HEDGE_AFTER = float(os.getenv("GPT_HEDGE_AFTER", 0))
+
+
+# Грубая оценка токенов запроса: ~3 символа на токен для русского текста плюс максимум ответа.
+# OpenAI сам считает max_tokens в лимит TPM, поэтому резервируем его целиком, а после ответа поправляем
+def estimate_tokens(messages, max_tokens):
+    return sum(len(message["content"]) for message in messages) // 3 + max_tokens
+
+
+# Переводим ошибку OpenAI в нашу: (класс ошибки, можно ли повторить)
+def classify_error(error):
+    if isinstance(error, RateLimitError):
+        return GptRateLimitError, True
+    if isinstance(error, APITimeoutError):
+        return GptTimeoutError, True
+    if isinstance(error, APIConnectionError):
+        return GptUnavailableError, True
+    if isinstance(error, APIStatusError):
+        if error.status_code >= 500 or error.status_code in (408, 409):
+            return GptUnavailableError, True
+        return GptResponseError, False
+    return GptError, False
+
 
 class Gpt:
-    def __init__(self, api_key):
-        self.client = AsyncOpenAI(api_key=api_key)
-        self.model = "gpt-4o"
-        self.temperature=0.7
-
-    async def prompt(self, prompt, max_tokens):
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=self.temperature
+    def __init__(self, api_key, max_concurrency=GPT_MAX_CONCURRENCY, rpm=GPT_RPM, tpm=GPT_TPM,
+                 max_retries=GPT_MAX_RETRIES, timeout=GPT_TIMEOUT, hedge_after=GPT_HEDGE_AFTER, cache=None, usage=None, router=None):
+        # Повторы и таймауты делаем сами, встроенные в SDK отключаем
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+
+        # Модель и температура для каждого класса задачи
+        self.router = router if router is not None else ModelRouter()
+
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.in_flight = 0  # Сколько запросов к GPT идёт прямо сейчас
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._limiter = RateLimiter(rpm, tpm)
+
+        # Кэш ответов; используется только для вызовов с cache=True
+        self.cache = cache if cache is not None else ResponseCache()
+
+        # Входные токены за всё время и сколько из них пришло из кэша провайдера
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+        # Токены и время ответа по каждому вызову: для /stats, метрик и таблицы gpt_usage
+        self.usage = usage if usage is not None else UsageStats()
+
+    # Промпт одним сообщением пользователя
+    async def prompt(self, prompt, max_tokens, response_format=None, timeout=None, hedge_after=None, cache=False, task=None):
+        return await self.chat(
+            [{"role": "user", "content": prompt}],
+            max_tokens,
+            response_format=response_format,
+            timeout=timeout,
+            hedge_after=hedge_after,
+            cache=cache,
+            task=task
         )
 
-        return response.choices[0].message.content.strip()
\ No newline at end of file
+    async def chat(self, messages, max_tokens, response_format=None, timeout=None, hedge_after=None, cache=False,
+                   name="prompt", task=None, validate=None):
+        """
+        Отправляет сообщения и возвращает текст ответа.
+
+        :param messages: Сообщения [{"role": ..., "content": ...}], например PromptTemplate.render(...)
+        :param max_tokens: Максимум токенов в ответе
+        :param response_format: JSON-mode / structured outputs: {"type": "json_object"} или {"type": "json_schema", ...}
+        :param timeout: Дедлайн вызова вместе с повторами, секунды (по умолчанию GPT_TIMEOUT)
+        :param hedge_after: Через сколько секунд отправить дублирующий запрос (по умолчанию GPT_HEDGE_AFTER, 0 - не отправлять)
+        :param cache: Брать ответ из кэша и класть в него. Только для промптов, ответ на которые
+                      можно переиспользовать для тех же входных данных
+        :param name: Имя запроса для логов и статистики (PromptTemplate.name)
+        :param task: Класс задачи для выбора модели (client.routing), None - маршрут по умолчанию
+        :param validate: Проверка ответа, например разбор по схеме. Если она поднимает исключение,
+                         запрос повторяется на запасном маршруте; если запасного нет - поднимается GptResponseError.
+                         В кэш попадают только ответы, прошедшие проверку
+        :return: Текст ответа
+        :raises GptError: Если ответ не получен
+        """
+        route = self.router.route(task)
+
+        if hedge_after is None:
+            hedge_after = self.hedge_after
+
+        cache_key = None
+        if cache:
+            started = time.monotonic()
+            cache_key = make_cache_key(route.model, route.temperature, messages, max_tokens, response_format)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                self.usage.record(name, route.model, "cache", time.monotonic() - started)
+                return cached
+
+        while True:
+            content = await self._complete(route, messages, max_tokens, response_format, timeout, hedge_after, name)
+            if validate is None:
+                break
+
+            try:
+                validate(content)
+                break
+            except Exception as e:
+                if route.fallback is None:
+                    raise GptResponseError(f"Ответ GPT {name} не прошёл проверку: {e}") from e
+
+                fallback = self.router.route(route.fallback)
+                logger.warning(f"Ответ GPT {name} от {route.model} не прошёл проверку ({e}), повторяем на {fallback.model}.")
+                self.usage.record_fallback(name)
+                route = fallback
+
+        if cache_key is not None:
+            await self.cache.set(cache_key, content)
+
+        return content
+
+    # Один вызов по маршруту: повторы, дублирование, учёт расхода
+    async def _complete(self, route, messages, max_tokens, response_format, timeout, hedge_after, name):
+        params = {
+            "model": route.model,
+            "temperature": route.temperature,
+            "messages": messages,
+            "max_tokens": route.limit(max_tokens),
+        }
+        if response_format is not None:
+            params["response_format"] = response_format
+
+        started = time.monotonic()
+        deadline = started + (timeout or self.timeout)
+        try:
+            response = await self._with_retries(lambda: self._hedged(params, hedge_after), deadline)
+        except GptError:
+            self.usage.record(name, route.model, "error", time.monotonic() - started)
+            raise
+
+        self._log_usage(name, response.usage)
+        self.usage.record(name, route.model, "ok", time.monotonic() - started, response.usage)
+
+        content = response.choices[0].message.content
+        if not content:
+            raise GptResponseError("GPT вернул пустой ответ.")
+
+        return content.strip()
+
+    # Потоковый вариант prompt: отдаёт куски текста по мере генерации
+    async def prompt_stream(self, prompt, max_tokens, timeout=None, task=None):
+        async for chunk in self.chat_stream([{"role": "user", "content": prompt}], max_tokens, timeout=timeout, task=task):
+            yield chunk
+
+    # Потоковый вариант chat: отдаёт куски текста по мере генерации.
+    # Повторяется только открытие потока - после первого куска ошибка уходит вызывающему
+    async def chat_stream(self, messages, max_tokens, timeout=None, name="prompt", task=None):
+        route = self.router.route(task)
+        params = {
+            "model": route.model,
+            "temperature": route.temperature,
+            "messages": messages,
+            "max_tokens": route.limit(max_tokens),
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        started = time.monotonic()
+        deadline = started + (timeout or GPT_STREAM_TIMEOUT)
+        usage = None
+
+        try:
+            stream, estimate, slot = await self._with_retries(lambda: self._open_stream(params), deadline)
+            async with slot:
+                chunks = stream.__aiter__()
+
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    except (asyncio.TimeoutError, TimeoutError):
+                        raise GptTimeoutError("GPT не закончил генерацию вовремя.") from None
+                    except Exception as e:
+                        error_class, _ = classify_error(e)
+                        raise error_class(str(e)) from e
+
+                    # Последний служебный чанк приходит без choices, но с usage
+                    if chunk.usage:
+                        usage = chunk.usage
+                        self._limiter.adjust(usage.total_tokens - estimate)
+                        self._log_usage(name, usage)
+
+                    if not chunk.choices:
+                        continue
+
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+        except GptError:
+            self.usage.record(name, route.model, "error", time.monotonic() - started)
+            raise
+
+        self.usage.record(name, route.model, "ok", time.monotonic() - started, usage)
+
+    # Пишем в лог расход токенов и долю входных токенов из кэша провайдера
+    def _log_usage(self, name, usage):
+        if usage is None:
+            return
+
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+        self.prompt_tokens += usage.prompt_tokens
+        self.cached_tokens += cached
+
+        share = cached / usage.prompt_tokens * 100 if usage.prompt_tokens else 0
+        logger.info(
+            f"GPT {name}: входных токенов {usage.prompt_tokens}, из кэша {cached} ({share:.0f}%), "
+            f"ответ {usage.completion_tokens} токенов."
+        )
+
+    # Место для запроса: ждём лимиты RPM/TPM и свободный слот семафора
+    @asynccontextmanager
+    async def _slot(self, params):
+        estimate = estimate_tokens(params["messages"], params["max_tokens"])
+        await self._limiter.acquire(estimate)
+
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                yield estimate
+            finally:
+                self.in_flight -= 1
+
+    async def _create(self, params):
+        return await self.client.chat.completions.create(**params)
+
+    # Открываем поток со своим слотом, как _send: пауза перед повтором слот не держит, каждая попытка
+    # заново проходит лимиты. Открытый поток забирает слот с собой - вызывающий отпускает его, дочитав поток
+    async def _open_stream(self, params):
+        async with AsyncExitStack() as stack:
+            estimate = await stack.enter_async_context(self._slot(params))
+            stream = await self._create(params)
+            return stream, estimate, stack.pop_all()
+
+    # Один запрос со своим слотом
+    async def _send(self, params):
+        async with self._slot(params) as estimate:
+            response = await self._create(params)
+
+        if response.usage:
+            self._limiter.adjust(response.usage.total_tokens - estimate)
+
+        return response
+
+    # Запрос с дублированием: если ответа долго нет, отправляем второй и берём первый пришедший
+    async def _hedged(self, params, hedge_after):
+        first = asyncio.ensure_future(self._send(params))
+        tasks = [first]
+
+        try:
+            if not hedge_after:
+                return await first
+
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+
+            # Свободных слотов нет - дубль только усугубит очередь
+            if not done and not self._semaphore.locked():
+                logger.info(f"GPT не ответил за {hedge_after} с, отправляем дублирующий запрос.")
+                tasks.append(asyncio.ensure_future(self._send(params)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # Повторяем вызов при 429, 5xx и ошибках сети, пока не выйдет дедлайн
+    async def _with_retries(self, call, deadline):
+        attempt = 0
+
+        while True:
+            try:
+                return await asyncio.wait_for(call(), deadline - time.monotonic())
+            except (asyncio.TimeoutError, TimeoutError):
+                raise GptTimeoutError("GPT не ответил вовремя.") from None
+            except GptError:
+                raise
+            except Exception as e:
+                error_class, retryable = classify_error(e)
+                delay = self._retry_delay(e, attempt)
+
+                if not retryable or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    raise error_class(str(e)) from e
+
+                attempt += 1
+                logger.warning(f"Ошибка запроса к GPT ({e.__class__.__name__}), повтор {attempt}/{self.max_retries} через {delay:.1f} с.")
+                await asyncio.sleep(delay)
+
+    # Задержка перед повтором: Retry-After от сервера или экспонента со случайным разбросом
+    @staticmethod
+    def _retry_delay(error, attempt):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+
+        try:
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+
+        return random.uniform(0, min(GPT_BACKOFF_MAX, GPT_BACKOFF_BASE * 2 ** attempt))
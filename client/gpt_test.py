@@ -0,0 +1,165 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from client import gpt as gpt_module
+from client.errors import GptRateLimitError, GptResponseError, GptTimeoutError
+from client.gpt import Gpt
+
+
+def make_response(text, cached_tokens=0):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(
+            prompt_tokens=8,
+            completion_tokens=2,
+            total_tokens=10,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)
+        )
+    )
+
+
+def make_status_error(error_class, status_code, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request, headers=headers or {})
+    return error_class("error", response=response, body=None)
+
+
+# Подменяем chat.completions.create: каждый вызов берёт следующий сценарий из списка
+def fake_client(gpt, scenarios):
+    calls = []
+
+    async def create(**params):
+        calls.append(params)
+        delay, result = scenarios[min(len(calls), len(scenarios)) - 1]
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return make_response(result)
+
+    gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return calls
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backoff_base = gpt_module.GPT_BACKOFF_BASE
+        gpt_module.GPT_BACKOFF_BASE = 0.01
+
+    def tearDown(self):
+        gpt_module.GPT_BACKOFF_BASE = self.backoff_base
+
+    async def test_retries_rate_limit_then_succeeds(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0)
+        calls = fake_client(gpt, [
+            (0, make_status_error(openai.RateLimitError, 429)),
+            (0, make_status_error(openai.InternalServerError, 503)),
+            (0, "ответ"),
+        ])
+
+        self.assertEqual(await gpt.prompt("привет", 10), "ответ")
+        self.assertEqual(len(calls), 3)
+
+    async def test_gives_up_after_max_retries(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0, max_retries=2)
+        calls = fake_client(gpt, [(0, make_status_error(openai.RateLimitError, 429))])
+
+        with self.assertRaises(GptRateLimitError):
+            await gpt.prompt("привет", 10)
+        self.assertEqual(len(calls), 3)
+
+    async def test_bad_request_is_not_retried(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0)
+        calls = fake_client(gpt, [(0, make_status_error(openai.BadRequestError, 400))])
+
+        with self.assertRaises(GptResponseError):
+            await gpt.prompt("привет", 10)
+        self.assertEqual(len(calls), 1)
+
+    async def test_deadline(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0)
+        fake_client(gpt, [(5, "поздно")])
+
+        started = time.monotonic()
+        with self.assertRaises(GptTimeoutError):
+            await gpt.prompt("привет", 10, timeout=0.1)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(gpt.in_flight, 0)
+
+    async def test_hedged_request_wins(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0)
+        calls = fake_client(gpt, [(5, "медленный"), (0, "быстрый")])
+
+        self.assertEqual(await gpt.prompt("привет", 10, hedge_after=0.05), "быстрый")
+        self.assertEqual(len(calls), 2)
+
+    async def test_concurrency_limit(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0, max_concurrency=2)
+        peak = 0
+
+        async def create(**params):
+            nonlocal peak
+            peak = max(peak, gpt.in_flight)
+            await asyncio.sleep(0.02)
+            return make_response("ок")
+
+        gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        await asyncio.gather(*[gpt.prompt("привет", 10) for _ in range(6)])
+        self.assertEqual(peak, 2)
+
+    async def test_cached_tokens_are_counted(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0)
+
+        async def create(**params):
+            return make_response("ок", cached_tokens=6)
+
+        gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        messages = [{"role": "system", "content": "инструкции"}, {"role": "user", "content": "мир"}]
+        await gpt.chat(messages, 10, name="test")
+        await gpt.chat(messages, 10, name="test")
+
+        self.assertEqual(gpt.prompt_tokens, 16)
+        self.assertEqual(gpt.cached_tokens, 12)
+
+    async def test_rate_limit_spaces_requests(self):
+        # 600 запросов в минуту = 10 в секунду, ведро на старте полное - ждать приходится после ёмкости
+        gpt = Gpt(api_key="test", rpm=600, tpm=0)
+        gpt._limiter.requests.tokens = 1
+        fake_client(gpt, [(0, "ок")])
+
+        started = time.monotonic()
+        await asyncio.gather(*[gpt.prompt("привет", 10) for _ in range(3)])
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    async def test_stream_retry_releases_slot_and_reacquires_limits(self):
+        gpt = Gpt(api_key="test", rpm=0, tpm=0, max_concurrency=1)
+        in_flight = []
+
+        async def acquire(estimate):
+            in_flight.append(gpt.in_flight)
+
+        async def chunks():
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="мир"))])
+
+        async def create(**params):
+            if len(in_flight) == 1:
+                raise make_status_error(openai.RateLimitError, 429)
+            return chunks()
+
+        gpt._limiter.acquire = acquire
+        gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        self.assertEqual([chunk async for chunk in gpt.prompt_stream("привет", 10)], ["мир"])
+        # Каждая попытка проходит лимиты заново, и к повтору слот первой попытки уже свободен
+        self.assertEqual(in_flight, [0, 0])
+        self.assertEqual(gpt.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
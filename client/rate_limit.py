@@ -0,0 +1,67 @@
+# rate_limit.py - ограничение частоты запросов к GPT по RPM и TPM
+#
+# Два "ведра с токенами": в одном запросы в минуту, в другом токены в минуту.
+# Ведра равномерно пополняются, и запрос уходит, только когда в обоих хватает места.
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # Через сколько секунд в ведре наберётся amount (0 - уже есть)
+    def wait_time(self, amount):
+        self._refill()
+        # Запрос больше ёмкости ведра ждёт, пока ведро наполнится целиком
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    def __init__(self, rpm, tpm):
+        """
+        :param rpm: Запросов в минуту (0 - без ограничения)
+        :param tpm: Токенов в минуту (0 - без ограничения)
+        """
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        """Ждёт, пока можно будет отправить запрос примерно на tokens токенов, и резервирует их."""
+        # Под блокировкой, чтобы ожидающие запросы уходили по очереди, а не все разом
+        async with self._lock:
+            while True:
+                delay = max(
+                    self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(tokens) if self.tokens else 0.0
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    def adjust(self, tokens):
+        """Поправка после ответа: сколько токенов потрачено сверх оценки (может быть меньше нуля)."""
+        if self.tokens:
+            self.tokens.take(tokens)
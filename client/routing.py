@@ -0,0 +1,66 @@
+# routing.py - выбор модели под задачу
+#
+# Каждая функция game_world.py объявляет класс задачи (task), а здесь класс задачи отображается
+# на модель, температуру и потолок токенов ответа:
+#  - structured: короткий JSON (метрики, ресурсы, изменения метрик) - дешёвая и быстрая модель,
+#  - prose: повествование (описание мира, персонаж, новости, разрешение хода) - большая модель.
+# Если ответ не прошёл проверку схемы (Gpt.chat(..., validate=...)), запрос повторяется
+# на запасном маршруте route.fallback - той же задаче на более сильной модели.
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+# Модель для структурированных шагов (короткий JSON)
+GPT_MODEL_STRUCTURED = os.getenv("GPT_MODEL_STRUCTURED", "gpt-4o-mini")
+# Модель для повествования и запасная модель для структурированных шагов
+GPT_MODEL_PROSE = os.getenv("GPT_MODEL_PROSE", "gpt-4o")
+
+# Классы задач
+TASK_STRUCTURED = "structured"
+TASK_STRUCTURED_STRONG = "structured_strong"  # Запасной маршрут для structured
+TASK_PROSE = "prose"
+
+
+# Маршрут: модель, температура, потолок токенов ответа и запасной класс задачи
+@dataclass(frozen=True)
+class ModelRoute:
+    model: str
+    temperature: float
+    max_tokens: Optional[int] = None  # None - без потолка, берётся max_tokens вызова
+    fallback: Optional[str] = None
+
+    def limit(self, max_tokens):
+        """Токены ответа: то, что просит вызов, но не больше потолка маршрута."""
+        if self.max_tokens is None:
+            return max_tokens
+
+        return min(max_tokens, self.max_tokens)
+
+
+GPT_ROUTES = {
+    TASK_STRUCTURED: ModelRoute(GPT_MODEL_STRUCTURED, 0.2, max_tokens=1500, fallback=TASK_STRUCTURED_STRONG),
+    TASK_STRUCTURED_STRONG: ModelRoute(GPT_MODEL_PROSE, 0.2, max_tokens=1500),
+    TASK_PROSE: ModelRoute(GPT_MODEL_PROSE, 0.7),
+}
+
+
+class ModelRouter:
+    def __init__(self, routes=None, default=TASK_PROSE):
+        self.routes = routes if routes is not None else GPT_ROUTES
+        self.default = default
+
+    def route(self, task=None):
+        """
+        Маршрут для класса задачи.
+
+        :param task: Класс задачи (TASK_STRUCTURED, TASK_PROSE, ...); None - маршрут по умолчанию
+        :return: ModelRoute
+        :raises ValueError: Если класс задачи не настроен
+        """
+        task = task or self.default
+
+        try:
+            return self.routes[task]
+        except KeyError:
+            raise ValueError(f"Нет маршрута для класса задачи {task!r}.") from None
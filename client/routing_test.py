@@ -0,0 +1,71 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+from client.cache import ResponseCache
+from client.errors import GptResponseError
+from client.gpt import Gpt
+from client.routing import ModelRoute, ModelRouter
+from client.usage import UsageStats
+
+ROUTES = {
+    "structured": ModelRoute("small", 0.2, max_tokens=100, fallback="structured_strong"),
+    "structured_strong": ModelRoute("large", 0.2, max_tokens=100),
+    "prose": ModelRoute("large", 0.7),
+}
+
+
+def make_gpt(answers):
+    gpt = Gpt(api_key="test", rpm=0, tpm=0, cache=ResponseCache(path=None), usage=UsageStats(), router=ModelRouter(ROUTES))
+    calls = []
+
+    async def create(**params):
+        calls.append(params)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=answers[params["model"]]))],
+            usage=None
+        )
+
+    gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return gpt, calls
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_task_selects_model_temperature_and_token_limit(self):
+        gpt, calls = make_gpt({"small": "{}", "large": "текст"})
+        messages = [{"role": "user", "content": "мир"}]
+
+        await gpt.chat(messages, 1500, task="structured")
+        await gpt.chat(messages, 800)
+
+        self.assertEqual((calls[0]["model"], calls[0]["temperature"], calls[0]["max_tokens"]), ("small", 0.2, 100))
+        self.assertEqual((calls[1]["model"], calls[1]["temperature"], calls[1]["max_tokens"]), ("large", 0.7, 800))
+
+    async def test_falls_back_to_stronger_model_when_validation_fails(self):
+        gpt, calls = make_gpt({"small": "не json", "large": '{"a": 1}'})
+        messages = [{"role": "user", "content": "метрики"}]
+
+        text = await gpt.chat(messages, 50, task="structured", cache=True, validate=json.loads, name="world_metrics")
+        self.assertEqual(text, '{"a": 1}')
+        self.assertEqual([call["model"] for call in calls], ["small", "large"])
+        self.assertEqual(gpt.usage.by_name["world_metrics"].fallbacks, 1)
+
+        # В кэш попал только ответ, прошедший проверку
+        self.assertEqual(await gpt.chat(messages, 50, task="structured", cache=True, validate=json.loads), '{"a": 1}')
+        self.assertEqual(len(calls), 2)
+
+    async def test_validation_error_without_fallback_is_raised(self):
+        gpt, calls = make_gpt({"small": "не json", "large": "не json"})
+
+        # Ошибка проверки приходит как ошибка клиента GPT, с исходной причиной
+        with self.assertRaises(GptResponseError) as raised:
+            await gpt.chat([{"role": "user", "content": "ход"}], 50, task="structured", validate=json.loads)
+        self.assertIsInstance(raised.exception.__cause__, ValueError)
+        self.assertEqual(len(calls), 2)
+
+        with self.assertRaises(ValueError):
+            ModelRouter(ROUTES).route("unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
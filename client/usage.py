@@ -0,0 +1,188 @@
+# usage.py - учёт токенов и времени ответа каждого запроса к GPT
+#
+# Клиент GPT записывает каждый вызов: имя промпта, модель, токены (входные, из кэша, ответа),
+# время ответа и результат. Записи агрегируются в памяти по имени промпта (для /stats и метрик
+# в формате Prometheus) и копятся в очереди, которую фоновая задача сохраняет в таблицу gpt_usage.
+# Игрок, мир и год, к которым относится вызов, берутся из contextvars - их выставляют обработчики
+# через set_usage_context, а фоновые задачи наследуют контекст от обработчика, который их создал.
+
+import contextvars
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Границы корзин гистограммы времени ответа, секунды
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+# Сколько записей ждут сохранения в БД; если БД недоступна, самые старые отбрасываются
+PENDING_LIMIT = 10000
+
+_telegram_id = contextvars.ContextVar("gpt_usage_telegram_id", default=None)
+_world_id = contextvars.ContextVar("gpt_usage_world_id", default=None)
+_game_year = contextvars.ContextVar("gpt_usage_game_year", default=None)
+
+
+def set_usage_context(telegram_id=None, world_id=None, game_year=None):
+    """
+    Привязывает следующие запросы к GPT в текущем контексте к игроку, миру и году.
+    Перезаписывает все три значения, чтобы не унаследовать их от предыдущего обновления.
+    """
+    _telegram_id.set(telegram_id)
+    _world_id.set(world_id)
+    _game_year.set(game_year)
+
+
+# Один запрос к GPT
+@dataclass
+class GptCallRecord:
+    name: str
+    model: str
+    status: str  # ok, error, cache
+    duration: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    telegram_id: Optional[int] = None
+    world_id: Optional[int] = None
+    game_year: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+
+
+# Сводка по одному промпту
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    fallbacks: int = 0  # Ответы, не прошедшие проверку и повторённые на запасной модели
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    max_completion_tokens: int = 0
+    duration: float = 0.0
+    max_duration: float = 0.0
+    buckets: list = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+
+class UsageStats:
+    def __init__(self):
+        self.by_name = {}
+        self._pending = deque(maxlen=PENDING_LIMIT)
+
+    def record(self, name, model, status, duration, usage=None):
+        """Записывает вызов: в сводку и в очередь на сохранение в БД."""
+        record = GptCallRecord(
+            name=name,
+            model=model,
+            status=status,
+            duration=duration,
+            telegram_id=_telegram_id.get(),
+            world_id=_world_id.get(),
+            game_year=_game_year.get(),
+        )
+
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            record.prompt_tokens = usage.prompt_tokens or 0
+            record.completion_tokens = usage.completion_tokens or 0
+            record.cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+        stats = self.by_name.setdefault(name, CallStats())
+        stats.calls += 1
+        if status == "error":
+            stats.errors += 1
+        elif status == "cache":
+            stats.cache_hits += 1
+        stats.prompt_tokens += record.prompt_tokens
+        stats.completion_tokens += record.completion_tokens
+        stats.cached_tokens += record.cached_tokens
+        stats.max_completion_tokens = max(stats.max_completion_tokens, record.completion_tokens)
+        stats.duration += duration
+        stats.max_duration = max(stats.max_duration, duration)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                stats.buckets[i] += 1
+
+        self._pending.append(record)
+        return record
+
+    def record_fallback(self, name):
+        """Отмечает, что ответ не прошёл проверку и запрос ушёл на запасную модель."""
+        self.by_name.setdefault(name, CallStats()).fallbacks += 1
+
+    def drain(self, limit=1000):
+        """Забирает из очереди до limit записей для сохранения в БД."""
+        records = []
+        while self._pending and len(records) < limit:
+            records.append(self._pending.popleft())
+        return records
+
+    def requeue(self, records):
+        """Возвращает записи в очередь, если сохранить их не удалось."""
+        self._pending.extendleft(reversed(records))
+
+    def render_prometheus(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = [
+            "# HELP gpt_calls_total Запросы к GPT по промптам и результату",
+            "# TYPE gpt_calls_total counter",
+        ]
+        for name, stats in sorted(self.by_name.items()):
+            ok = stats.calls - stats.errors - stats.cache_hits
+            lines.append(f'gpt_calls_total{{name="{name}",status="ok"}} {ok}')
+            lines.append(f'gpt_calls_total{{name="{name}",status="error"}} {stats.errors}')
+            lines.append(f'gpt_calls_total{{name="{name}",status="cache"}} {stats.cache_hits}')
+
+        lines += [
+            "# HELP gpt_fallbacks_total Ответы, повторённые на запасной модели после проверки схемы",
+            "# TYPE gpt_fallbacks_total counter",
+        ]
+        for name, stats in sorted(self.by_name.items()):
+            lines.append(f'gpt_fallbacks_total{{name="{name}"}} {stats.fallbacks}')
+
+        lines += [
+            "# HELP gpt_tokens_total Токены GPT по промптам и типу",
+            "# TYPE gpt_tokens_total counter",
+        ]
+        for name, stats in sorted(self.by_name.items()):
+            lines.append(f'gpt_tokens_total{{name="{name}",type="prompt"}} {stats.prompt_tokens}')
+            lines.append(f'gpt_tokens_total{{name="{name}",type="cached"}} {stats.cached_tokens}')
+            lines.append(f'gpt_tokens_total{{name="{name}",type="completion"}} {stats.completion_tokens}')
+
+        lines += [
+            "# HELP gpt_request_duration_seconds Время ответа GPT",
+            "# TYPE gpt_request_duration_seconds histogram",
+        ]
+        for name, stats in sorted(self.by_name.items()):
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                lines.append(f'gpt_request_duration_seconds_bucket{{name="{name}",le="{bound}"}} {count}')
+            lines.append(f'gpt_request_duration_seconds_bucket{{name="{name}",le="+Inf"}} {stats.calls}')
+            lines.append(f'gpt_request_duration_seconds_sum{{name="{name}"}} {stats.duration:.3f}')
+            lines.append(f'gpt_request_duration_seconds_count{{name="{name}"}} {stats.calls}')
+
+        return "\n".join(lines) + "\n"
+
+    def format_report(self):
+        """Сводка для админской команды /stats: самые дорогие промпты сверху."""
+        if not self.by_name:
+            return "Запросов к GPT ещё не было."
+
+        lines = []
+        ordered = sorted(self.by_name.items(), key=lambda item: item[1].prompt_tokens + item[1].completion_tokens, reverse=True)
+        for name, stats in ordered:
+            answered = stats.calls - stats.errors - stats.cache_hits
+            avg_duration = stats.duration / stats.calls if stats.calls else 0
+            avg_prompt = stats.prompt_tokens // answered if answered else 0
+            avg_completion = stats.completion_tokens // answered if answered else 0
+            cached_share = stats.cached_tokens / stats.prompt_tokens * 100 if stats.prompt_tokens else 0
+
+            lines.append(
+                f"{name}: вызовов {stats.calls} (ошибок {stats.errors}, из кэша {stats.cache_hits}, "
+                f"на запасной модели {stats.fallbacks})\n"
+                f"  время: среднее {avg_duration:.1f} с, максимум {stats.max_duration:.1f} с\n"
+                f"  токены: вход {avg_prompt} в среднем ({cached_share:.0f}% из кэша), "
+                f"ответ {avg_completion} в среднем, максимум {stats.max_completion_tokens}"
+            )
+
+        return "\n".join(lines)
+
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from client.cache import ResponseCache
+from client.gpt import Gpt
+from client.errors import GptResponseError
+from client.usage import UsageStats, set_usage_context
+
+
+def make_response(text):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(
+            prompt_tokens=100,
+            completion_tokens=20,
+            total_tokens=120,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=64)
+        )
+    )
+
+
+def make_gpt(create):
+    gpt = Gpt(api_key="test", rpm=0, tpm=0, cache=ResponseCache(path=None), usage=UsageStats())
+    gpt.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return gpt
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_calls_are_recorded_per_name(self):
+        async def create(**params):
+            return make_response("ок")
+
+        gpt = make_gpt(create)
+        messages = [{"role": "user", "content": "мир"}]
+        await gpt.chat(messages, 50, name="world_metrics", cache=True)
+        await gpt.chat(messages, 50, name="world_metrics", cache=True)
+        await gpt.chat(messages, 50, name="character")
+
+        stats = gpt.usage.by_name["world_metrics"]
+        self.assertEqual((stats.calls, stats.cache_hits, stats.errors), (2, 1, 0))
+        self.assertEqual((stats.prompt_tokens, stats.cached_tokens, stats.completion_tokens), (100, 64, 20))
+        self.assertEqual(gpt.usage.by_name["character"].calls, 1)
+
+    async def test_errors_are_recorded(self):
+        async def create(**params):
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            raise openai.BadRequestError("error", response=httpx.Response(400, request=request), body=None)
+
+        gpt = make_gpt(create)
+        with self.assertRaises(GptResponseError):
+            await gpt.chat([{"role": "user", "content": "мир"}], 50, name="world")
+
+        records = gpt.usage.drain()
+        self.assertEqual([record.status for record in records], ["error"])
+        self.assertEqual(gpt.usage.by_name["world"].errors, 1)
+
+    async def test_records_carry_player_and_world(self):
+        async def create(**params):
+            return make_response("ок")
+
+        gpt = make_gpt(create)
+
+        async def turn(telegram_id, world_id):
+            set_usage_context(telegram_id, world_id, 1900)
+            await gpt.chat([{"role": "user", "content": "ход"}], 50, name="turn_resolution")
+
+        # Каждая задача видит свой контекст, как обработчики разных игроков
+        await asyncio.gather(turn(1, 10), turn(2, 20))
+
+        records = gpt.usage.drain()
+        self.assertEqual(sorted((r.telegram_id, r.world_id, r.game_year) for r in records), [(1, 10, 1900), (2, 20, 1900)])
+        self.assertEqual(gpt.usage.drain(), [])
+
+        metrics = gpt.usage.render_prometheus()
+        self.assertIn('gpt_tokens_total{name="turn_resolution",type="cached"} 128', metrics)
+        self.assertIn('gpt_request_duration_seconds_count{name="turn_resolution"} 2', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
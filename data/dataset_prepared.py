@@ -69,9 +69,11 @@ df_train = df.dropna(subset=baseline_columns + delta_columns)
 
 # 5. Формируем обучающие данные:
 # Входной вектор X – объединение baseline и текущих дельт
-X = df_train[baseline_columns + delta_columns].values   # размерность (n_samples, 66), если 33 метрики
+# DataFrame, а не .values: скейлеры запомнят имена и порядок признаков (feature_names_in_),
+# по ним бот проверяет модель при загрузке (см. metrics_simulator.py)
+X = df_train[baseline_columns + delta_columns]   # размерность (n_samples, 66), если 33 метрики
 # Целевая переменная y – абсолютные значения метрик текущего периода
-y = df_train[primary_columns].values                    # размерность (n_samples, 33)
+y = df_train[primary_columns]                    # размерность (n_samples, 33)
 
 # 6. Нормализуем входные и целевые данные
 scaler_X = StandardScaler()
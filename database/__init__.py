@@ -1,9 +1,16 @@
 # __init__.py
 
-from .connection import get_db_connection
-from .metrics import save_world_metrics_to_db, get_world_metrics_by_id, get_latest_world_metrics
-from .resources import save_world_resources_to_db, get_current_money_from_db, get_current_money_multiplier_from_db, save_new_money_to_db, save_new_money_multiplier_to_db
+from .connection import get_db_connection, init_pool, close_pool, connection, acquire, release
+from .executor import init_executor, shutdown_executor, run_db, run_db_with_timeout, db_stats, DbExecutorBusyError, DbCallTimeoutError
+from .session import session, run_in_transaction
+from .metrics import save_world_metrics_to_db, save_world_metrics_batch, get_world_metrics_by_id, get_latest_world_metrics
+from .resources import save_world_resources_to_db, get_current_money_from_db, get_current_money_multiplier_from_db, get_current_resources_for_update, save_resource_snapshot
 from .users import create_user, get_user_id_by_telegram_id
-from .characters import save_chatacters_to_db
-from .news import save_world_news_to_db
-
+from .characters import save_chatacters_to_db, save_characters_batch
+from .news import save_world_news_to_db, save_world_news_batch, get_latest_world_news
+from .history import save_world_history, get_world_history
+from .world_state import WorldState, load_world_state
+from .usage import save_gpt_usage
+from .persistence import load_bot_user_data, load_bot_conversations, save_bot_state
+from .events import save_world_event, save_world_snapshot, load_world_events
+from .instance_lock import InstanceLock, InstanceLockError
@@ -1,7 +1,8 @@
 #characters.py - модуль для работы с персонажами в базе данных
 
 import logging
-from database.connection import get_db_connection
+from psycopg2.extras import execute_values
+from database.connection import connection
 
 # Включаем логирование
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
@@ -10,29 +11,47 @@ logger = logging.getLogger(__name__)
 # Функция для сохранения персонажа в базу данных и связь с миром
 def save_chatacters_to_db(world_id, user_id, character_description):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with connection() as conn:
+            cursor = conn.cursor()
 
-        # Логируем полученные данные
-        logger.info(f"Записываем персонажа для пользователя с ID {user_id}, мира с ID {world_id}: {character_description}")
+            # Логируем полученные данные
+            logger.info(f"Записываем персонажа для пользователя с ID {user_id}, мира с ID {world_id}: {character_description}")
 
-        # Запись персонажа в таблицу characters
-        cursor.execute(
-            "INSERT INTO characters (user_id, world_id, character_description) VALUES (%s, %s, %s) RETURNING character_id",
-            (user_id, world_id, character_description)
-        )
-        
-        # Получаем сгенерированный character_id
-        character_id = cursor.fetchone()[0]
-        conn.commit()  # Сохраняем изменения в базе данных
+            # Запись персонажа в таблицу characters
+            cursor.execute(
+                "INSERT INTO characters (user_id, world_id, character_description) VALUES (%s, %s, %s) RETURNING character_id",
+                (user_id, world_id, character_description)
+            )
+
+            # Получаем сгенерированный character_id
+            character_id = cursor.fetchone()[0]
+            conn.commit()  # Сохраняем изменения в базе данных
 
-        logger.info(f"Персонаж успешно создан с ID {character_id}.")
+            logger.info(f"Персонаж успешно создан с ID {character_id}.")
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
         return character_id
 
     except Exception as e:
         logger.error(f"Ошибка при сохранении персонажа: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Сохраняем пачку персонажей одним запросом внутри открытой транзакции (см. write_behind.py)
+def save_characters_batch(connection, rows):
+    """
+    :param connection: Соединение открытой транзакции
+    :param rows: Список (world_id, user_id, character_description)
+    :return: Сколько строк записано
+    """
+    if not rows:
+        return 0
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            "INSERT INTO characters (world_id, user_id, character_description) VALUES %s",
+            rows
+        )
+
+    return len(rows)
@@ -1,25 +1,170 @@
 # connection.py - модуль для подключения к базе данных
 
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
-import os
 
 # Загружаем переменные окружения из .env
 load_dotenv()
 
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    """Подключение к базе данных."""
-    conn = psycopg2.connect(
+# Размеры пула по умолчанию, переопределяются через .env
+DEFAULT_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DEFAULT_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+
+
+def _connection_params():
+    return dict(
         dbname=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT")
     )
+
+
+def get_db_connection():
+    """Подключение к базе данных (отдельное соединение в обход пула)."""
+    conn = psycopg2.connect(**_connection_params())
     return conn
 
 
+def is_connection_error(error, conn=None):
+    """
+    Умерло ли соединение: такое не возвращаем в пул, а транзакцию можно повторить на новом.
+
+    Соединение мертво, если оно закрыто или у ошибки нет кода SQLSTATE либо код из класса 08
+    (ошибки соединения). Прочие OperationalError - таймаут запроса, конфликт сериализации,
+    взаимная блокировка - случаются на живом соединении, его достаточно откатить.
+    """
+    if conn is not None and conn.closed:
+        return True
+    if not isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+        return False
+
+    return error.pgcode is None or error.pgcode.startswith("08")
+
+
+class PoolTimeoutError(Exception):
+    """Не дождались свободного соединения в пуле."""
+
+
+class ConnectionPool:
+    """
+    Ограниченный пул соединений с базой.
+
+    psycopg2.ThreadedConnectionPool при исчерпании падает с PoolError,
+    поэтому поверх него стоит семафор: если все соединения заняты,
+    acquire ждёт, пока какое-нибудь вернут, а не открывает новое.
+    """
+
+    def __init__(self, minconn=DEFAULT_POOL_MIN_SIZE, maxconn=DEFAULT_POOL_MAX_SIZE):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **_connection_params())
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def acquire(self, timeout=None):
+        """Берём соединение из пула. Блокируется, пока не появится свободное."""
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError(f"Нет свободных соединений в пуле за {timeout} сек.")
+
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Возвращаем соединение в пул. Битые соединения закрываем, пул откроет новые."""
+        try:
+            self._pool.putconn(conn, close=discard or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(minconn=DEFAULT_POOL_MIN_SIZE, maxconn=DEFAULT_POOL_MAX_SIZE):
+    """Создаём пул соединений. Вызывается при старте Application."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(minconn, maxconn)
+            logger.info(f"Пул соединений с БД создан (min={minconn}, max={maxconn}).")
+
+    return _pool
+
+
+def close_pool():
+    """Закрываем все соединения пула. Вызывается при остановке Application."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            logger.info("Пул соединений с БД закрыт.")
+
+
+def get_pool():
+    """Возвращает текущий пул. Если приложение его не создало (скрипты, тесты) - создаём с настройками по умолчанию."""
+    if _pool is None:
+        return init_pool()
+
+    return _pool
+
+
+def acquire(timeout=None):
+    return get_pool().acquire(timeout)
+
+
+def release(conn, discard=False):
+    get_pool().release(conn, discard)
+
+
+@contextmanager
+def connection(timeout=None):
+    """
+    Соединение из пула на время блока with.
+
+    При ошибке незакоммиченная транзакция откатывается, соединение возвращается в пул.
+    Мёртвые соединения (см. is_connection_error) закрываются, пул откроет новые.
+    """
+    pool = get_pool()
+    conn = pool.acquire(timeout)
+    discard = False
+
+    try:
+        yield conn
+    except Exception as e:
+        if is_connection_error(e, conn):
+            # Соединение умерло - в пул его не возвращаем
+            discard = True
+        else:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True  # Откатить не удалось - соединению доверять нельзя
+        raise
+    finally:
+        pool.release(conn, discard)
+
+
 def insert_returning_id(conn, query, vars=None):
     cursor = conn.cursor()
     cursor.execute(query, vars)
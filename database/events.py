@@ -0,0 +1,106 @@
+# events.py - модуль журнала событий мира и снимков состояния в базе данных
+
+import logging
+from psycopg2.extras import Json
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def save_world_event(connection, world_id, user_id, year, event_type, payload, initiative_description=None, gpt_response=None):
+    """
+    Добавляет событие в журнал мира (world_statistics). Записи журнала не изменяются и не удаляются.
+
+    Коммит делает вызывающий (см. database.session), чтобы событие легло в одну транзакцию с ходом.
+
+    :param connection: Соединение открытой транзакции
+    :param world_id: ID мира
+    :param user_id: ID игрока (users.user_id), None - событие без игрока
+    :param year: Игровой год события
+    :param event_type: Тип события (см. world_events.py)
+    :param payload: Значения мира после события, словарь для JSONB
+    :param initiative_description: Текст инициативы игрока
+    :param gpt_response: Ответ GPT на инициативу
+    :return: change_id нового события
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO world_statistics
+            (world_id, user_id, in_game_year, event_type, payload, initiative_description, gpt_response, change_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            RETURNING change_id
+        """, (world_id, user_id, year, event_type, Json(payload), initiative_description, gpt_response))
+
+        return cursor.fetchone()[0]
+
+
+def save_world_snapshot(connection, world_id, change_id, year, state):
+    """
+    Сохраняет снимок состояния мира после события change_id.
+
+    :return: True, если снимок записан; False, если такой снимок уже есть
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO world_snapshots (world_id, change_id, in_game_year, state, created_at)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (world_id, change_id) DO NOTHING
+        """, (world_id, change_id, year, Json(state)))
+
+        saved = cursor.rowcount == 1
+
+    if saved:
+        logger.info(f"Снимок мира {world_id} сохранён после события {change_id} ({year} год).")
+    return saved
+
+
+def load_world_events(connection, world_id, year=None):
+    """
+    Загружает ближайший снимок мира и события после него.
+
+    :param connection: Соединение с базой данных
+    :param world_id: ID мира
+    :param year: Год, на который нужно состояние. None - последнее состояние
+    :return: (снимок, события): снимок - {"change_id", "year", "state"} или None, если снимков ещё нет;
+             события - список {"change_id", "year", "type", "payload", "user_id", "initiative", "response"} по порядку
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT change_id, in_game_year, state
+            FROM world_snapshots
+            WHERE world_id = %(world_id)s
+              AND (%(year)s::INT IS NULL OR in_game_year <= %(year)s::INT)
+            ORDER BY change_id DESC
+            LIMIT 1
+        """, {"world_id": world_id, "year": year})
+        row = cursor.fetchone()
+
+        snapshot = None
+        if row:
+            snapshot = {"change_id": row[0], "year": row[1], "state": row[2]}
+
+        cursor.execute("""
+            SELECT change_id, in_game_year, event_type, payload, user_id, initiative_description, gpt_response
+            FROM world_statistics
+            WHERE world_id = %(world_id)s
+              AND event_type IS NOT NULL
+              AND change_id > %(after)s
+              AND (%(year)s::INT IS NULL OR in_game_year <= %(year)s::INT)
+            ORDER BY change_id
+        """, {"world_id": world_id, "year": year, "after": snapshot["change_id"] if snapshot else 0})
+
+        events = [
+            {
+                "change_id": row[0],
+                "year": row[1],
+                "type": row[2],
+                "payload": row[3] or {},
+                "user_id": row[4],
+                "initiative": row[5],
+                "response": row[6],
+            }
+            for row in cursor.fetchall()
+        ]
+
+    return snapshot, events
@@ -0,0 +1,245 @@
+# executor.py - модуль выполнения блокирующих запросов к БД вне event loop
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database.connection import DEFAULT_POOL_MAX_SIZE
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько вызовов может ждать свободный поток сверх занятых
+DEFAULT_QUEUE_SIZE = int(os.getenv("DB_EXECUTOR_QUEUE_SIZE", 100))
+# Сколько секунд ждём места в очереди, прежде чем отказать
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv("DB_EXECUTOR_QUEUE_TIMEOUT", 5))
+# Сколько секунд ждём результата одного вызова
+DEFAULT_CALL_TIMEOUT = float(os.getenv("DB_CALL_TIMEOUT", 15))
+
+
+class DbExecutorBusyError(Exception):
+    """Очередь запросов к БД переполнена."""
+
+
+class DbCallTimeoutError(Exception):
+    """Запрос к БД не уложился в отведённое время."""
+
+
+class DbExecutor:
+    """
+    Ограниченный пул потоков для синхронных функций модуля database.
+
+    Потоков столько же, сколько соединений в пуле: пока все запросы к БД идут через run_db
+    и функция не берёт второе соединение, не отдав первое, поток не ждёт соединение.
+    Сверх этого в очереди может стоять не больше queue_size вызовов: если места нет дольше
+    queue_timeout секунд, вызов получает DbExecutorBusyError вместо бесконечного ожидания.
+    """
+
+    def __init__(self, max_workers=DEFAULT_POOL_MAX_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT, call_timeout=DEFAULT_CALL_TIMEOUT):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        # Слот занят с момента постановки в очередь до реального завершения функции в потоке
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+        # Корутины, ждущие слот: (event loop, asyncio.Event), будим их при освобождении слота
+        self._slot_waiters = []
+
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def submit(self, func, timeout=None):
+        """Выполняет func() в пуле потоков и возвращает результат."""
+        timeout = self.call_timeout if timeout is None else timeout
+
+        if not await self._acquire_slot():
+            with self._lock:
+                self._rejected += 1
+            raise DbExecutorBusyError(f"Очередь запросов к БД переполнена ({self.queue_size}).")
+
+        with self._lock:
+            self._queued += 1
+
+        submitted_at = time.monotonic()
+
+        try:
+            future = self._executor.submit(self._run, func, submitted_at)
+        except Exception:
+            self._release_slot()
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        future.add_done_callback(self._on_done)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # Если функция ещё не стартовала - снимаем её с очереди, иначе поток доработает сам
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise DbCallTimeoutError(f"Запрос к БД {getattr(func, '__name__', func)} не уложился в {timeout} сек.")
+
+    async def _acquire_slot(self):
+        # Слот берётся только здесь, в корутине и без блокировки: если ожидание отменят,
+        # слот не окажется занятым тем, кто его уже не вернёт. Поток на ожидание не тратится
+        deadline = time.monotonic() + self.queue_timeout
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if self._slots.acquire(blocking=False):
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            waiter = (loop, asyncio.Event())
+            with self._lock:
+                self._slot_waiters.append(waiter)
+
+            # Слот могли освободить, пока мы вставали в список ожидания
+            if self._slots.acquire(blocking=False):
+                with self._lock:
+                    self._slot_waiters.remove(waiter)
+                return True
+
+            try:
+                await asyncio.wait_for(waiter[1].wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    self._slot_waiters.remove(waiter)
+
+    # Вызывается и из потока исполнителя (_on_done), и из event loop
+    def _release_slot(self):
+        self._slots.release()
+
+        # Будим всех ждущих: слот заберёт первый успевший, остальные снова встанут в ожидание
+        with self._lock:
+            waiters = list(self._slot_waiters)
+
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Event loop ждущего уже закрыт
+
+    def _run(self, func, submitted_at):
+        wait = time.monotonic() - submitted_at
+
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                # Функция так и не стартовала, _run не уменьшил счётчик очереди
+                self._queued -= 1
+            elif future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+        self._release_slot()
+
+    def stats(self):
+        """Текущие метрики исполнителя: глубина очереди, время ожидания и счётчики вызовов."""
+        with self._lock:
+            started = self._completed + self._failed + self._running
+
+            return {
+                "workers": self.max_workers,
+                "queue_size": self.queue_size,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "wait_avg_seconds": self._wait_total / started if started else 0.0,
+                "wait_max_seconds": self._wait_max,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def init_executor(max_workers=DEFAULT_POOL_MAX_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                  queue_timeout=DEFAULT_QUEUE_TIMEOUT, call_timeout=DEFAULT_CALL_TIMEOUT):
+    """Создаём исполнитель запросов к БД. Вызывается при старте Application."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = DbExecutor(max_workers, queue_size, queue_timeout, call_timeout)
+            logger.info(f"Исполнитель запросов к БД создан (потоков={max_workers}, очередь={queue_size}).")
+
+    return _executor
+
+
+def shutdown_executor():
+    """Дожидаемся уже поставленных запросов и останавливаем потоки. Вызывается при остановке Application."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+            logger.info("Исполнитель запросов к БД остановлен.")
+
+
+def get_executor():
+    if _executor is None:
+        return init_executor()
+
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Выполняет синхронную функцию работы с БД в пуле потоков DbExecutor.
+
+    psycopg2 блокирующий, поэтому хендлеры бота не зовут его напрямую, а ждут через run_db -
+    пока один запрос к базе висит, остальные чаты продолжают обрабатываться.
+    """
+    return await get_executor().submit(functools.partial(func, *args, **kwargs))
+
+
+async def run_db_with_timeout(timeout, func, *args, **kwargs):
+    """То же, что run_db, но со своим таймаутом на вызов."""
+    return await get_executor().submit(functools.partial(func, *args, **kwargs), timeout)
+
+
+def db_stats():
+    return get_executor().stats()
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import unittest
+
+from database.executor import DbCallTimeoutError, DbExecutor, DbExecutorBusyError
+
+
+class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        # Один поток и без очереди: второй вызов сразу упирается в занятый слот
+        self.executor = DbExecutor(max_workers=1, queue_size=0, queue_timeout=0.2, call_timeout=5)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    def blocking(self):
+        self.release.wait(5)
+        return "done"
+
+    def test_full_queue_is_rejected(self):
+        async def scenario():
+            running = asyncio.create_task(self.executor.submit(self.blocking))
+            await asyncio.sleep(0.05)
+
+            with self.assertRaises(DbExecutorBusyError):
+                await self.executor.submit(lambda: "lost")
+
+            self.release.set()
+            return await running
+
+        self.assertEqual(asyncio.run(scenario()), "done")
+        self.assertEqual(self.executor.stats()["rejected"], 1)
+
+    def test_slow_call_times_out(self):
+        async def scenario():
+            with self.assertRaises(DbCallTimeoutError):
+                await self.executor.submit(self.blocking, timeout=0.05)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(self.executor.stats()["timed_out"], 1)
+
+    def test_slot_is_released_after_exception(self):
+        def failing():
+            raise ValueError("ошибка запроса")
+
+        async def scenario():
+            with self.assertRaises(ValueError):
+                await self.executor.submit(failing)
+            return await self.executor.submit(lambda: "next")
+
+        self.assertEqual(asyncio.run(scenario()), "next")
+        self.assertEqual(self.executor.stats()["failed"], 1)
+
+    def test_slot_is_released_after_cancellation(self):
+        async def scenario():
+            running = asyncio.create_task(self.executor.submit(self.blocking))
+            await asyncio.sleep(0.05)
+
+            # Отменяем и ждущего слот, и того, чей запрос уже выполняется
+            waiting = asyncio.create_task(self.executor.submit(lambda: "lost"))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            running.cancel()
+            await asyncio.gather(waiting, running, return_exceptions=True)
+
+            # Слот вернётся, когда функция в потоке доработает
+            self.release.set()
+            return await self.executor.submit(lambda: "next")
+
+        self.assertEqual(asyncio.run(scenario()), "next")
+        self.assertEqual(self.executor._slots._value, 1)
+        self.assertEqual(self.executor.stats()["queued"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# history.py - модуль для хранения сжатой истории мира в базе данных
+
+import logging
+from psycopg2.extras import Json
+from database.connection import connection
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сохраняем историю мира (вставка или обновление)
+def save_world_history(world_id, base_description, summary, recent_turns, summarized_turns):
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO world_history
+                    (world_id, base_description, summary, recent_turns, summarized_turns, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (world_id) DO UPDATE SET
+                        base_description = EXCLUDED.base_description,
+                        summary = EXCLUDED.summary,
+                        recent_turns = EXCLUDED.recent_turns,
+                        summarized_turns = EXCLUDED.summarized_turns,
+                        updated_at = EXCLUDED.updated_at
+                    """,
+                    (world_id, base_description, summary, Json(recent_turns), summarized_turns)
+                )
+            conn.commit()
+
+        logger.info(f"История мира с ID {world_id} сохранена (ходов дословно: {len(recent_turns)}).")
+        return True
+
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении истории мира {world_id}: {e}")
+        return False
+
+# Получаем историю мира по world_id
+def get_world_history(world_id):
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT base_description, summary, recent_turns, summarized_turns
+                    FROM world_history
+                    WHERE world_id = %s
+                    """,
+                    (world_id,)
+                )
+                result = cursor.fetchone()
+
+        if not result:
+            return None
+
+        return {
+            "base_description": result[0],
+            "summary": result[1] or "",
+            "recent_turns": result[2] or [],
+            "summarized_turns": result[3] or 0,
+        }
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении истории мира {world_id}: {e}")
+        return None
@@ -0,0 +1,92 @@
+# instance_lock.py - модуль блокировки "один экземпляр бота на базу"
+#
+# Бот рассчитан на один работающий экземпляр: часть состояния живёт только в памяти процесса -
+# очередь обновлений каждого игрока и нажатия кнопок в обработке (update_processor.py),
+# подготовка новых миров (world_setup.py), кеш историй миров (world_history.py),
+# user_data и диалоги, которые PostgresPersistence читает при запуске и пишет раз в 30 секунд.
+# Второй экземпляр на той же базе вёл бы те же партии наперегонки и затирал бы их состояние.
+# Поэтому бот при запуске берёт сессионную advisory-блокировку Postgres на отдельном соединении
+# и держит её до остановки. Новый экземпляр ждёт блокировку до INSTANCE_LOCK_TIMEOUT секунд -
+# при выкатке старый экземпляр как раз дорабатывает и сохраняет состояние - и, не дождавшись,
+# не запускается. Если соединение с блокировкой оборвётся, сервер снимет её сам.
+
+import logging
+import os
+import time
+
+from database.connection import get_db_connection
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: один на все экземпляры бота, работающие с одной базой
+INSTANCE_LOCK_KEY = int(os.getenv("INSTANCE_LOCK_KEY", 7301))
+# Сколько секунд новый экземпляр ждёт, пока остановится предыдущий
+INSTANCE_LOCK_TIMEOUT = float(os.getenv("INSTANCE_LOCK_TIMEOUT", 120))
+# Как часто проверяем, не освободилась ли блокировка, секунды
+INSTANCE_LOCK_POLL_INTERVAL = 1.0
+
+
+class InstanceLockError(Exception):
+    """С базой уже работает другой экземпляр бота."""
+
+
+class InstanceLock:
+    def __init__(self, key=INSTANCE_LOCK_KEY):
+        self.key = key
+        self._conn = None
+
+    @property
+    def held(self):
+        return self._conn is not None and not self._conn.closed
+
+    def acquire(self, timeout=INSTANCE_LOCK_TIMEOUT):
+        """
+        Берёт блокировку экземпляра, дожидаясь остановки предыдущего.
+
+        :param timeout: Сколько секунд ждать, пока блокировку отпустят
+        :raises InstanceLockError: если за timeout блокировка не освободилась
+        """
+        conn = get_db_connection()
+        conn.autocommit = True  # Сессионная блокировка, транзакцию открытой не держим
+        deadline = time.monotonic() + timeout
+        waiting = False
+
+        try:
+            while True:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+                    if cursor.fetchone()[0]:
+                        break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise InstanceLockError(
+                        f"С базой уже работает другой экземпляр бота (блокировка {self.key} занята {timeout} сек.)."
+                    )
+                if not waiting:
+                    logger.info("С базой работает другой экземпляр бота, ждём его остановки...")
+                    waiting = True
+                time.sleep(min(INSTANCE_LOCK_POLL_INTERVAL, remaining))
+        except BaseException:
+            conn.close()
+            raise
+
+        self._conn = conn
+        logger.info(f"Блокировка экземпляра {self.key} получена.")
+
+    def release(self):
+        """Отпускает блокировку: следующий экземпляр может запускаться."""
+        if self._conn is None:
+            return
+
+        try:
+            if not self._conn.closed:
+                with self._conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (self.key,))
+        except Exception as e:
+            logger.warning(f"Не удалось отпустить блокировку экземпляра, её снимет закрытие соединения: {e}")
+        finally:
+            self._conn.close()
+            self._conn = None
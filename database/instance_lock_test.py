@@ -0,0 +1,38 @@
+import unittest
+
+from database.instance_lock import InstanceLock, InstanceLockError
+
+# Свой ключ, чтобы не пересекаться с запущенным ботом
+TEST_KEY = 7399
+
+
+class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.first = InstanceLock(TEST_KEY)
+        self.second = InstanceLock(TEST_KEY)
+
+    def tearDown(self):
+        self.first.release()
+        self.second.release()
+
+    def test_second_instance_does_not_start(self):
+        self.first.acquire(timeout=0)
+
+        with self.assertRaises(InstanceLockError):
+            self.second.acquire(timeout=0.2)
+
+        self.assertTrue(self.first.held)
+        self.assertFalse(self.second.held)
+
+    def test_next_instance_starts_after_release(self):
+        self.first.acquire(timeout=0)
+        self.first.release()
+
+        self.second.acquire(timeout=0)
+
+        self.assertFalse(self.first.held)
+        self.assertTrue(self.second.held)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 # metrics.py - модуль для работы с метриками мира в базе данных
 
 import logging
-from database.connection import get_db_connection
+from psycopg2.extras import execute_values
+from database.connection import connection
 
 # Включаем логирование
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
@@ -17,27 +18,26 @@ def save_world_metrics_to_db(world_id, metrics):
         security_metric = metrics.get("security_metric", 0)
         political_support_metric = metrics.get("political_support_metric", 0)
 
-        # Установим соединение с базой данных
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Берём соединение из пула
+        with connection() as conn:
+            cursor = conn.cursor()
 
-        # Вставляем метрики в таблицу world_metrics
-        cursor.execute(
-            """
-            INSERT INTO world_metrics 
-            (world_id, economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric, date_generated)
-            VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-            """,
-            (world_id, economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric)
-        )
+            # Вставляем метрики в таблицу world_metrics
+            cursor.execute(
+                """
+                INSERT INTO world_metrics 
+                (world_id, economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric, date_generated)
+                VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                """,
+                (world_id, economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric)
+            )
 
-        conn.commit()  # Подтверждаем изменения
+            conn.commit()  # Подтверждаем изменения
 
-        # Логируем успешную запись данных
-        logger.info(f"Метрики успешно записаны для мира с ID {world_id}.")
+            # Логируем успешную запись данных
+            logger.info(f"Метрики успешно записаны для мира с ID {world_id}.")
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
     except Exception as e:
         logger.error(f"Ошибка при сохранении метрик: {e}")
@@ -45,18 +45,17 @@ def save_world_metrics_to_db(world_id, metrics):
 # Функция для получения метрик мира по world_id
 def get_world_metrics_by_id(world_id):
     try:
-        conn = get_db_connection()  # Соединяемся с базой данных
-        cursor = conn.cursor()
+        with connection() as conn:  # Берём соединение из пула
+            cursor = conn.cursor()
 
-        # Запрос для получения всех метрик мира по world_id
-        cursor.execute("""
-            SELECT economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric
-            FROM world_metrics WHERE world_id = %s
-        """, (world_id,))
-        world_metrics = cursor.fetchone()  # Получаем результат
+            # Запрос для получения всех метрик мира по world_id
+            cursor.execute("""
+                SELECT economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric
+                FROM world_metrics WHERE world_id = %s
+            """, (world_id,))
+            world_metrics = cursor.fetchone()  # Получаем результат
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
         if world_metrics:
             return world_metrics[0]  # Возвращаем описание мира
@@ -73,23 +72,21 @@ def get_latest_world_metrics(world_id):
     Получает последние (актуальные) метрики для указанного мира (world_id).
     """
     try:
-        conn = get_db_connection()  # Подключаемся к БД
-        cursor = conn.cursor()
+        with connection() as conn:  # Берём соединение из пула
+            cursor = conn.cursor()
 
-        # Запрос для получения последних метрик (по дате создания)
-        cursor.execute("""
-            SELECT economy_metric, social_stability_metric, ecology_metric, 
-                   security_metric, political_support_metric
-            FROM world_metrics
-            WHERE world_id = %s
-            ORDER BY date_generated DESC  -- Сортируем по убыванию даты (последние записи в начале)
-            LIMIT 1                       -- Берём только 1 самую свежую запись
-        """, (world_id,))
+            # Последние метрики мира лежат в актуальном состоянии (см. migrations/002_world_current_state.sql),
+            # строки истории с одними новостями туда не попадают
+            cursor.execute("""
+                SELECT economy_metric, social_stability_metric, ecology_metric, 
+                       security_metric, political_support_metric
+                FROM world_metrics_current
+                WHERE world_id = %s
+            """, (world_id,))
 
-        result = cursor.fetchone()  # Получаем 1 строку
+            result = cursor.fetchone()  # Получаем 1 строку
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
         if result:
             return {
@@ -104,4 +101,41 @@ def get_latest_world_metrics(world_id):
 
     except Exception as e:
         logger.error(f"Ошибка при получении метрик мира (world_id={world_id}): {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Сохраняем пачку метрик одним запросом внутри открытой транзакции (см. write_behind.py)
+def save_world_metrics_batch(connection, rows):
+    """
+    Строки вставляются в порядке очереди, поэтому в world_metrics_current остаются последние метрики мира.
+
+    :param connection: Соединение открытой транзакции
+    :param rows: Список (world_id, metrics), metrics - словарь метрик как в save_world_metrics_to_db
+    :return: Сколько строк записано
+    """
+    if not rows:
+        return 0
+
+    values = [
+        (
+            world_id,
+            metrics.get("economy_metric", 0),
+            metrics.get("social_stability_metric", 0),
+            metrics.get("ecology_metric", 0),
+            metrics.get("security_metric", 0),
+            metrics.get("political_support_metric", 0),
+        )
+        for world_id, metrics in rows
+    ]
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO world_metrics
+            (world_id, economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric)
+            VALUES %s
+            """,
+            values
+        )
+
+    return len(values)
@@ -0,0 +1,64 @@
+# migrations.py - модуль применения миграций схемы БД
+#
+# Базовая схема создаётся из game_database_schema.sql, всё, что добавлено позже, лежит в migrations/*.sql.
+# Применить новые миграции: python -m database.migrations
+
+import logging
+import os
+
+from database.session import session
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+
+def get_migration_files(migrations_dir=MIGRATIONS_DIR):
+    """Файлы миграций по порядку номеров в имени (001_..., 002_...)."""
+    return sorted(name for name in os.listdir(migrations_dir) if name.endswith(".sql"))
+
+
+def apply_migrations(migrations_dir=MIGRATIONS_DIR):
+    """
+    Применяет ещё не применённые миграции, каждую в своей транзакции.
+
+    :return: Список имён применённых сейчас миграций
+    """
+    with session() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    name VARCHAR(255) PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("SELECT name FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+
+    newly_applied = []
+
+    for name in get_migration_files(migrations_dir):
+        if name in applied:
+            continue
+
+        with open(os.path.join(migrations_dir, name), encoding="utf-8") as f:
+            sql = f.read()
+
+        logger.info(f"Применяем миграцию {name}...")
+
+        with session() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+
+        newly_applied.append(name)
+
+    logger.info(f"Миграций применено: {len(newly_applied)}.")
+
+    return newly_applied
+
+
+if __name__ == "__main__":
+    apply_migrations()
@@ -1,7 +1,8 @@
 # news.py - модуль для работы с новостями в базе данных
 
 import logging
-from database.connection import get_db_connection
+from psycopg2.extras import execute_values
+from database.connection import connection
 
 # Включаем логирование
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
@@ -14,29 +15,71 @@ def save_world_news_to_db(world_id, world_news):
             logger.warning(f"Мир с ID {world_id} не имеет новостей для записи.")
             return None  # Если нет новостей, не записываем их
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with connection() as conn:
+            cursor = conn.cursor()
 
-        # Логируем полученные данные
-        logger.info(f"Записываем новости для мира с ID {world_id}: {world_news}")
+            # Логируем полученные данные
+            logger.info(f"Записываем новости для мира с ID {world_id}: {world_news}")
 
-        # Запись новости в таблицу WORLD_METRICS
-        cursor.execute(
-            "INSERT INTO WORLD_METRICS (world_id, world_news) VALUES (%s, %s) RETURNING metric_id",
-            (world_id, world_news)
-        )
-        
-        # Получаем сгенерированный metric_id
-        metric_id = cursor.fetchone()[0]
-        conn.commit()  # Сохраняем изменения в базе данных
+            # Запись новости в таблицу WORLD_METRICS
+            cursor.execute(
+                "INSERT INTO WORLD_METRICS (world_id, world_news) VALUES (%s, %s) RETURNING metric_id",
+                (world_id, world_news)
+            )
+
+            # Получаем сгенерированный metric_id
+            metric_id = cursor.fetchone()[0]
+            conn.commit()  # Сохраняем изменения в базе данных
 
-        logger.info(f"Персонаж успешно создан с ID {metric_id}.")
+            logger.info(f"Персонаж успешно создан с ID {metric_id}.")
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
         return metric_id
 
     except Exception as e:
         logger.error(f"Ошибка при сохранении новостей: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Последний дайджест новостей мира
+def get_latest_world_news(world_id):
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT world_news
+                    FROM world_metrics
+                    WHERE world_id = %s AND world_news IS NOT NULL
+                    ORDER BY date_generated DESC, metric_id DESC
+                    LIMIT 1
+                    """,
+                    (world_id,)
+                )
+                row = cursor.fetchone()
+
+        return row[0] if row else None
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении новостей мира с ID {world_id}: {e}")
+        return None
+
+# Сохраняем пачку новостей одним запросом внутри открытой транзакции (см. write_behind.py)
+def save_world_news_batch(connection, rows):
+    """
+    :param connection: Соединение открытой транзакции
+    :param rows: Список (world_id, world_news)
+    :return: Сколько строк записано
+    """
+    rows = [(world_id, world_news) for world_id, world_news in rows if world_news]
+    if not rows:
+        return 0
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            "INSERT INTO world_metrics (world_id, world_news) VALUES %s",
+            rows
+        )
+
+    return len(rows)
@@ -0,0 +1,77 @@
+# persistence.py - модуль для хранения состояния бота (user_data и диалоги) в базе данных
+
+import json
+import logging
+from psycopg2.extras import Json, execute_values
+from database.connection import connection
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Все сохранённые user_data: {telegram_id: data}
+def load_bot_user_data():
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT telegram_id, data FROM bot_user_data")
+            rows = cursor.fetchall()
+
+    return {telegram_id: data for telegram_id, data in rows}
+
+# Сохранённые состояния диалогов одного ConversationHandler: {(chat_id, user_id): state}
+def load_bot_conversations(name):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT conversation_key, state FROM bot_conversations WHERE name = %s", (name,))
+            rows = cursor.fetchall()
+
+    return {tuple(json.loads(key)): state for key, state in rows}
+
+def save_bot_state(user_data, conversations):
+    """
+    Записывает накопленные изменения одной транзакцией.
+
+    :param user_data: {telegram_id: data или None}; None - удалить запись
+    :param conversations: {(name, key): state или None}; None - диалог завершён, удалить запись
+    :return: Сколько записей изменено
+    """
+    upserts = [(telegram_id, Json(data)) for telegram_id, data in user_data.items() if data is not None]
+    deletes = [telegram_id for telegram_id, data in user_data.items() if data is None]
+    conversation_upserts = [
+        (name, json.dumps(list(key)), state) for (name, key), state in conversations.items() if state is not None
+    ]
+    conversation_deletes = [
+        (name, json.dumps(list(key))) for (name, key), state in conversations.items() if state is None
+    ]
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            if upserts:
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO bot_user_data (telegram_id, data) VALUES %s
+                    ON CONFLICT (telegram_id) DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP
+                    """,
+                    upserts
+                )
+            if deletes:
+                cursor.execute("DELETE FROM bot_user_data WHERE telegram_id = ANY(%s)", (deletes,))
+            if conversation_upserts:
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO bot_conversations (name, conversation_key, state) VALUES %s
+                    ON CONFLICT (name, conversation_key) DO UPDATE SET state = EXCLUDED.state, updated_at = CURRENT_TIMESTAMP
+                    """,
+                    conversation_upserts
+                )
+            if conversation_deletes:
+                execute_values(
+                    cursor,
+                    "DELETE FROM bot_conversations WHERE (name, conversation_key) IN (VALUES %s)",
+                    conversation_deletes
+                )
+        conn.commit()
+
+    return len(user_data) + len(conversations)
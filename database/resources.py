@@ -2,7 +2,8 @@
 
 import logging
 import psycopg2
-from database.connection import get_db_connection
+from decimal import Decimal
+from database.connection import connection
 
 # Включаем логирование
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
@@ -15,27 +16,26 @@ def save_world_resources_to_db(world_id, resources):
         money_resource = resources.get("Деньги (монет)", 0)  # Используем правильные ключи
         people_resource = resources.get("Население (людей)", 0)
 
-        # Установим соединение с базой данных
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Берём соединение из пула
+        with connection() as conn:
+            cursor = conn.cursor()
 
-        # Вставляем ресурсы в таблицу world_resources
-        cursor.execute(
-            """
-            INSERT INTO world_resources 
-            (world_id, money_resource, people_resource, date_generated)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-            """,
-            (world_id, money_resource, people_resource)  # Параметры для вставки
-        )
+            # Вставляем ресурсы в таблицу world_resources
+            cursor.execute(
+                """
+                INSERT INTO world_resources 
+                (world_id, money_resource, people_resource, date_generated)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                """,
+                (world_id, money_resource, people_resource)  # Параметры для вставки
+            )
 
-        conn.commit()  # Подтверждаем изменения
+            conn.commit()  # Подтверждаем изменения
 
-        # Логируем успешную запись данных
-        logger.info(f"Ресурсы успешно записаны для мира с ID {world_id}.")
+            # Логируем успешную запись данных
+            logger.info(f"Ресурсы успешно записаны для мира с ID {world_id}.")
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
     except Exception as e:
         logger.error(f"Ошибка при сохранении ресурсов мира: {e}")
@@ -43,13 +43,11 @@ def save_world_resources_to_db(world_id, resources):
 def get_current_money_from_db(connection, world_id):
     try:
         with connection.cursor() as cursor:
-            # Запрос для получения последних ресурсов денег (по дате создания)
+            # Последние деньги мира лежат в актуальном состоянии (см. migrations/002_world_current_state.sql)
             cursor.execute("""
                 SELECT money_resource
-                FROM world_resources
+                FROM world_resources_current
                 WHERE world_id = %s
-                ORDER BY date_generated DESC  -- Сортируем по убыванию даты (последние записи в начале)
-                LIMIT 1                       -- Берём только 1 самую свежую запись
             """, (world_id,))
 
             result = cursor.fetchone()  # Получаем первую строку результата
@@ -66,13 +64,11 @@ def get_current_money_from_db(connection, world_id):
 def get_current_money_multiplier_from_db(connection, world_id):
     try:
         with connection.cursor() as cursor:
-            # Запрос для получения последнего коэффициента денег (по дате создания)
+            # Последний коэффициент роста денег лежит в актуальном состоянии мира
             cursor.execute("""
                 SELECT money_multiplier
-                FROM world_resources
+                FROM world_resources_current
                 WHERE world_id = %s
-                ORDER BY date_generated DESC  -- Сортируем по убыванию даты (последние записи в начале)
-                LIMIT 1                       -- Берём только 1 самую свежую запись
             """, (world_id,))
 
             result = cursor.fetchone()  # Получаем первую строку результата
@@ -87,45 +83,61 @@ def get_current_money_multiplier_from_db(connection, world_id):
         return None
 
 
-def save_new_money_to_db(connection, world_id, new_money):
+def get_current_resources_for_update(connection, world_id):
     """
-    Обновляет ресурс денег (money_resource) для указанного мира в базе данных.
+    Читает последние ресурсы мира и блокирует эту строку до конца транзакции.
 
-    :param connection: Объект подключения к базе данных
-    :param world_id: ID мира, для которого обновляется значение
-    :param new_money: Новое значение денег (money_resource)
+    Вызывается внутри session(): параллельный ход по тому же миру будет ждать,
+    пока текущая транзакция не закоммитится.
+
+    :return: (money_resource, money_multiplier, people_resource, people_multiplier),
+             либо (0, 0, 0, 1), если ресурсов ещё нет
     """
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                UPDATE world_resources
-                SET money_resource = %s
-                WHERE world_id = %s;
-            """, (new_money, world_id))
-        connection.commit()  # Фиксируем изменения в базе
-        print(f"Обновлено money_resource для world_id={world_id}: {new_money}")
-    except psycopg2.Error as e:
-        print(f"Ошибка при обновлении money_resource: {e}")
-        connection.rollback()  # Откатываем изменения в случае ошибки
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT money_resource, money_multiplier, people_resource, people_multiplier
+            FROM world_resources_current
+            WHERE world_id = %s
+            FOR UPDATE
+        """, (world_id,))
+
+        result = cursor.fetchone()
+
+    if result:
+        return result[0], result[1], result[2] or 0, result[3] if result[3] is not None else Decimal(1)
 
+    return 0, 0, 0, Decimal(1)
 
-def save_new_money_multiplier_to_db(connection: object, world_id: object, new_multiplier: object) -> None:
+
+def save_resource_snapshot(connection, world_id, new_money, new_multiplier, new_people=None):
     """
-    Обновляет коэффициент роста денег (money_multiplier) для указанного мира в базе данных.
+    Записывает ресурсы мира после хода новой строкой истории world_resources.
+
+    Деньги, коэффициент роста и население пишутся одним INSERT; если население не передано,
+    оно и коэффициент его роста переносятся из актуального состояния.
+    Старые строки истории не трогаются, а world_resources_current обновляет триггер
+    (см. migrations/002_world_current_state.sql), поэтому стоимость записи не растёт с длиной игры.
+    Коммит делает вызывающий (см. database.session), ошибки пробрасываются, чтобы откатить транзакцию целиком.
 
-    :param connection: Объект подключения к базе данных
-    :param world_id: ID мира, для которого обновляется значение
+    :param connection: Соединение открытой транзакции
+    :param world_id: ID мира
+    :param new_money: Новое значение денег (money_resource)
     :param new_multiplier: Новое значение коэффициента роста денег (money_multiplier)
+    :param new_people: Новое население (people_resource) или None
+    :return: ID новой строки world_resources
     """
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                UPDATE world_resources
-                SET money_multiplier = %s
-                WHERE world_id = %s;
-            """, (new_multiplier, world_id))
-        connection.commit()  # Фиксируем изменения в базе
-        print(f"Обновлено money_multiplier для world_id={world_id}: {new_multiplier}")
-    except psycopg2.Error as e:
-        print(f"Ошибка при обновлении money_multiplier: {e}")
-        connection.rollback()  # Откатываем изменения в случае ошибки
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO world_resources
+            (world_id, money_resource, money_multiplier, people_resource, people_multiplier, date_generated)
+            SELECT %(world_id)s, %(money)s, %(multiplier)s,
+                   COALESCE(%(people)s::INT, cur.people_resource, 0), COALESCE(cur.people_multiplier, 1.00), CURRENT_TIMESTAMP
+            FROM (SELECT %(world_id)s AS world_id) AS w
+            LEFT JOIN world_resources_current cur ON cur.world_id = w.world_id
+            RETURNING id
+        """, {"world_id": world_id, "money": new_money, "multiplier": new_multiplier, "people": new_people})
+
+        resource_id = cursor.fetchone()[0]
+
+    logger.info(f"Ресурсы мира world_id={world_id} после хода: деньги {new_money}, коэффициент роста {new_multiplier}, население {new_people}")
+    return resource_id
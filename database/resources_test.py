@@ -0,0 +1,48 @@
+import unittest
+
+from database import run_in_transaction, save_resource_snapshot, save_world_resources_to_db, get_current_resources_for_update, load_world_state
+from database.connection import connection
+from database.worlds import World
+
+
+def resource_rows(world_id):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, money_resource, money_multiplier, people_resource FROM world_resources WHERE world_id = %s ORDER BY id",
+                (world_id,)
+            )
+            return cursor.fetchall()
+
+
+class MyTestCase(unittest.TestCase):
+    def test_snapshot_appends_and_keeps_history(self):
+        world_id = World().save(1, "test description")
+        save_world_resources_to_db(world_id, {"Деньги (монет)": 1000, "Население (людей)": 50})
+        first = resource_rows(world_id)
+
+        run_in_transaction(save_resource_snapshot, world_id, 900, 1.1)
+        run_in_transaction(save_resource_snapshot, world_id, 800, 1.2)
+
+        rows = resource_rows(world_id)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0], first[0])  # Старая строка не переписана
+        self.assertEqual([float(row[1]) for row in rows], [1000, 900, 800])
+        self.assertEqual(rows[2][3], 50)  # Население перенесено из предыдущей строки
+
+        money, multiplier, people, _ = run_in_transaction(get_current_resources_for_update, world_id)
+        self.assertEqual((float(money), float(multiplier), people), (800, 1.2, 50))
+
+        run_in_transaction(save_resource_snapshot, world_id, 700, 1.2, 55)
+        self.assertEqual(resource_rows(world_id)[-1][3], 55)  # Население после хода записано
+
+    def test_empty_treasury_differs_from_missing_resources(self):
+        world_id = World().save(1, "test description")
+        self.assertIsNone(run_in_transaction(load_world_state, world_id).money)
+
+        save_world_resources_to_db(world_id, {"Деньги (монет)": 0, "Население (людей)": 50})
+        self.assertEqual(run_in_transaction(load_world_state, world_id).money, 0)  # Пустая казна - не отсутствие ресурсов
+
+
+if __name__ == '__main__':
+    unittest.main()
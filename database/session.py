@@ -0,0 +1,78 @@
+# session.py - модуль транзакций (единиц работы) поверх пула соединений
+
+import logging
+import os
+from contextlib import contextmanager
+
+import psycopg2
+
+from database.connection import connection, is_connection_error
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторяем транзакцию, если соединение отвалилось или транзакция проиграла конфликт
+DB_RECONNECT_RETRIES = int(os.getenv("DB_RECONNECT_RETRIES", 2))
+
+# Конфликт сериализации и взаимная блокировка: соединение живо, транзакцию можно просто повторить
+RETRY_SQLSTATES = ("40001", "40P01")
+
+
+@contextmanager
+def session(timeout=None):
+    """
+    Одна транзакция на своём соединении из пула.
+
+    Всё, что выполнено внутри блока with, коммитится одним махом при выходе из блока
+    или целиком откатывается при ошибке.
+    """
+    with connection(timeout) as conn:
+        yield conn
+        conn.commit()
+
+
+def run_in_transaction(func, *args, retries=DB_RECONNECT_RETRIES, **kwargs):
+    """
+    Выполняет func(conn, *args, **kwargs) в отдельной транзакции.
+
+    Если транзакция проиграла конфликт (RETRY_SQLSTATES), она откатывается и func повторяется
+    на том же соединении. Если соединение умерло (рестарт базы, обрыв сети), транзакция откатывается
+    вместе с ним, а func повторяется на свежем соединении из пула. Кроме обрыва во время COMMIT:
+    сервер мог успеть закоммитить, и повтор применил бы ход дважды - такая ошибка уходит вызывающему.
+    Повторы идут сразу, без пауз: функция выполняется в потоке исполнителя БД, и сон занимал бы его.
+    Если база недоступна, ошибка быстро доходит до вызывающего. Остальные ошибки пробрасываются как есть.
+    """
+    attempt = 0
+
+    while True:
+        committing = False
+        try:
+            with connection() as conn:
+                while True:
+                    try:
+                        result = func(conn, *args, **kwargs)
+                        committing = True
+                        conn.commit()
+                        return result
+                    except psycopg2.Error as e:
+                        if e.pgcode not in RETRY_SQLSTATES or attempt >= retries:
+                            raise
+
+                        # Конфликт отвергнут сервером, в том числе на COMMIT - транзакция точно не применилась
+                        committing = False
+                        attempt += 1
+                        logger.warning(f"Конфликт транзакции ({e.pgcode}), повторяем, попытка {attempt}...")
+                        conn.rollback()
+        except psycopg2.Error as e:
+            if not is_connection_error(e):
+                raise
+            if committing:
+                logger.error(f"Соединение с БД потеряно во время COMMIT, транзакция могла примениться - не повторяем: {e}")
+                raise
+            if attempt >= retries:
+                logger.error(f"Не удалось выполнить транзакцию после {attempt + 1} попыток: {e}")
+                raise
+
+            attempt += 1
+            logger.warning(f"Соединение с БД потеряно ({e}), переподключаемся, попытка {attempt}...")
@@ -0,0 +1,64 @@
+import time
+import unittest
+
+import psycopg2
+
+from database import run_in_transaction
+
+
+# Ошибка с нужным SQLSTATE прямо от сервера
+def raise_sqlstate(conn, sqlstate):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DO $$ BEGIN RAISE EXCEPTION 'test' USING ERRCODE = '{sqlstate}'; END $$")
+
+
+class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+
+    def fail_then_succeed(self, conn, sqlstate, failures):
+        self.connections.append(conn)
+        if len(self.connections) <= failures:
+            raise_sqlstate(conn, sqlstate)
+        return "ok"
+
+    def test_conflict_is_retried_on_same_connection(self):
+        for sqlstate in ("40001", "40P01"):
+            self.connections = []
+
+            self.assertEqual(run_in_transaction(self.fail_then_succeed, sqlstate, 2), "ok")
+
+            self.assertEqual(len(self.connections), 3)
+            self.assertEqual(len({id(conn) for conn in self.connections}), 1)
+            self.assertFalse(self.connections[0].closed)
+
+    def test_connection_error_is_retried_on_fresh_connection(self):
+        self.assertEqual(run_in_transaction(self.fail_then_succeed, "08006", 1), "ok")
+
+        self.assertEqual(len(self.connections), 2)
+        self.assertTrue(self.connections[0].closed)  # Мёртвое соединение в пул не вернулось
+
+    def test_connection_lost_on_commit_is_not_retried(self):
+        def lose_connection_before_commit(conn):
+            self.connections.append(conn)
+            with conn.cursor() as cursor:
+                # Сервер закроет соединение, пока транзакция простаивает, - ошибку увидит уже COMMIT
+                cursor.execute("SET idle_in_transaction_session_timeout = '50ms'")
+            time.sleep(0.3)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            run_in_transaction(lose_connection_before_commit)
+
+        self.assertEqual(len(self.connections), 1)  # Ход мог примениться - повтор применил бы его дважды
+
+    def test_query_error_keeps_connection(self):
+        # Таймаут запроса - тоже OperationalError, но соединение живо
+        with self.assertRaises(psycopg2.errors.QueryCanceled):
+            run_in_transaction(self.fail_then_succeed, "57014", 1)
+
+        self.assertEqual(len(self.connections), 1)
+        self.assertFalse(self.connections[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
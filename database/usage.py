@@ -0,0 +1,41 @@
+# usage.py - модуль для сохранения расхода GPT в базу данных
+
+import logging
+from datetime import datetime
+from psycopg2.extras import execute_values
+from database.connection import connection
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сохраняем пачку записей о вызовах GPT (client.usage.GptCallRecord) одним запросом
+def save_gpt_usage(records):
+    if not records:
+        return 0
+
+    rows = [
+        (
+            record.name, record.model, record.status, int(record.duration * 1000),
+            record.prompt_tokens, record.cached_tokens, record.completion_tokens,
+            record.telegram_id, record.world_id, record.game_year,
+            datetime.fromtimestamp(record.created_at)
+        )
+        for record in records
+    ]
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO gpt_usage
+                (call_name, model, status, duration_ms, prompt_tokens, cached_tokens, completion_tokens,
+                 telegram_id, world_id, game_year, created_at)
+                VALUES %s
+                """,
+                rows
+            )
+        conn.commit()
+
+    return len(rows)
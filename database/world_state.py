@@ -0,0 +1,90 @@
+# world_state.py - модуль загрузки полного состояния мира одним запросом
+
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METRIC_KEYS = (
+    "economy_metric",
+    "social_stability_metric",
+    "ecology_metric",
+    "security_metric",
+    "political_support_metric",
+)
+
+
+# Снимок мира на начало хода: описание, последние ресурсы, последние метрики и персонаж игрока
+@dataclass
+class WorldState:
+    world_id: int
+    in_game_year: Optional[int]
+    description: Optional[str]
+    money: Optional[Decimal] = None  # None - ресурсы миру ещё не записаны
+    money_multiplier: Decimal = Decimal(0)
+    people: int = 0
+    people_multiplier: Decimal = Decimal(1)
+    metrics: Optional[Dict[str, int]] = None
+    character_description: Optional[str] = None
+
+    @property
+    def budget(self):
+        """Доступный на ход бюджет: текущий баланс, умноженный на коэффициент роста."""
+        return (self.money or Decimal(0)) * self.money_multiplier
+
+
+def load_world_state(connection, world_id, user_id=None):
+    """
+    Загружает состояние мира за один запрос к базе.
+
+    :param connection: Соединение с базой данных
+    :param world_id: ID мира
+    :param user_id: ID игрока, чей персонаж нужен. Если None - берётся последний персонаж мира
+    :return: WorldState или None, если мира нет
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT w.world_id, w.in_game_year, w.world_description,
+                   r.money_resource, r.money_multiplier, r.people_resource, r.people_multiplier,
+                   m.economy_metric, m.social_stability_metric, m.ecology_metric,
+                   m.security_metric, m.political_support_metric,
+                   c.character_description
+            FROM worlds w
+            LEFT JOIN world_resources_current r ON r.world_id = w.world_id
+            LEFT JOIN world_metrics_current m ON m.world_id = w.world_id
+            LEFT JOIN LATERAL (
+                SELECT character_description
+                FROM characters
+                WHERE world_id = w.world_id
+                  AND (%(user_id)s::INT IS NULL OR user_id = %(user_id)s::INT)
+                ORDER BY date_generated DESC, character_id DESC
+                LIMIT 1
+            ) c ON TRUE
+            WHERE w.world_id = %(world_id)s
+        """, {"world_id": world_id, "user_id": user_id})
+
+        row = cursor.fetchone()
+
+    if not row:
+        logger.warning(f"Мир с ID {world_id} не найден.")
+        return None
+
+    metrics = None
+    if row[7] is not None:
+        metrics = dict(zip(METRIC_KEYS, row[7:12]))
+
+    return WorldState(
+        world_id=row[0],
+        in_game_year=row[1],
+        description=row[2],
+        money=row[3],
+        money_multiplier=row[4] if row[4] is not None else Decimal(0),
+        people=row[5] or 0,
+        people_multiplier=row[6] if row[6] is not None else Decimal(1),
+        metrics=metrics,
+        character_description=row[12],
+    )
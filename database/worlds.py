@@ -1,24 +1,19 @@
 # worlds.py - модуль для работы с мирами в базе данных
 
 import logging
-from database.connection import get_db_connection, insert_returning_id, fetchone
+from database.connection import connection, insert_returning_id, fetchone
+from database.session import session
 
 # Включаем логирование
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Класс, который будет в себе хранить набор функций для работы с миром
+# Соединения берутся из общего пула на время каждого вызова, своего соединения класс не держит
 class World:
-    def __init__(self):
-        # Создание нового соединения к базке - ресурсозатратно, поэтому подключаемся один раз и сохраняем соединение в переменной
-        self.conn = get_db_connection()
-
-    # При удалении экземпляра класса, закрываем соединение с БД
-    def __del__(self):
-        self.conn.close()
-
     # сохраняем мир в базку, возвращаем айдишник
-    def save(self, year, description):
+    # pool_status задаётся для миров, которые готовятся заранее для пула (см. world_pool.py)
+    def save(self, year, description, pool_status=None):
         if not description:
             logger.error("Ошибка: описание мира пустое!")
             return None
@@ -26,11 +21,12 @@ class World:
         logger.info(f"Записываем описание мира: {description}")
 
         try:
-            world_id = insert_returning_id(
-                self.conn,
-                "INSERT INTO worlds (in_game_year, world_description, date_generated) VALUES (%s, %s, CURRENT_TIMESTAMP) RETURNING world_id",
-                (year, description)
-            )
+            with connection() as conn:
+                world_id = insert_returning_id(
+                    conn,
+                    "INSERT INTO worlds (in_game_year, world_description, pool_status, date_generated) VALUES (%s, %s, %s, CURRENT_TIMESTAMP) RETURNING world_id",
+                    (year, description, pool_status)
+                )
             return world_id
         except Exception as e:
             logger.error(f"Ошибка при сохранении мира: {e}")
@@ -39,11 +35,12 @@ class World:
     # Получаем описание мира по айдишнику
     def get(self, world_id):
         try:
-            result = fetchone(
-                self.conn,
-                "SELECT world_description FROM worlds WHERE world_id = %s",
-                (world_id,)
-            )
+            with connection() as conn:
+                result = fetchone(
+                    conn,
+                    "SELECT world_description FROM worlds WHERE world_id = %s",
+                    (world_id,)
+                )
 
             return result
         except Exception as e:
@@ -51,29 +48,127 @@ class World:
             return None
 
     # Обновляем описание мира после инициативы
-    def update_description(self, world_id, new_description):
+    def update_description(self, world_id, new_description, conn=None):
         """
         Обновляет описание мира.
 
         :param world_id: ID мира.
         :param new_description: Новое описание.
+        :param conn: Соединение внешней транзакции (см. database.session). Если передано,
+                     коммит и откат делает вызывающий, а ошибки пробрасываются ему.
         :return: True, если успешно, иначе False.
         """
         if not new_description:
             logger.error("Ошибка: новое описание мира пустое!")
             return False
 
+        if conn is not None:
+            self._update_description(conn, world_id, new_description)
+            return True
+
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute("""
-                    UPDATE worlds
-                    SET world_description = %s
-                    WHERE world_id = %s;
-                """, (new_description, world_id))
-            self.conn.commit()
-            logger.info(f"Описание мира обновлено для world_id {world_id}.")
+            with session() as conn:
+                self._update_description(conn, world_id, new_description)
             return True
         except Exception as e:
             logger.error(f"Ошибка при обновлении описания мира: {e}")
-            self.conn.rollback()
-            return False
\ No newline at end of file
+            return False
+
+    def _update_description(self, conn, world_id, new_description):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE worlds
+                SET world_description = %s
+                WHERE world_id = %s;
+            """, (new_description, world_id))
+        logger.info(f"Описание мира обновлено для world_id {world_id}.")
+
+    # Меняем статус мира в пуле ('ready', 'failed')
+    def set_pool_status(self, world_id, pool_status):
+        with session() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE worlds SET pool_status = %s WHERE world_id = %s",
+                    (pool_status, world_id)
+                )
+
+    # Сколько готовых миров лежит в пуле в каждом диапазоне лет
+    def count_pool(self, eras):
+        """
+        :param eras: Список диапазонов лет [(min_year, max_year), ...]
+        :return: Список количеств готовых миров в том же порядке
+        """
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT era.min_year, era.max_year, COUNT(w.world_id)
+                    FROM unnest(%s::INT[], %s::INT[]) AS era(min_year, max_year)
+                    LEFT JOIN worlds w
+                      ON w.pool_status = 'ready'
+                     AND w.in_game_year BETWEEN era.min_year AND era.max_year
+                    GROUP BY era.min_year, era.max_year
+                """, ([era[0] for era in eras], [era[1] for era in eras]))
+                counts = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+        return [counts.get(tuple(era), 0) for era in eras]
+
+    # Забираем из пула готовый мир
+    def claim_from_pool(self, min_year=None, max_year=None):
+        """
+        Атомарно забирает готовый мир из пула. Параллельные вызовы не ждут друг друга
+        и не получают один и тот же мир (FOR UPDATE SKIP LOCKED).
+
+        :param min_year: Нижняя граница года (None - без ограничения)
+        :param max_year: Верхняя граница года (None - без ограничения)
+        :return: (world_id, in_game_year, world_description) или None, если подходящих миров нет
+        """
+        with session() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE worlds
+                    SET pool_status = NULL
+                    WHERE world_id = (
+                        SELECT world_id
+                        FROM worlds
+                        WHERE pool_status = 'ready'
+                          AND (%(min_year)s::INT IS NULL OR in_game_year >= %(min_year)s::INT)
+                          AND (%(max_year)s::INT IS NULL OR in_game_year <= %(max_year)s::INT)
+                        ORDER BY world_id
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING world_id, in_game_year, world_description
+                """, {"min_year": min_year, "max_year": max_year})
+
+                return cursor.fetchone()
+
+    # Удаляем миры пула, которые так и не стали готовыми: упавшие и брошенные в 'generating'
+    def delete_stale_pool_worlds(self, older_than):
+        """
+        Мир остаётся в 'generating', если бот остановили посреди подготовки. Такие миры никогда
+        не выдаются игрокам, поэтому удаляем их вместе с уже записанными метриками, новостями и ресурсами.
+
+        :param older_than: Сколько секунд назад мир должен был начать готовиться, чтобы считать его брошенным
+        :return: Сколько миров удалено
+        """
+        with session() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT world_id
+                    FROM worlds
+                    WHERE pool_status IN ('generating', 'failed')
+                      AND date_generated < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    FOR UPDATE SKIP LOCKED
+                """, (older_than,))
+                world_ids = [row[0] for row in cursor.fetchall()]
+
+                if not world_ids:
+                    return 0
+
+                # Таблицы без ON DELETE CASCADE чистим сами, остальные удалятся вместе с миром
+                for table in ("characters", "world_metrics", "world_statistics"):
+                    cursor.execute(f"DELETE FROM {table} WHERE world_id = ANY(%s)", (world_ids,))
+                cursor.execute("DELETE FROM worlds WHERE world_id = ANY(%s)", (world_ids,))
+
+        logger.info(f"Удалено {len(world_ids)} брошенных миров пула.")
+        return len(world_ids)
@@ -1,8 +1,17 @@
 import unittest
 
+from database import save_world_metrics_to_db
+from database.connection import connection
 from database.worlds import World
 
 
+def world_exists(world_id):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM worlds WHERE world_id = %s", (world_id,))
+            return cursor.fetchone() is not None
+
+
 class MyTestCase(unittest.TestCase):
     def test_insert_world(self):
         world = World()
@@ -15,6 +24,24 @@ class MyTestCase(unittest.TestCase):
         print(result)
         self.assertEqual(True, True)
 
+    def test_delete_stale_pool_worlds(self):
+        world = World()
+        stale_id = world.save(1, "брошенный мир", "generating")
+        fresh_id = world.save(1, "мир, который ещё готовится", "generating")
+        save_world_metrics_to_db(stale_id, {"economy_metric": 1, "social_stability_metric": 0, "ecology_metric": 0,
+                                            "security_metric": 0, "political_support_metric": 0})
+
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("UPDATE worlds SET date_generated = CURRENT_TIMESTAMP - INTERVAL '2 hours' WHERE world_id = %s",
+                               (stale_id,))
+            conn.commit()
+
+        self.assertGreaterEqual(world.delete_stale_pool_worlds(3600), 1)
+        self.assertFalse(world_exists(stale_id))
+        self.assertTrue(world_exists(fresh_id))
+        world.set_pool_status(fresh_id, None)
+
 
 if __name__ == '__main__':
     unittest.main()
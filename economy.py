@@ -0,0 +1,140 @@
+# economy.py - детерминированная экономика мира: казна, население и коэффициенты роста
+#
+# За год казна растёт в money_multiplier раз, затем из неё списываются затраты на инициативу,
+# а коэффициент роста сдвигается на дельту, которую оценил GPT. Население растёт в people_multiplier раз.
+# Правила из промпта (prompts.py) здесь проверяются, а не только просятся у GPT:
+#  - затраты не больше доступного бюджета, казна не уходит в минус,
+#  - коэффициент роста меняется не больше чем на MAX_MULTIPLIER_DELTA за год
+#    и остаётся в пределах [MIN_MONEY_MULTIPLIER, MAX_MONEY_MULTIPLIER],
+#  - население не выходит за пределы столбца в БД, иначе запись хода упала бы целиком.
+#
+# advance - один мир, точно, в Decimal (как хранится в БД).
+# advance_batch - тысячи миров за один шаг на NumPy, в float64, с тем же округлением до копеек.
+
+import os
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# Насколько коэффициент роста денег может измениться за год
+MAX_MULTIPLIER_DELTA = Decimal(os.getenv("ECONOMY_MAX_MULTIPLIER_DELTA", "0.5"))
+# Пределы коэффициента роста денег (money_multiplier в БД - DECIMAL(5, 2))
+MIN_MONEY_MULTIPLIER = Decimal(os.getenv("ECONOMY_MIN_MONEY_MULTIPLIER", "0.1"))
+MAX_MONEY_MULTIPLIER = Decimal(os.getenv("ECONOMY_MAX_MONEY_MULTIPLIER", "10"))
+# Предел казны (money_resource в БД - DECIMAL(15, 2))
+MAX_MONEY = Decimal("9999999999999.99")
+# Предел населения (people_resource в БД - INT)
+MAX_PEOPLE = 2147483647
+
+# Точность хранения в БД
+CENTS = Decimal("0.01")
+
+
+# Экономика одного мира на начало года
+@dataclass(frozen=True)
+class EconomyState:
+    money: Decimal
+    money_multiplier: Decimal
+    people: int = 0
+    people_multiplier: Decimal = Decimal(1)
+
+    @property
+    def budget(self):
+        """Доступный на год бюджет: казна, выросшая за год."""
+        return Decimal(self.money) * Decimal(self.money_multiplier)
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def advance(state: EconomyState, cost=0, multiplier_delta=0) -> EconomyState:
+    """
+    Один год экономики мира.
+
+    :param state: Экономика на начало года
+    :param cost: Затраты на инициативу; больше бюджета списать нельзя
+    :param multiplier_delta: Изменение коэффициента роста денег
+    :return: Экономика на конец года, деньги и коэффициенты округлены до копеек
+    """
+    budget = state.budget
+    spent = _clamp(_decimal(cost), Decimal(0), budget)
+    money = _clamp(budget - spent, Decimal(0), MAX_MONEY)
+
+    delta = _clamp(_decimal(multiplier_delta), -MAX_MULTIPLIER_DELTA, MAX_MULTIPLIER_DELTA)
+    money_multiplier = _clamp(_decimal(state.money_multiplier) + delta, MIN_MONEY_MULTIPLIER, MAX_MONEY_MULTIPLIER)
+
+    people = int(Decimal(state.people) * _decimal(state.people_multiplier))
+
+    return EconomyState(
+        money=money.quantize(CENTS, rounding=ROUND_HALF_UP),
+        money_multiplier=money_multiplier.quantize(CENTS, rounding=ROUND_HALF_UP),
+        people=min(max(0, people), MAX_PEOPLE),
+        people_multiplier=_decimal(state.people_multiplier),
+    )
+
+
+# Экономика многих миров сразу: по массиву на каждое поле, i-й элемент - i-й мир
+@dataclass
+class EconomyBatch:
+    money: np.ndarray
+    money_multiplier: np.ndarray
+    people: np.ndarray
+    people_multiplier: np.ndarray
+
+    def __len__(self):
+        return len(self.money)
+
+    @classmethod
+    def from_states(cls, states):
+        return cls(
+            money=np.array([float(state.money) for state in states], dtype=np.float64),
+            money_multiplier=np.array([float(state.money_multiplier) for state in states], dtype=np.float64),
+            people=np.array([state.people for state in states], dtype=np.int64),
+            people_multiplier=np.array([float(state.people_multiplier) for state in states], dtype=np.float64),
+        )
+
+    def to_states(self):
+        return [
+            EconomyState(
+                money=Decimal(f"{money:.2f}"),
+                money_multiplier=Decimal(f"{money_multiplier:.2f}"),
+                people=int(people),
+                people_multiplier=Decimal(f"{people_multiplier:.2f}"),
+            )
+            for money, money_multiplier, people, people_multiplier
+            in zip(self.money, self.money_multiplier, self.people, self.people_multiplier)
+        ]
+
+
+def advance_batch(batch: EconomyBatch, cost=None, multiplier_delta=None) -> EconomyBatch:
+    """
+    Один год экономики для всех миров batch теми же правилами, что и advance.
+
+    :param batch: Экономика миров на начало года
+    :param cost: Затраты каждого мира (массив или число); None - без затрат
+    :param multiplier_delta: Изменения коэффициента роста (массив или число); None - без изменений
+    :return: Новый EconomyBatch; исходный не изменяется
+    """
+    budget = batch.money * batch.money_multiplier
+    spent = np.clip(0.0 if cost is None else np.asarray(cost, dtype=np.float64), 0.0, budget)
+    money = np.clip(budget - spent, 0.0, float(MAX_MONEY))
+
+    delta = np.clip(0.0 if multiplier_delta is None else np.asarray(multiplier_delta, dtype=np.float64),
+                    -float(MAX_MULTIPLIER_DELTA), float(MAX_MULTIPLIER_DELTA))
+    money_multiplier = np.clip(batch.money_multiplier + delta, float(MIN_MONEY_MULTIPLIER), float(MAX_MONEY_MULTIPLIER))
+
+    # Поправка на погрешность float64, чтобы округление вниз совпадало с advance в Decimal
+    people = np.clip(np.floor(batch.people * batch.people_multiplier + 1e-6), 0, MAX_PEOPLE).astype(np.int64)
+
+    return EconomyBatch(
+        money=np.round(money, 2),
+        money_multiplier=np.round(money_multiplier, 2),
+        people=people,
+        people_multiplier=batch.people_multiplier.copy(),
+    )
@@ -0,0 +1,74 @@
+import random
+import unittest
+from decimal import Decimal
+
+import numpy as np
+
+from economy import MAX_PEOPLE, EconomyState, EconomyBatch, advance, advance_batch
+
+
+class MyTestCase(unittest.TestCase):
+    def test_advance_grows_then_spends(self):
+        state = EconomyState(Decimal("1000"), Decimal("1.2"), people=50, people_multiplier=Decimal("1.1"))
+
+        result = advance(state, cost=100, multiplier_delta=0.1)
+
+        self.assertEqual(result.money, Decimal("1100.00"))  # 1000 * 1.2 - 100
+        self.assertEqual(result.money_multiplier, Decimal("1.30"))
+        self.assertEqual(result.people, 55)
+
+    def test_advance_clamps_gpt_estimates(self):
+        state = EconomyState(Decimal("100"), Decimal("0.3"))
+
+        result = advance(state, cost=10_000, multiplier_delta=-2)
+
+        self.assertEqual(result.money, Decimal("0.00"))  # Больше бюджета не списать, в минус не уходим
+        self.assertEqual(result.money_multiplier, Decimal("0.10"))  # Не ниже нижнего предела
+
+        result = advance(state, cost=-50, multiplier_delta=3)
+        self.assertEqual(result.money, Decimal("30.00"))  # Отрицательные затраты не пополняют казну
+        self.assertEqual(result.money_multiplier, Decimal("0.80"))  # Не больше чем на 0.5 за год
+
+    def test_people_stays_within_column(self):
+        state = EconomyState(Decimal("100"), Decimal("1"), people=MAX_PEOPLE - 10, people_multiplier=Decimal("9.99"))
+
+        self.assertEqual(advance(state, cost=0, multiplier_delta=0).people, MAX_PEOPLE)
+        self.assertEqual(advance_batch(EconomyBatch.from_states([state]), [0], [0]).people[0], MAX_PEOPLE)
+
+    def test_batch_matches_single_world(self):
+        rng = random.Random(1)
+        states = [
+            EconomyState(Decimal(rng.randint(0, 10_000)), Decimal(rng.randint(10, 300)) / 100,
+                         people=rng.randint(0, 10_000), people_multiplier=Decimal(rng.randint(90, 120)) / 100)
+            for _ in range(200)
+        ]
+        costs = [rng.randint(0, 20_000) for _ in states]
+        deltas = [rng.randint(-80, 80) / 100 for _ in states]
+
+        expected = [advance(state, cost, delta) for state, cost, delta in zip(states, costs, deltas)]
+        actual = advance_batch(EconomyBatch.from_states(states), np.array(costs), np.array(deltas)).to_states()
+
+        for want, got in zip(expected, actual):
+            self.assertAlmostEqual(float(got.money), float(want.money), delta=0.011)
+            self.assertEqual(got.money_multiplier, want.money_multiplier)
+            self.assertEqual(got.people, want.people)
+
+    def test_batch_advances_many_worlds_per_tick(self):
+        count = 100_000
+        batch = EconomyBatch(
+            money=np.full(count, 1000.0),
+            money_multiplier=np.full(count, 1.1),
+            people=np.full(count, 500, dtype=np.int64),
+            people_multiplier=np.full(count, 1.02),
+        )
+
+        for _ in range(10):
+            batch = advance_batch(batch, cost=50.0)
+
+        self.assertEqual(len(batch), count)
+        self.assertTrue((batch.money > 0).all())
+        self.assertTrue((batch.people > 500).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
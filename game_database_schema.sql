@@ -1,5 +1,6 @@
 
 -- psql -U postgres -d game_world
+-- После создания базовой схемы применяем миграции из migrations/: python -m database.migrations
 
 -- Создание базы данных игры
 
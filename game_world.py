@@ -1,6 +1,12 @@
 import logging, os
 from dotenv import load_dotenv
-from client import Gpt
+from client import Gpt, GptError
+from client.routing import TASK_STRUCTURED, TASK_PROSE
+from gpt_responses import WorldMetrics, WorldResources, MetricsChanges, TurnResolution, ResponseParseError, parse_response
+from prompts import (
+    WORLD_PROMPT, WORLD_METRICS_PROMPT, WORLD_RESOURCES_PROMPT, UPDATE_METRICS_PROMPT, CHARACTER_PROMPT,
+    WORLD_NEWS_PROMPT, WORLD_CHANGES_PROMPT, TURN_RESOLUTION_PROMPT, HISTORY_SUMMARY_PROMPT
+)
 # Загружаем переменные из .env
 load_dotenv()
 
@@ -16,338 +22,267 @@ async def generate_world_from_gpt(game_year, max_tokens=800):
     try:
         logger.info("Запуск генерации мира...")  # Логируем начало функции
 
-        prompt = f"""
-        Внутриигровой год: {format_year(game_year)} 
-
-        Сгенерируй новый мир для для {format_year(game_year)} года. Забудь все, о чем мы говорили до этого момента.
-        Фокусируйся на этом временном промежутке - погрузи игрока в мир, расскажи о проблемах и вызовах, соответствующие этому времени. 
-        Текст должен быть написан в художественном стиле, напоминающем Тарантино или Гая Ричи, с драматургией, но без выхода за рамки реальной физики. 
-        Сохраняй историческую правдоподобность, делая мир напряжённым и погружающим, с яркими фразами, чтобы передать атмосферу времени.
-        
-        Текст должен содержать:
-        2. Проблемы и вызовы: социальные, политические, природные — что определяет жизнь людей? Сделай так, чтобы мир был драматичным и ощущался тяжёлым.
-        3. Место действия: придумай страну, город, важные локации, как реки, горы или фантастические регионы, но избегай сверхъестественного.
-        4. Культурные и религиозные аспекты: мифы, религии, искусство, письменность — как люди воспринимают мир?
-        5. Влияние эпохи на людей: как это время изменяет жизнь простых людей? Сделай акцент на трудности, борьбы и изменениях.
-        6. Драматургия и напряжённость: создай атмосферу напряжения, драмы, конфликтов, чтобы мир был живым и насыщенным.
-        
-        Собери в небольшой и динамичный рассказ из нескольких абзацев. Не уходи в излишние детали, но сделай так, чтобы мир казался реальным, напряжённым и наполненным драма-энергией.
-        """
+        messages = WORLD_PROMPT.render(year=format_year(game_year))
         
         # Генерация текста с использованием модели GPT
-        world_data = await client.prompt(prompt, max_tokens)
+        world_data = await client.chat(messages, max_tokens, task=TASK_PROSE, name=WORLD_PROMPT.name)
 
         logger.info("Ответ от OpenAI по генерации мира получен.")
         
         return world_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при запросе к OpenAI о генерации мира: {e}")
-        return "Произошла ошибка при генерации мира."
+        raise
     
 
-# Функция для генерации стартовых метрик мира через GPT
-async def generate_world_metrics(world_data, max_tokens=1500):
-    try:
-        logger.info("Запуск генерации метрик для мира...")
-
-        json_template = """{
-            "economy_metric": N,
-            "social_stability_metric": N,
-            "ecology_metric": N,
-            "security_metric": N,
-            "political_support_metric": N
-        }"""
-
-        prompt = f"""
-        На основе следующего описания мира, сгенерируй метрики для этого мира.
-
-        Описание мира:
-        {world_data}
-
-        Пожалуйста, сгенерируй следующие метрики:
-
-        Инструкция:
-        1. Экономика [economy_metric] (где):
-        +10: Экономическая сверхдержава, Экономика процветает, инновации на высоте, богатство в руках всех слоёв населения, страны завидуют.
-        -10: Финансовый апокалипсис — страна обанкротилась, дефолт, полное разрушение экономики.
-
-        2. Социальная стабильность [social_stability_metric] (где):
-        +10: Национальное единство, полное единство в обществе, нет социальной напряжённости, низкий уровень преступности.
-        -10: Полный коллапс, гражданская война, государственная власть потеряна, граждане начинают бороться за выживание.
-
-        3. Экология [ecology_metric] (где):
-        +10: Экологический рай, чистые воды, воздух, устойчивые экосистемы, возобновляемые источники энергии.
-        -10: Экологическая апокалипсис — экологическое разрушение, массовая миграция людей, исчезновение природы, климатическая катастрофа.
-
-        4. Безопасность [security_metric] (где):
-        +10: Полная безопасность, нет преступности, защита от внешних угроз на высшем уровне, внутренний мир и порядок.
-        -10: Полный коллапс безопасности — война, гражданская война, терроризм на всех уровнях, разрушение общества, потеря контроля.
+# Потоковая генерация мира: куски описания по мере генерации
+async def stream_world_from_gpt(game_year, max_tokens=800):
+    logger.info("Запуск потоковой генерации мира...")
 
-        5. Политическая поддержка [political_support_metric] (где):
-        +10: Полный авторитет власти, власть пользуется всеобщим уважением и поддержкой, стабильность, отсутствие коррупции.
-        -10: Диктатура / Революция — полный крах демократии, диктаторская власть, распад государства, народ не доверяет власти.
-
-        📌 Формат ответа
-        Твой ответ должен быть только JSON. Без кода, без комментариев, без пояснений.
-        Не используй ```python или другие форматы кодовых блоков.  
+    try:
+        messages = WORLD_PROMPT.render(year=format_year(game_year))
+        async for chunk in client.chat_stream(messages, max_tokens, task=TASK_PROSE, name=WORLD_PROMPT.name):
+            yield chunk
+    except GptError as e:
+        logger.error(f"Ошибка при потоковом запросе к OpenAI о генерации мира: {e}")
+        raise
 
-        📌 Структура JSON: {json_template}
+    logger.info("Поток от OpenAI по генерации мира завершён.")
 
-        📌 Правила для значений (N)
-        - Диапазон: от -10 до +10
-        - Тип данных: только число (integer)
-        - Запрещено: строки, комментарии, кодовые блоки, скобки `()`.
 
-        Отвечай только JSON, без лишнего текста.
+# Функция для генерации стартовых метрик мира через GPT
+async def generate_world_metrics(world_data, max_tokens=1500):
+    try:
+        logger.info("Запуск генерации метрик для мира...")
 
-        """
+        messages = WORLD_METRICS_PROMPT.render(world_data=world_data)
 
-        # Генерация метрик с использованием модели GPT
-        metrics_data = await client.prompt(prompt, max_tokens)
+        # Генерация метрик с использованием модели GPT (метрики зависят только от описания мира - ответ кэшируется).
+        # Короткий JSON - дешёвая модель; если ответ не по схеме, запрос повторяется на сильной модели
+        metrics_data = await client.chat(
+            messages, max_tokens, cache=True, task=TASK_STRUCTURED,
+            validate=lambda text: parse_response(text, WorldMetrics), name=WORLD_METRICS_PROMPT.name
+        )
 
         logger.info("Ответ от OpenAI по метрикам получен.")
         
         return metrics_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при генерации метрик: {e}")
-        return "Произошла ошибка при генерации метрик."
+        raise
     
 # Генерация ресурсов мира через GPT
 async def generate_world_resources(world_metrics, world_data, max_tokens=600):
     try:
         logger.info("Запуск генерации ресурсов мира...")
 
-        json_template = """{
-            "Деньги (монет)": N,
-            "Население (людей)": N
-        }"""
-
-        prompt = f"""
-        Пожалуйста, сгенерируй количество ресурсов для мира: {world_data}, а именно количество денег и населения.
-        Ценность денег: 1 единица монеты равна одному обычному обеду. 
-        Метрики мира: {world_metrics}.
+        messages = WORLD_RESOURCES_PROMPT.render(world_data=world_data, world_metrics=world_metrics)
 
-        📌 Формат ответа
-        Твой ответ должен быть только JSON. Без кода, без комментариев, без пояснений.
-        Не используй ```python, ```json  или другие форматы кодовых блоков.  
-
-        📌 Структура JSON: {json_template}
-
-        📌 Правила для значений (N)
-        - Тип данных: только число (integer), количество золота и населения
-        - Запрещено: строки, комментарии, кодовые блоки, скобки `()`.
-
-        Отвечай только JSON, без лишнего текста.
-        """
-
-        # Генерация персонажа с использованием модели GPT
-        character_data = await client.prompt(prompt, max_tokens)
+        # Генерация ресурсов с использованием модели GPT (зависят только от метрик и описания мира - ответ кэшируется)
+        character_data = await client.chat(
+            messages, max_tokens, cache=True, task=TASK_STRUCTURED,
+            validate=lambda text: parse_response(text, WorldResources), name=WORLD_RESOURCES_PROMPT.name
+        )
 
         logger.info("Ответ от OpenAI по генерации ресурсов мира получен.")
         
         return character_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при генерации ресурсов мира: {e}")
-        return "Произошла ошибка при генерации ресурсов мира."
+        raise
     
 # Функция для апдейта метрик мира через GPT
 async def update_world_metrics(world_data, initiation_details, max_tokens=1500):
     try:
         logger.info("Запуск генерации метрик для мира...")
 
-        json_template = """{
-            "economy_metric": N,
-            "social_stability_metric": N,
-            "ecology_metric": N,
-            "security_metric": N,
-            "political_support_metric": N
-        }"""
-
-        prompt = f"""
-        На основе следующего описания мира и инициативы игрока определи, какие метрики будут затронуты.
-        Не указывай конкретные числа, только влияние!
-
-        Описание мира:
-        {world_data}
-
-        Инициатива от пользователя:
-        {initiation_details}
-
-        📌 Структура JSON: {json_template}
-
-        📌 Правила:
-        - Если инициатива влияет положительно, ставь `"+"`
-        - Если инициатива влияет отрицательно, ставь `"-"`
-        - Если метрика не меняется, ставь `"0"`
-        - Не указывай числа! Только `"+", "-", "0"`
-
-        Ответь только JSON, без пояснений, начиная и заканчивая фигурными скобками.
-
-        """
+        messages = UPDATE_METRICS_PROMPT.render(world_data=world_data, initiation_details=initiation_details)
 
         # Генерация метрик с использованием модели GPT
-        metrics_data = await client.prompt(prompt, max_tokens)
+        metrics_data = await client.chat(
+            messages, max_tokens, task=TASK_STRUCTURED,
+            validate=lambda text: parse_response(text, MetricsChanges), name=UPDATE_METRICS_PROMPT.name
+        )
 
         logger.info("Ответ от OpenAI по метрикам получен.")
         
         return metrics_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при генерации метрик: {e}")
-        return "Произошла ошибка при генерации метрик."
+        raise
 
 # Функция для генерации персонажа через GPT
 async def generate_character(world_data, character_details, max_tokens=600):
     try:
         logger.info("Запуск генерации персонажа...")
 
-        prompt = f"""
-        На основе следующего описания мира и информации о персонаже, сгенерируй персонажа для игры до 400 символов.
-
-        Описание мира:
-        {world_data}
-
-        Детали персонажа:
-        {character_details}
-
-        Пожалуйста, создай деталезированное описание персонажа, включая его личные качества, мотивацию и внешний вид в кратком формате текста.
-        """
+        messages = CHARACTER_PROMPT.render(world_data=world_data, character_details=character_details)
 
         # Генерация персонажа с использованием модели GPT
-        character_data = await client.prompt(prompt, max_tokens)
+        character_data = await client.chat(messages, max_tokens, task=TASK_PROSE, name=CHARACTER_PROMPT.name)
 
         logger.info("Ответ от OpenAI по генерации персонажа получен.")
         
         return character_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при генерации персонажа: {e}")
-        return "Произошла ошибка при генерации персонажа."
+        raise
     
 # Функция для генерации новостей через GPT
 async def generate_world_news(game_year, world_data, world_metrics, max_tokens=6800):
     try:
         logger.info("Запуск генерации новостей...")
 
-        prompt = f"""
-        На основе следующего описания мира и метрик сгенерируй дайджест новостей этого мира до 800 символов.
+        messages = WORLD_NEWS_PROMPT.render(world_data=world_data, world_metrics=world_metrics, year=format_year(game_year))
 
-        Описание мира:
-        {world_data}
-
-        Метрики мира:
-        {world_metrics}
-
-        Внутриигровой год: 
-        {format_year(game_year)}
-
-        Пожалуйста, создай дайджест новостей, который описывает текущее состояние мира этого года, включая важные события, изменения и тенденции, которые происходят в нем.
-        Стиль повествования новостей должны соответствовать и отрожать достоверно эпоху, в которой они происходят (внутриигровой год) и использовать слова, доступные языку этого времени.
-        Представь, что ты - первые разворы популярной газеты для жителей. Твои заголовки пестрят и привлекают внимание. Ты избегаешь скучных формулировок 
-        и словосочетаний. Твоя задача -- увлечь читателя и погрузить в круговорот событий -- что происходила вчера, что происходит сегодня и что ждет нас завтра.
-        Не используй для форматирования текста **жирный** или _курсив_, так как это не поддерживается в данном формате. Используй капслок для заголовков 
-        и кратких выделений.
-        
-        """
-
-        # Генерация персонажа с использованием модели GPT
-        character_data = await client.prompt(prompt, max_tokens)
+        # Генерация новостей с использованием модели GPT
+        character_data = await client.chat(messages, max_tokens, task=TASK_PROSE, name=WORLD_NEWS_PROMPT.name)
 
         logger.info("Ответ от OpenAI по генерации новостей получен.")
         
         return character_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при генерации новостей: {e}")
-        return "Произошла ошибка при генерации новостей."
-    
-    
+        raise
+
+
+# Потоковая генерация новостей: куски дайджеста по мере генерации
+async def stream_world_news(game_year, world_data, world_metrics, max_tokens=6800):
+    logger.info("Запуск потоковой генерации новостей...")
+
+    try:
+        messages = WORLD_NEWS_PROMPT.render(world_data=world_data, world_metrics=world_metrics, year=format_year(game_year))
+        async for chunk in client.chat_stream(messages, max_tokens, task=TASK_PROSE, name=WORLD_NEWS_PROMPT.name):
+            yield chunk
+    except GptError as e:
+        logger.error(f"Ошибка при потоковой генерации новостей: {e}")
+        raise
+
+    logger.info("Поток от OpenAI по генерации новостей завершён.")
+
+
 # Функция для генерации изменения мира через GPT на основе пользовательских инициатив
 async def generate_world_changes(budget, money_multiplier, character_description, game_year, world_data, user_initiation, max_tokens=1200):
     try:
         logger.info("Запуск генерации изменений мира...")  # Логируем начало функции
 
-        prompt = f"""
-        Ты - симулятор мира, основанный на экономических и социальных моделях. Твоя задача — оценить и спрогнозировать реалистичные последствия инициативы пользователя, учитывая контекст текущего мира.
-
-        ### Входные данные:
-        - Инициатива пользователя: {user_initiation}
-        - Описание мира: {world_data}
-        - Описание персонажа игрока: {character_description}
-        - Внутриигровой год: {game_year}
-        - Доступный бюджет (монет): {budget} (1 единица = 1 обед)
-        - Текущий коэффициент роста денег: {money_multiplier}
-
-        ### Твоя задача:
-        1. Оценить стоимость инициативы и коэффициента роста:  
-           - Оцени, сколько потребуется ресурсов на её реализацию.
-           - Если инициатива критическая и требует больших затрат — можно большую часть бюджета, но в НОЛЬ НИКОГДА НЕ УХОДИШЬ.
-           - Если инициатива незначительная — оставь часть бюджета на будущее.
-           - Ты НЕ МОЖЕШЬ потратить больше, чем есть в доступном бюджете.
-           - Если инициатива требует больше средств, чем доступно, частично реализуй её в рамках доступных денег.
-           - Если инициатива выходит за рамки реалистичного — отклони её с объяснением.
-           
-           ### ШАГ 1: Оценка затрат на реализацию инициативы на текущий момент 'estimated_cost'
-            - Если инициатива требует инвестиций (например, строительство, реформы, военные операции) → оцени 'estimated_cost'.
-            - Если инициатива меняет законы, налоги, цены, но не требует прямых затрат** → `estimated_cost = 0`.
-            - Если инициатива критическая и требует больших затрат — можно использовать весь бюджет.
-            - Если инициатива незначительная — оставь часть бюджета на будущее.
-            - Если инициатива выходит за рамки реалистичного — отклони её с объяснением.
-            
-            ### ШАГ 2: Оценка `money_multiplier` (темп роста денег)
-            Определи, как инициатива влияет на рост денежной массы в казне.  
-            Текущий коэффициент роста денежной массы в казне: `{money_multiplier}`.  
-            ➡ Верни числовое изменение в `float`, например, `-0.2` вместо `-20%`.
-            📌 Важно! `money_multiplier` — это НЕ экономический рост, НЕ ВВП, НЕ уровень жизни.
-            ❌ Не оценивай его как рост экономики!  
-            ✅ Он используется ТОЛЬКО в формуле роста бюджета, и влияет ТОЛЬКО на деньги.
-            ❌ НЕ возвращай строку `"20%"` или `"-20%"`.
-            ✅ ВОЗВРАЩАЙ `float`, например, `-0.2` (для -20%) или `0.1` (для +10%).
-            
-            ---
-            
-            ### Правила изменений `money_multiplier`:
-            1. Маленькие изменения (стандартные реформы, налоги, локальные изменения)  
-               - `+0.1` → `-0.1`  
-            2. Средние изменения (технологии, торговые реформы, крупные проекты)  
-               - `+0.2` → `-0.2`  
-            3. Крупные изменения (сильные реформы, масштабные экономические изменения)  
-               - `+0.3` → `-0.3`  
-            4. Редкие экстремальные случаи (война, экономический коллапс, гениальный прорыв)  
-               - `+0.5` → `-0.5`  
-            
-            ### Жёсткие ограничения:
-            ✅ Не допускай изменений больше `±0.5` за 1 год
-            ✅ `money_multiplier` не может стать `0` или уйти в отрицательные значения
-            ✅ Если ситуация катастрофическая, минимальный `money_multiplier` = `-0.7` 
-
-        2. Смоделировать изменения в мире:  
-           - Как изменятся ключевые аспекты жизни после инициативы?  
-           - Учитывай закон сохранения ресурсов, закон спроса и предложения, закон устойчивости экосистем, социальную инерцию и другие законы реального мира.
-           - Изменения должны соответствовать тренду развития мира, не противоречить прошлым событиям.
-           - Если инициатива слишком глобальна для 1 года — внедри только реалистичную часть.
-
-        3. Сформировать ответ в формате JSON:  
-           ```json
-           {{
-               "financial_evaluation": {{
-                   "estimated_cost": float,  # Сколько денег потребуется на реализацию
-                   "money_multiplier_change": float  # Какая будет дельта изменения роста денег в казне
-               }},
-               "world_changes": {{
-                   "facts": str,  # Краткое описание изменений мира после инициативы (сухие факты)
-                   "npc_perspective": str  # Описание изменений от лица NPC (с эмоциями, личными историями), именно это сообщение целиком будет отправлено игроку
-               }}
-           }}
-
-        """
+        messages = WORLD_CHANGES_PROMPT.render(
+            world_data=world_data,
+            character_description=character_description,
+            year=format_year(game_year),
+            budget=budget,
+            money_multiplier=money_multiplier,
+            user_initiation=user_initiation
+        )
         
         # Генерация текста с использованием модели GPT
-        world_data = await client.prompt(prompt, max_tokens)
+        world_data = await client.chat(messages, max_tokens, task=TASK_PROSE, name=WORLD_CHANGES_PROMPT.name)
         
         logger.info("Ответ от OpenAI по генерации нового мира получен.")
         
         return world_data
-    except Exception as e:
+    except GptError as e:
         logger.error(f"Ошибка при запросе к OpenAI о генерации нового мира: {e}")
-        return "Произошла ошибка при генерации нового мира."
+        raise
+
+
+METRIC_KEYS = ["economy_metric", "social_stability_metric", "ecology_metric", "security_metric", "political_support_metric"]
+
+# JSON-схема ответа для resolve_turn (structured outputs: модель обязана ответить ровно в этой структуре)
+TURN_RESOLUTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "financial_evaluation": {
+            "type": "object",
+            "properties": {
+                "estimated_cost": {"type": "number"},
+                "money_multiplier_change": {"type": "number"}
+            },
+            "required": ["estimated_cost", "money_multiplier_change"],
+            "additionalProperties": False
+        },
+        "world_changes": {
+            "type": "object",
+            "properties": {
+                "facts": {"type": "string"},
+                "npc_perspective": {"type": "string"}
+            },
+            "required": ["facts", "npc_perspective"],
+            "additionalProperties": False
+        },
+        "metrics_changes": {
+            "type": "object",
+            "properties": {key: {"type": "string", "enum": ["+", "-", "0"]} for key in METRIC_KEYS},
+            "required": METRIC_KEYS,
+            "additionalProperties": False
+        },
+        "news": {"type": "string"}
+    },
+    "required": ["financial_evaluation", "world_changes", "metrics_changes", "news"],
+    "additionalProperties": False
+}
+
+# Функция для разрешения хода одним запросом к GPT: изменения мира, финансы, метрики и новости.
+# Заменяет цепочку generate_world_changes -> update_world_metrics -> generate_world_news.
+# Возвращает TurnResolution или None, если ответ не разобрался - тогда вызывающий откатывается на старую цепочку.
+# Если GPT недоступен, поднимает GptError
+async def resolve_turn(budget, money_multiplier, character_description, game_year, world_data, world_metrics, user_initiation, max_tokens=3000):
+    try:
+        logger.info("Запуск разрешения хода одним запросом...")
+
+        messages = TURN_RESOLUTION_PROMPT.render(
+            world_data=world_data,
+            character_description=character_description,
+            year=format_year(game_year),
+            world_metrics=world_metrics,
+            budget=budget,
+            money_multiplier=money_multiplier,
+            user_initiation=user_initiation
+        )
+
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": "turn_resolution", "strict": True, "schema": TURN_RESOLUTION_SCHEMA}
+        }
+
+        # Генерация разрешения хода с использованием модели GPT (JSON, но в нём повествование для игрока - большая модель)
+        resolution_data = await client.chat(messages, max_tokens, response_format=response_format, task=TASK_PROSE, name=TURN_RESOLUTION_PROMPT.name)
+
+        logger.info("Ответ от OpenAI по разрешению хода получен.")
+
+        return parse_response(resolution_data, TurnResolution)
+    except ResponseParseError:
+        logger.error("Ответ по разрешению хода не соответствует схеме.")
+        return None
+    except GptError as e:
+        logger.error(f"Ошибка при разрешении хода одним запросом: {e}")
+        raise
+
+# Функция для сжатия старых ходов в краткую сводку истории мира через GPT
+async def summarize_world_history(summary, turns, max_chars=1500, max_tokens=900):
+    try:
+        logger.info("Запуск сжатия истории мира...")
+
+        turns_text = "\n\n".join(
+            f"Год: {turn['year']}\nИнициатива игрока: {turn['initiative']}\nИзменения: {turn['changes']}"
+            for turn in turns
+        )
+
+        messages = HISTORY_SUMMARY_PROMPT.render(
+            summary=summary or "Сводки пока нет.",
+            turns=turns_text,
+            max_chars=max_chars
+        )
+
+        # Генерация сводки с использованием модели GPT
+        history_summary = await client.chat(messages, max_tokens, task=TASK_PROSE, name=HISTORY_SUMMARY_PROMPT.name)
+
+        logger.info("Ответ от OpenAI по сжатию истории мира получен.")
+
+        return history_summary
+    except GptError as e:
+        logger.error(f"Ошибка при сжатии истории мира: {e}")
+        return None
 
 
 def format_year(game_year):
@@ -0,0 +1,72 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # game_world создаёт клиента GPT при импорте
+
+from client import GptError
+from game_world import METRIC_KEYS, TURN_RESOLUTION_SCHEMA, resolve_turn
+from gpt_responses import TurnResolution
+
+RESOLUTION = {
+    "financial_evaluation": {"estimated_cost": 100, "money_multiplier_change": 0.1},
+    "world_changes": {"facts": "Построен мост", "npc_perspective": "Ура, мост!"},
+    "metrics_changes": {key: "+" for key in METRIC_KEYS},
+    "news": "МОСТ ПОСТРОЕН",
+}
+
+
+async def resolve(chat):
+    with mock.patch("game_world.client.chat", chat):
+        return await resolve_turn(1000, 1.2, "Король Артур", 1601, "Франция 16й век", {"economy_metric": 1}, "Построить мост")
+
+
+# Все объекты схемы в строгом режиме: обязательны все поля, лишние запрещены
+def strict_objects(schema):
+    if schema.get("type") == "object":
+        yield schema
+        for child in schema["properties"].values():
+            yield from strict_objects(child)
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_resolution_is_parsed(self):
+        resolution = await resolve(mock.AsyncMock(return_value=json.dumps(RESOLUTION, ensure_ascii=False)))
+
+        self.assertIsInstance(resolution, TurnResolution)
+        self.assertEqual(resolution.financial_evaluation.estimated_cost, 100)
+        self.assertEqual(resolution.world_changes.npc_perspective, "Ура, мост!")
+        self.assertEqual(resolution.metrics_changes.economy_metric, "+")
+        self.assertEqual(resolution.news, "МОСТ ПОСТРОЕН")
+
+    async def test_unparsed_resolution_returns_none(self):
+        broken = dict(RESOLUTION, world_changes={"facts": "", "npc_perspective": ""})
+
+        self.assertIsNone(await resolve(mock.AsyncMock(return_value="не json")))
+        self.assertIsNone(await resolve(mock.AsyncMock(return_value=json.dumps(broken))))
+
+    async def test_gpt_error_is_raised(self):
+        with self.assertRaises(GptError):
+            await resolve(mock.AsyncMock(side_effect=GptError("недоступен")))
+
+    async def test_strict_json_schema_is_sent(self):
+        chat = mock.AsyncMock(return_value=json.dumps(RESOLUTION))
+        await resolve(chat)
+
+        response_format = chat.await_args.kwargs["response_format"]
+        self.assertEqual(response_format["type"], "json_schema")
+        self.assertEqual(response_format["json_schema"]["name"], "turn_resolution")
+        self.assertTrue(response_format["json_schema"]["strict"])
+        self.assertIs(response_format["json_schema"]["schema"], TURN_RESOLUTION_SCHEMA)
+
+        for schema in strict_objects(TURN_RESOLUTION_SCHEMA):
+            self.assertEqual(set(schema["required"]), set(schema["properties"]))
+            self.assertFalse(schema["additionalProperties"])
+
+        # Схема и модель разбора описывают одни и те же поля
+        self.assertEqual(set(TURN_RESOLUTION_SCHEMA["properties"]), set(TurnResolution.model_fields))
+
+
+if __name__ == '__main__':
+    unittest.main()
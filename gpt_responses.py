@@ -0,0 +1,183 @@
+# gpt_responses.py - модуль для разбора JSON-ответов GPT в типизированные модели
+#
+# Каждый ответ разбирается один раз: чиним типичные огрехи GPT (кодовые блоки, текст вокруг JSON,
+# висячие запятые, "умные" кавычки, проценты вместо чисел), валидируем pydantic-моделью
+# и дальше работаем с полями объекта, а не с повторным json.loads по ключам.
+
+import json
+import logging
+import math
+import re
+from typing import Annotated, Literal, Union
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, ValidationError, field_validator
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResponseParseError(Exception):
+    """Ответ GPT не удалось разобрать в нужную модель."""
+
+
+# Приводим число от GPT к float: "1 000" -> 1000, "20%" -> 0.2, "−0,5" -> -0.5
+def coerce_number(value):
+    if isinstance(value, bool):
+        raise ValueError("ожидалось число, а не bool")
+
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        text = value.strip().replace("\u2212", "-").replace("\u00a0", "").replace(" ", "")
+        percent = text.endswith("%")
+        text = text.rstrip("%")
+
+        # Запятая - либо разделитель тысяч (1,000), либо десятичная (0,5)
+        if "," in text and "." not in text and not re.fullmatch(r"[+-]?\d{1,3}(,\d{3})+", text):
+            text = text.replace(",", ".")
+        text = text.replace(",", "")
+
+        try:
+            number = float(text)
+        except ValueError:
+            raise ValueError(f"не число: {value!r}")
+
+        if percent:
+            number /= 100
+    else:
+        raise ValueError(f"не число: {value!r}")
+
+    if not math.isfinite(number):
+        raise ValueError(f"не конечное число: {value!r}")
+
+    return number
+
+
+Number = Annotated[float, BeforeValidator(coerce_number)]
+Integer = Annotated[int, BeforeValidator(lambda value: round(coerce_number(value)))]
+
+
+# Метрика мира: целое от -10 до +10, всё что за пределами - прижимаем к границе
+def _clamp_metric(value):
+    return max(-10, min(10, round(coerce_number(value))))
+
+
+Metric = Annotated[int, BeforeValidator(_clamp_metric)]
+
+
+# Влияние инициативы на метрику: "+", "-", "0" или небольшое целое число
+def _normalize_metric_change(value):
+    if isinstance(value, str) and value.strip() in ("+", "-", "0"):
+        return value.strip()
+
+    return round(coerce_number(value))
+
+
+MetricChange = Annotated[Union[Literal["+", "-", "0"], int], BeforeValidator(_normalize_metric_change)]
+
+
+class WorldMetrics(BaseModel):
+    economy_metric: Metric
+    social_stability_metric: Metric
+    ecology_metric: Metric
+    security_metric: Metric
+    political_support_metric: Metric
+
+
+class WorldResources(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    money: Integer = Field(alias="Деньги (монет)", ge=0)
+    people: Integer = Field(alias="Население (людей)", ge=0)
+
+
+class MetricsChanges(BaseModel):
+    economy_metric: MetricChange = "0"
+    social_stability_metric: MetricChange = "0"
+    ecology_metric: MetricChange = "0"
+    security_metric: MetricChange = "0"
+    political_support_metric: MetricChange = "0"
+
+
+class FinancialEvaluation(BaseModel):
+    estimated_cost: Number = 0.0
+    money_multiplier_change: Number = 0.0
+
+    # Отрицательных затрат не бывает
+    @field_validator("estimated_cost")
+    @classmethod
+    def _non_negative_cost(cls, value):
+        return max(0.0, value)
+
+
+class WorldChanges(BaseModel):
+    facts: str = Field(min_length=1)
+    npc_perspective: str = Field(min_length=1)
+
+
+# Ответ generate_world_changes
+class InitiativeResult(BaseModel):
+    financial_evaluation: FinancialEvaluation
+    world_changes: WorldChanges
+
+
+# Ответ resolve_turn
+class TurnResolution(InitiativeResult):
+    metrics_changes: MetricsChanges
+    news: str
+
+
+# Достаём JSON-объект из ответа: убираем кодовые блоки и текст вокруг
+def extract_json(text):
+    # Кодовые блоки ```json ... ``` и ```python ... ```
+    text = re.sub(r"```[a-zA-Z]*", "", text).strip()
+
+    # Текст до и после JSON-объекта
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+
+    return text
+
+
+# Чиним типичные огрехи GPT, чтобы json.loads смог разобрать ответ.
+# Применяется, только если JSON не разобрался как есть - правки могут задеть текст внутри строк
+def repair_json(text):
+    # "Умные" кавычки вместо обычных (ёлочки не трогаем - ими GPT пишет цитаты внутри строк)
+    text = text.replace("“", '"').replace("”", '"')
+
+    # Висячие запятые перед } и ]
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+
+    # Значения +, - без кавычек и числа с плюсом: "economy_metric": + -> "+", "x": +3 -> 3
+    text = re.sub(r":\s*([+-])\s*(?=[,}\n])", r': "\1"', text)
+    text = re.sub(r":\s*\+(\d)", r": \1", text)
+
+    return text
+
+
+def parse_response(gpt_response, model):
+    """
+    Разбирает ответ GPT в pydantic-модель.
+
+    :param gpt_response: Ответ GPT строкой
+    :param model: Класс модели, например WorldMetrics
+    :return: Экземпляр модели
+    :raises ResponseParseError: Если ответ пустой, не JSON или не проходит валидацию
+    """
+    if not gpt_response or not isinstance(gpt_response, str):
+        raise ResponseParseError(f"Пустой или некорректный ответ от GPT: {gpt_response!r}")
+
+    cleaned_response = extract_json(gpt_response)
+
+    try:
+        try:
+            data = json.loads(cleaned_response)
+        except json.JSONDecodeError:
+            data = json.loads(repair_json(cleaned_response))
+
+        return model.model_validate(data)
+    except (json.JSONDecodeError, ValidationError) as e:
+        logger.error(f"Не удалось разобрать ответ GPT в {model.__name__}: {e}\nОтвет от GPT: {gpt_response}")
+        raise ResponseParseError(str(e)) from e
@@ -0,0 +1,60 @@
+import unittest
+
+from gpt_responses import (
+    InitiativeResult, MetricsChanges, WorldMetrics, WorldResources, ResponseParseError, parse_response
+)
+
+
+class MyTestCase(unittest.TestCase):
+    def test_parse_metrics_from_code_block(self):
+        response = '```python\n{"economy_metric": 3, "social_stability_metric": -2, "ecology_metric": 15, ' \
+                   '"security_metric": "4", "political_support_metric": 0}\n```'
+
+        metrics = parse_response(response, WorldMetrics)
+
+        self.assertEqual(metrics.economy_metric, 3)
+        self.assertEqual(metrics.ecology_metric, 10)  # прижато к границе
+        self.assertEqual(metrics.security_metric, 4)
+
+    def test_parse_resources_by_alias(self):
+        response = 'Вот ресурсы: {"Деньги (монет)": "1 500 000", "Население (людей)": 20000,}'
+
+        resources = parse_response(response, WorldResources)
+
+        self.assertEqual(resources.money, 1500000)
+        self.assertEqual(resources.model_dump(by_alias=True), {"Деньги (монет)": 1500000, "Население (людей)": 20000})
+
+    def test_parse_metrics_changes_repairs_bare_signs(self):
+        response = '{"economy_metric": +, "social_stability_metric": -, "ecology_metric": "0", "security_metric": +2}'
+
+        changes = parse_response(response, MetricsChanges)
+
+        self.assertEqual(changes.economy_metric, "+")
+        self.assertEqual(changes.social_stability_metric, "-")
+        self.assertEqual(changes.security_metric, 2)
+        self.assertEqual(changes.political_support_metric, "0")
+
+    def test_parse_initiative_result_numbers(self):
+        response = '''```json
+        {
+            "financial_evaluation": {"estimated_cost": "-100", "money_multiplier_change": "-20%"},
+            "world_changes": {"facts": "Налоги подняты", "npc_perspective": "«Опять налоги», — ворчит торговец."}
+        }
+        ```'''
+
+        result = parse_response(response, InitiativeResult)
+
+        self.assertEqual(result.financial_evaluation.estimated_cost, 0.0)
+        self.assertAlmostEqual(result.financial_evaluation.money_multiplier_change, -0.2)
+        self.assertIn("«Опять налоги»", result.world_changes.npc_perspective)
+
+    def test_parse_invalid_response(self):
+        with self.assertRaises(ResponseParseError):
+            parse_response("Произошла ошибка при генерации метрик.", WorldMetrics)
+
+        with self.assertRaises(ResponseParseError):
+            parse_response('{"financial_evaluation": {}, "world_changes": {"facts": ""}}', InitiativeResult)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,17 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Mess
 from user_interaction import start, start_game, start_character_creation, receive_character_details, receive_initiative_details, start_initiation
 from dotenv import load_dotenv
 from states import WAITING_FOR_CHARACTER_DETAILS, WAITING_FOR_INITIATIVE
+from database import init_pool, close_pool, init_executor, shutdown_executor, InstanceLock
+from world_history import history_manager
+from world_setup import world_setup_manager
+from world_pool import world_pool
+from usage_reporting import usage_writer, stats, start_metrics_server
+from write_behind import write_behind
+from metrics_simulator import metrics_simulator
+from persistence import PostgresPersistence
+from webhook import run_webhook
+from update_processor import PerChatUpdateProcessor
+import asyncio
 import os
 
 # Загружаем переменные из .env
@@ -22,6 +33,9 @@ else:
 
 print(f"Using bot API: {TELEGRAM_API_KEY}")  # Для проверки, какой ключ используется
 
+# Режим получения обновлений: "polling" (по умолчанию, для разработки) или "webhook" (продакшен, см. webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
 # Настройка ConversationHandler
 conv_handler = ConversationHandler(
     entry_points=[CallbackQueryHandler(start_character_creation, pattern='start_character_creation')],  # Начинаем с нажатия кнопки
@@ -29,15 +43,56 @@ conv_handler = ConversationHandler(
         WAITING_FOR_CHARACTER_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_character_details)],  # Сбор описания персонажа
         WAITING_FOR_INITIATIVE: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_initiative_details)]  # Сбор инициативы
     },
-    fallbacks=[CommandHandler('cancel', lambda update, context: ConversationHandler.END)]  # Обработчик отмены
+    fallbacks=[CommandHandler('cancel', lambda update, context: ConversationHandler.END)],  # Обработчик отмены
+    name="game",
+    persistent=True  # Состояние диалога переживает перезапуск бота (см. persistence.py)
     )
 
+# Размеры пула соединений с БД
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+
+# Пул соединений и потоки для запросов к БД живут столько же, сколько приложение.
+# Потоков столько же, сколько соединений. Фоновые задачи (пул миров, запись расхода GPT, отложенная запись)
+# ходят в БД тоже через run_db и занимают те же потоки, отдельных соединений мимо исполнителя никто не берёт
+# (кроме блокировки экземпляра, см. main)
+async def on_startup(application: Application):
+    init_pool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+    init_executor(max_workers=DB_POOL_MAX_SIZE)
+    world_pool.start()  # Фоновое пополнение пула готовых миров
+    usage_writer.start()  # Фоновое сохранение расхода GPT в БД
+    write_behind.start()  # Фоновая запись новостей и персонажей
+    await asyncio.to_thread(metrics_simulator.load)  # Модель метрик; без неё метрики считает GPT
+    if BOT_MODE != "webhook":  # В режиме webhook /metrics отдаёт сам сервер webhook, на его порту
+        application.bot_data['metrics_server'] = await start_metrics_server()
+
+async def on_shutdown(application: Application):
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server:
+        metrics_server.close()
+    await world_pool.stop()
+    await world_setup_manager.wait_all()
+    await history_manager.wait_compactions()
+    await usage_writer.stop()  # После фоновых задач - чтобы сохранить и их расход GPT
+    await write_behind.stop()  # Дописываем очередь отложенной записи, пока пул БД открыт
+    await asyncio.to_thread(shutdown_executor)  # Ждём оставшиеся запросы, не блокируя event loop
+    close_pool()
+
 def main():
     # Создаем приложение с API ключом
-    application = Application.builder().token(TELEGRAM_API_KEY).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_API_KEY)
+        .persistence(PostgresPersistence())  # user_data и диалоги хранятся в Postgres
+        .concurrent_updates(PerChatUpdateProcessor())  # Игроки параллельно, обновления одного игрока - по очереди
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     # Добавляем обработчики команд и нажатий на кнопки
     application.add_handler(CommandHandler("start", start))  # Обработчик для команды /start
+    application.add_handler(CommandHandler("stats", stats))  # Обработчик для команды /stats (расход GPT, только для админов)
     application.add_handler(CallbackQueryHandler(start_game, pattern='start_game'))  # Обработчик для кнопки "Начать игру"
     #application.add_handler(CallbackQueryHandler(start_character_creation, pattern='start_character_creation'))  # Обработчик для кнопки "Создать персонажа"
     application.add_handler(CallbackQueryHandler(start_initiation, pattern='start_initiation'))  # Обработчик для кнопки "Внести инициативу"
@@ -45,8 +100,19 @@ def main():
     # Регистрация обработчиков
     application.add_handler(conv_handler)
 
-    # Запуск приложения
-    application.run_polling()
+    # Бот работает в одном экземпляре на базу (см. database/instance_lock.py). Блокировку берём до запуска
+    # приложения: при initialize PostgresPersistence читает состояние, и оно должно быть уже сохранено
+    # предыдущим экземпляром, а отпускаем после post_shutdown, когда всё состояние записано
+    instance_lock = InstanceLock()
+    instance_lock.acquire()
+    try:
+        # Запуск приложения
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
+    finally:
+        instance_lock.release()
 
 if __name__ == "__main__":
     main()
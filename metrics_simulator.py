@@ -0,0 +1,226 @@
+# metrics_simulator.py - метрики мира на следующий год по обученной модели, без запроса к GPT
+#
+# data/dataset_prepared.py обучает RandomForestRegressor на годовых данных стран: по 33 показателям
+# прошлого года (baseline) и их изменениям (delta) модель предсказывает показатели текущего года.
+# Модель и скейлеры (trained_model.pkl, scaler_X.pkl, scaler_y.pkl) загружаются один раз при старте.
+#
+# Пять метрик игры (от -10 до +10) переводятся в показатели модели по таблице METRIC_INDICATORS:
+# у каждой метрики несколько показателей и их значения на краях шкалы (-10 и +10).
+# Показатели без метрики берутся из REFERENCE_BASELINE. Обратно метрика - среднее положение
+# её показателей между краями шкалы.
+#
+# Порядок признаков проверяется по именам, которые скейлеры запомнили при обучении (feature_names_in_):
+# модель с другим порядком показателей не загружается.
+#
+# Если модели нет (файлы не выложены, не установлен scikit-learn или признаки не совпали), available = False,
+# и метрики, как раньше, считаются без неё.
+
+import logging
+import os
+import warnings
+
+import numpy as np
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Папка с trained_model.pkl, scaler_X.pkl и scaler_y.pkl
+METRICS_MODEL_DIR = os.getenv("METRICS_MODEL_DIR", "data")
+
+METRIC_MIN, METRIC_MAX = -10, 10
+
+# Показатели модели в порядке признаков при обучении и значения по умолчанию
+# (см. current_baseline в data/dataset_prepared.py)
+REFERENCE_BASELINE = {
+    "Civil liberties index": 0.8,
+    "Taxes (% GDP)": 25.0,
+    "GDP/capita, $": 35000,
+    "Population": 50e6,
+    "Average years of education": 12.5,
+    "Meat, kg/year/capita": 30,
+    "Deaths in ongoing conflicts": 0,
+    "Child deaths per 100 live births": 3,
+    "GDP": 1.2e12,
+    "Inequality Index": 0.35,
+    "Median Age estimates": 38,
+    "Period life expectancy": 78,
+    "Urban population": 0.7,
+    "Rural population": 0.3,
+    "Total number of emigrants": 0.5e6,
+    "Healthcare expenditure (% GPD)": 8.5,
+    "Energy used per capita": 2000,
+    "Agricultural land (% of land area)": 40,
+    "Prevalence of undernourishment": 5,
+    "Share below $2.15 a day": 10,
+    "GNI per capita": 30000,
+    "GDP per person employed": 100000,
+    "GDP growth observation": 2.0,
+    "GDP growth forecasts": 2.5,
+    "Government expenditure (% of GDP)": 20,
+    "Government expenditure on education (% of GDP)": 5,
+    "State capacity estimate": 0.6,
+    "Functioning government": 0.7,
+    "Political corruption index": 0.4,
+    "Rule of Law index": 0.8,
+    "Internet availability": 0.9,
+    "Happiness & Life-satisfaction": 7.5,
+    "Military expenditure (% of GDP)": 2.0,
+}
+INDICATORS = list(REFERENCE_BASELINE)
+
+# Имена признаков на входе и выходе модели, как их называет data/dataset_prepared.py
+INPUT_FEATURES = [f"baseline_{indicator}" for indicator in INDICATORS] + [f"{indicator}_delta" for indicator in INDICATORS]
+OUTPUT_FEATURES = INDICATORS
+
+# Метрика игры -> [(показатель, значение при -10, значение при +10)]
+METRIC_INDICATORS = {
+    "economy_metric": [
+        ("GDP/capita, $", 1000, 60000),
+        ("GNI per capita", 1000, 55000),
+        ("GDP growth observation", -5.0, 8.0),
+    ],
+    "social_stability_metric": [
+        ("Inequality Index", 0.65, 0.25),
+        ("Share below $2.15 a day", 60, 0),
+        ("Happiness & Life-satisfaction", 3.0, 8.0),
+    ],
+    "ecology_metric": [
+        ("Energy used per capita", 6000, 500),
+        ("Agricultural land (% of land area)", 80, 15),
+    ],
+    "security_metric": [
+        ("Deaths in ongoing conflicts", 50000, 0),
+        ("Rule of Law index", 0.1, 0.95),
+    ],
+    "political_support_metric": [
+        ("Political corruption index", 0.9, 0.05),
+        ("Civil liberties index", 0.1, 0.95),
+    ],
+}
+
+
+def _change_points(change):
+    """Влияние инициативы на метрику ("+", "-", "0" или число) в пунктах шкалы."""
+    if change == "+":
+        return 1
+    if change == "-":
+        return -1
+    return int(change or 0)
+
+
+def metrics_to_indicators(metrics):
+    """
+    Переводит метрики игры в показатели модели.
+
+    :param metrics: {"economy_metric": -10..10, ...}
+    :return: Вектор показателей в порядке INDICATORS
+    """
+    values = dict(REFERENCE_BASELINE)
+
+    for metric, indicators in METRIC_INDICATORS.items():
+        position = (metrics.get(metric, 0) - METRIC_MIN) / (METRIC_MAX - METRIC_MIN)
+        for indicator, low, high in indicators:
+            values[indicator] = low + position * (high - low)
+
+    return np.array([values[indicator] for indicator in INDICATORS], dtype=np.float64)
+
+
+def changes_to_deltas(changes):
+    """Переводит влияние инициативы на метрики (MetricsChanges) в изменения показателей модели."""
+    deltas = dict.fromkeys(INDICATORS, 0.0)
+
+    for metric, indicators in METRIC_INDICATORS.items():
+        points = _change_points((changes or {}).get(metric, "0"))
+        for indicator, low, high in indicators:
+            deltas[indicator] = points * (high - low) / (METRIC_MAX - METRIC_MIN)
+
+    return np.array([deltas[indicator] for indicator in INDICATORS], dtype=np.float64)
+
+
+def indicators_to_metrics(vector):
+    """Переводит показатели модели обратно в метрики игры: целые от -10 до +10."""
+    values = dict(zip(INDICATORS, vector))
+    metrics = {}
+
+    for metric, indicators in METRIC_INDICATORS.items():
+        positions = [(values[indicator] - low) / (high - low) for indicator, low, high in indicators]
+        score = METRIC_MIN + float(np.mean(positions)) * (METRIC_MAX - METRIC_MIN)
+        metrics[metric] = max(METRIC_MIN, min(METRIC_MAX, round(score)))
+
+    return metrics
+
+
+class MetricsSimulator:
+    def __init__(self, model_dir=METRICS_MODEL_DIR):
+        self.model_dir = model_dir
+        self.model = None
+        self.scaler_x = None
+        self.scaler_y = None
+
+    @property
+    def available(self):
+        return self.model is not None
+
+    def load(self):
+        """
+        Загружает модель и скейлеры. Ошибка загрузки не роняет бота: метрики остаются за GPT.
+
+        :return: True, если модель загружена
+        """
+        try:
+            import joblib
+
+            model = joblib.load(os.path.join(self.model_dir, "trained_model.pkl"))
+            scaler_x = joblib.load(os.path.join(self.model_dir, "scaler_X.pkl"))
+            scaler_y = joblib.load(os.path.join(self.model_dir, "scaler_y.pkl"))
+        except (ImportError, OSError) as e:
+            logger.warning(f"Модель метрик не загружена, метрики считает GPT: {e}")
+            return False
+
+        # Показатели переводятся в вектор по фиксированному порядку INDICATORS, поэтому порядок признаков
+        # при обучении должен совпадать с ним в точности. Без имён признаков проверить порядок нельзя
+        input_features = getattr(scaler_x, "feature_names_in_", None)
+        output_features = getattr(scaler_y, "feature_names_in_", None)
+        if input_features is None or output_features is None:
+            logger.error("Модель метрик не загружена: скейлеры обучены без имён признаков, порядок показателей не проверить. "
+                         "Переобучите модель data/dataset_prepared.py.")
+            return False
+
+        if list(input_features) != INPUT_FEATURES or list(output_features) != OUTPUT_FEATURES:
+            logger.error(f"Модель метрик не загружена: признаки модели не совпадают с ожидаемыми "
+                         f"(вход: {list(input_features)[:3]}..., выход: {list(output_features)[:3]}...).")
+            return False
+
+        self.model, self.scaler_x, self.scaler_y = model, scaler_x, scaler_y
+        logger.info(f"Модель метрик загружена из {self.model_dir}.")
+        return True
+
+    def predict(self, metrics, changes=None):
+        """
+        Метрики мира на следующий год.
+
+        Показатели, на которые инициатива повлияла напрямую, сдвигаются на её влияние;
+        остальные берутся из предсказания модели - так инициатива задевает и соседние метрики.
+
+        :param metrics: Текущие метрики мира
+        :param changes: Влияние инициативы на метрики (MetricsChanges) или None
+        :return: Новые метрики мира
+        """
+        if not self.available:
+            raise RuntimeError("Модель метрик не загружена.")
+
+        baseline = metrics_to_indicators(metrics)
+        deltas = changes_to_deltas(changes)
+
+        # Порядок признаков проверен в load, предупреждение о векторе без имён не нужно
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            features = self.scaler_x.transform(np.concatenate([baseline, deltas]).reshape(1, -1))
+            predicted = self.scaler_y.inverse_transform(self.model.predict(features).reshape(1, -1))[0]
+
+        next_year = np.where(deltas != 0, baseline + deltas, predicted)
+        return indicators_to_metrics(next_year)
+
+
+metrics_simulator = MetricsSimulator()
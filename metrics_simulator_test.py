@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from metrics_simulator import (
+    INDICATORS, INPUT_FEATURES, OUTPUT_FEATURES, MetricsSimulator,
+    changes_to_deltas, indicators_to_metrics, metrics_to_indicators
+)
+
+METRICS = {
+    "economy_metric": 3,
+    "social_stability_metric": -2,
+    "ecology_metric": 0,
+    "security_metric": 7,
+    "political_support_metric": -10,
+}
+
+
+# Модель как в data/dataset_prepared.py, но на синтетике: в следующем году показатели = baseline + delta.
+# Скрипт обучает скейлеры на DataFrame; здесь без pandas, имена признаков задаём как их запомнил бы скейлер
+def train_model(model_dir, input_features=INPUT_FEATURES, output_features=OUTPUT_FEATURES):
+    rng = np.random.default_rng(42)
+    baseline = np.stack([metrics_to_indicators({key: rng.integers(-10, 11) for key in METRICS}) for _ in range(300)])
+    deltas = np.stack([changes_to_deltas({key: int(rng.integers(-2, 3)) for key in METRICS}) for _ in range(300)])
+
+    scaler_x, scaler_y = StandardScaler(), StandardScaler()
+    x = scaler_x.fit_transform(np.hstack([baseline, deltas]))
+    y = scaler_y.fit_transform(baseline + deltas)
+
+    scaler_x.feature_names_in_ = np.array(input_features, dtype=object)
+    scaler_y.feature_names_in_ = np.array(output_features, dtype=object)
+
+    model = RandomForestRegressor(n_estimators=20, random_state=42).fit(x, y)
+    joblib.dump(model, os.path.join(model_dir, "trained_model.pkl"))
+    joblib.dump(scaler_x, os.path.join(model_dir, "scaler_X.pkl"))
+    joblib.dump(scaler_y, os.path.join(model_dir, "scaler_y.pkl"))
+
+
+class MyTestCase(unittest.TestCase):
+    def test_metrics_round_trip_through_indicators(self):
+        vector = metrics_to_indicators(METRICS)
+
+        self.assertEqual(len(vector), len(INDICATORS))
+        self.assertEqual(indicators_to_metrics(vector), METRICS)
+
+    def test_missing_model_falls_back_to_gpt(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            simulator = MetricsSimulator(model_dir)
+
+            self.assertFalse(simulator.load())
+            self.assertFalse(simulator.available)
+
+    def test_reordered_features_are_rejected(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            # Тот же набор показателей, но в другом порядке - как после пересборки датасета
+            reordered = INDICATORS[1:] + INDICATORS[:1]
+            train_model(model_dir, output_features=reordered)
+            simulator = MetricsSimulator(model_dir)
+
+            self.assertFalse(simulator.load())
+            self.assertFalse(simulator.available)
+
+    def test_predicts_next_year(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            train_model(model_dir)
+            simulator = MetricsSimulator(model_dir)
+            self.assertTrue(simulator.load())
+
+        result = simulator.predict(METRICS, {"economy_metric": "+", "security_metric": -2})
+
+        self.assertEqual(set(result), set(METRICS))
+        self.assertEqual(result["economy_metric"], 4)  # Прямое влияние инициативы
+        self.assertEqual(result["security_metric"], 5)
+        self.assertTrue(all(-10 <= value <= 10 for value in result.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,9 @@
+-- Индексы для выборки последних записей истории мира
+-- Запросы вида WHERE world_id = %s ORDER BY date_generated DESC LIMIT 1
+-- больше не сортируют всю историю мира, а берут первую запись из индекса
+
+CREATE INDEX IF NOT EXISTS world_resources_world_id_date_idx
+    ON world_resources (world_id, date_generated DESC);
+
+CREATE INDEX IF NOT EXISTS world_metrics_world_id_date_idx
+    ON world_metrics (world_id, date_generated DESC);
@@ -0,0 +1,101 @@
+-- Актуальное состояние мира: одна строка на мир
+-- История (world_resources, world_metrics) остаётся append-only, а последние значения
+-- дублируются сюда триггерами, поэтому чтение текущего состояния - поиск по первичному ключу
+
+-- Таблица `WORLD_RESOURCES_CURRENT`
+-- Последние ресурсы мира
+CREATE TABLE IF NOT EXISTS world_resources_current (
+    world_id INT PRIMARY KEY REFERENCES worlds(world_id) ON DELETE CASCADE,
+    resource_id INT,                        -- ID строки истории world_resources, из которой взяты значения
+    money_resource DECIMAL(15, 2) DEFAULT 0,
+    money_multiplier DECIMAL(5, 2) DEFAULT 1.00,
+    people_resource INT DEFAULT 0,
+    people_multiplier DECIMAL(5, 2) DEFAULT 1.00,
+    date_generated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблица `WORLD_METRICS_CURRENT`
+-- Последние метрики мира (строки world_metrics только с новостями сюда не попадают)
+CREATE TABLE IF NOT EXISTS world_metrics_current (
+    world_id INT PRIMARY KEY REFERENCES worlds(world_id) ON DELETE CASCADE,
+    metric_id INT,                          -- ID строки истории world_metrics, из которой взяты значения
+    economy_metric INT,
+    social_stability_metric INT,
+    ecology_metric INT,
+    security_metric INT,
+    political_support_metric INT,
+    date_generated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Любая вставка или изменение строки истории переносится в актуальное состояние,
+-- если это строка не старее той, что уже там лежит
+CREATE OR REPLACE FUNCTION sync_world_resources_current() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO world_resources_current AS cur
+        (world_id, resource_id, money_resource, money_multiplier, people_resource, people_multiplier, date_generated)
+    VALUES
+        (NEW.world_id, NEW.id, NEW.money_resource, NEW.money_multiplier, NEW.people_resource, NEW.people_multiplier, NEW.date_generated)
+    ON CONFLICT (world_id) DO UPDATE SET
+        resource_id = EXCLUDED.resource_id,
+        money_resource = EXCLUDED.money_resource,
+        money_multiplier = EXCLUDED.money_multiplier,
+        people_resource = EXCLUDED.people_resource,
+        people_multiplier = EXCLUDED.people_multiplier,
+        date_generated = EXCLUDED.date_generated
+    WHERE (cur.date_generated, cur.resource_id) <= (EXCLUDED.date_generated, EXCLUDED.resource_id);
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER world_resources_sync_current
+    AFTER INSERT OR UPDATE ON world_resources
+    FOR EACH ROW EXECUTE FUNCTION sync_world_resources_current();
+
+CREATE OR REPLACE FUNCTION sync_world_metrics_current() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO world_metrics_current AS cur
+        (world_id, metric_id, economy_metric, social_stability_metric, ecology_metric,
+         security_metric, political_support_metric, date_generated)
+    VALUES
+        (NEW.world_id, NEW.metric_id, NEW.economy_metric, NEW.social_stability_metric, NEW.ecology_metric,
+         NEW.security_metric, NEW.political_support_metric, NEW.date_generated)
+    ON CONFLICT (world_id) DO UPDATE SET
+        metric_id = EXCLUDED.metric_id,
+        economy_metric = EXCLUDED.economy_metric,
+        social_stability_metric = EXCLUDED.social_stability_metric,
+        ecology_metric = EXCLUDED.ecology_metric,
+        security_metric = EXCLUDED.security_metric,
+        political_support_metric = EXCLUDED.political_support_metric,
+        date_generated = EXCLUDED.date_generated
+    WHERE (cur.date_generated, cur.metric_id) <= (EXCLUDED.date_generated, EXCLUDED.metric_id);
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER world_metrics_sync_current
+    AFTER INSERT OR UPDATE ON world_metrics
+    FOR EACH ROW
+    WHEN (NEW.economy_metric IS NOT NULL)
+    EXECUTE FUNCTION sync_world_metrics_current();
+
+-- Заполняем актуальное состояние для уже существующих миров
+INSERT INTO world_resources_current
+    (world_id, resource_id, money_resource, money_multiplier, people_resource, people_multiplier, date_generated)
+SELECT DISTINCT ON (world_id)
+    world_id, id, money_resource, money_multiplier, people_resource, people_multiplier, date_generated
+FROM world_resources
+ORDER BY world_id, date_generated DESC, id DESC
+ON CONFLICT (world_id) DO NOTHING;
+
+INSERT INTO world_metrics_current
+    (world_id, metric_id, economy_metric, social_stability_metric, ecology_metric,
+     security_metric, political_support_metric, date_generated)
+SELECT DISTINCT ON (world_id)
+    world_id, metric_id, economy_metric, social_stability_metric, ecology_metric,
+    security_metric, political_support_metric, date_generated
+FROM world_metrics
+WHERE economy_metric IS NOT NULL
+ORDER BY world_id, date_generated DESC, metric_id DESC
+ON CONFLICT (world_id) DO NOTHING;
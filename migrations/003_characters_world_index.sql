@@ -0,0 +1,4 @@
+-- Индекс для выборки последнего персонажа мира (см. database/world_state.py)
+
+CREATE INDEX IF NOT EXISTS characters_world_id_date_idx
+    ON characters (world_id, date_generated DESC);
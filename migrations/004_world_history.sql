@@ -0,0 +1,12 @@
+-- Сжатая история мира для промптов
+-- Последние ходы хранятся дословно, более старые свёрнуты в краткую сводку (см. world_history.py)
+
+-- Таблица `WORLD_HISTORY`
+CREATE TABLE IF NOT EXISTS world_history (
+    world_id INT PRIMARY KEY REFERENCES worlds(world_id) ON DELETE CASCADE,
+    base_description TEXT,                  -- Стартовое описание мира, сгенерированное GPT
+    summary TEXT DEFAULT '',                -- Краткая сводка свёрнутых ходов
+    recent_turns JSONB DEFAULT '[]',        -- Последние ходы дословно: [{"year", "initiative", "changes"}]
+    summarized_turns INT DEFAULT 0,         -- Сколько ходов уже свёрнуто в сводку
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,10 @@
+-- Пул заранее сгенерированных миров (см. world_pool.py)
+-- pool_status: NULL - обычный мир игрока, 'generating' - мир ещё готовится,
+-- 'ready' - мир полностью готов и ждёт игрока, 'failed' - подготовка не удалась
+
+ALTER TABLE worlds ADD COLUMN IF NOT EXISTS pool_status VARCHAR(16);
+
+-- Выдача мира из пула и подсчёт готовых миров по эпохам - только по готовым строкам
+CREATE INDEX IF NOT EXISTS worlds_pool_ready_idx
+    ON worlds (in_game_year)
+    WHERE pool_status = 'ready';
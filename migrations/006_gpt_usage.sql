@@ -0,0 +1,23 @@
+-- Расход GPT по каждому вызову (см. client/usage.py и usage_reporting.py)
+-- Строки пишутся пачками в фоне; мир и игрок не связаны внешними ключами,
+-- чтобы учёт не терялся при удалении мира и не тормозил вставку
+
+-- Таблица `GPT_USAGE`
+CREATE TABLE IF NOT EXISTS gpt_usage (
+    usage_id BIGSERIAL PRIMARY KEY,
+    call_name VARCHAR(64) NOT NULL,         -- Имя промпта (PromptTemplate.name)
+    model VARCHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL,            -- ok, error, cache
+    duration_ms INT NOT NULL,               -- Время ответа вместе с повторами
+    prompt_tokens INT DEFAULT 0,
+    cached_tokens INT DEFAULT 0,            -- Входные токены из кэша провайдера
+    completion_tokens INT DEFAULT 0,
+    telegram_id BIGINT,                     -- Игрок, для которого шёл вызов
+    world_id INT,
+    game_year INT,                          -- Ход (игровой год) мира
+    created_at TIMESTAMP NOT NULL
+);
+
+-- Расход по миру и по ходу, расход за период
+CREATE INDEX IF NOT EXISTS gpt_usage_world_idx ON gpt_usage (world_id, game_year);
+CREATE INDEX IF NOT EXISTS gpt_usage_created_idx ON gpt_usage (created_at);
@@ -0,0 +1,19 @@
+-- Состояние бота между перезапусками (см. persistence.py)
+-- Хранятся только ключи игры (world_id, game_year, user_id) и состояния диалогов;
+-- описание мира, метрики, ресурсы и персонаж подгружаются из своих таблиц при первом обращении
+
+-- Таблица `BOT_USER_DATA`: context.user_data по Telegram ID
+CREATE TABLE IF NOT EXISTS bot_user_data (
+    telegram_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблица `BOT_CONVERSATIONS`: состояния ConversationHandler
+CREATE TABLE IF NOT EXISTS bot_conversations (
+    name VARCHAR(64) NOT NULL,              -- Имя ConversationHandler
+    conversation_key TEXT NOT NULL,         -- Ключ диалога (chat_id, user_id) в JSON
+    state INT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, conversation_key)
+);
@@ -0,0 +1,30 @@
+-- Журнал ходов мира и периодические снимки состояния (см. world_events.py)
+-- world_statistics становится неизменяемым журналом событий: строки только добавляются.
+-- Состояние мира на любой год собирается из ближайшего снимка и нескольких событий после него
+
+-- Таблица `WORLD_STATISTICS` из game_database_schema.sql, если её ещё нет
+CREATE TABLE IF NOT EXISTS world_statistics (
+    change_id SERIAL PRIMARY KEY,
+    world_id INT REFERENCES worlds(world_id),
+    user_id INT REFERENCES users(user_id),
+    initiative_description TEXT,
+    gpt_response TEXT,
+    change_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE world_statistics ADD COLUMN IF NOT EXISTS in_game_year INT;        -- Год, к которому относится событие
+ALTER TABLE world_statistics ADD COLUMN IF NOT EXISTS event_type VARCHAR(32);  -- Тип события: turn, metrics
+ALTER TABLE world_statistics ADD COLUMN IF NOT EXISTS payload JSONB;           -- Значения мира после события
+
+CREATE INDEX IF NOT EXISTS idx_world_statistics_world_change
+    ON world_statistics (world_id, change_id);
+
+-- Таблица `WORLD_SNAPSHOTS`: состояние мира после события change_id
+CREATE TABLE IF NOT EXISTS world_snapshots (
+    world_id INT NOT NULL REFERENCES worlds(world_id) ON DELETE CASCADE,
+    change_id INT NOT NULL,                 -- Последнее событие, вошедшее в снимок
+    in_game_year INT,                       -- Год этого события
+    state JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (world_id, change_id)
+);
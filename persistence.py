@@ -0,0 +1,166 @@
+# persistence.py - модуль хранения состояния бота в Postgres
+#
+# Раньше всё состояние игры жило в context.user_data в памяти, и каждый деплой или падение
+# обрывал все партии. PostgresPersistence сохраняет user_data и состояния диалогов в БД:
+#  - в БД пишутся только ключи игры (PERSISTED_USER_DATA_KEYS) - описание мира, метрики, ресурсы
+#    и персонаж уже лежат в своих таблицах и подгружаются при первом обращении игрока (refresh_user_data),
+#  - Application передаёт изменения раз в PERSISTENCE_FLUSH_INTERVAL секунд; они копятся в памяти
+#    и записываются одной транзакцией на проход, а не отдельным запросом на каждое обновление.
+# Состояние читается из БД один раз при запуске, поэтому с базой работает один экземпляр бота
+# (см. database/instance_lock.py).
+
+import asyncio
+import logging
+import os
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database import (
+    run_db, run_in_transaction, load_world_state, get_world_history,
+    load_bot_user_data, load_bot_conversations, save_bot_state
+)
+from gpt_responses import WorldResources
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Как часто изменения user_data и диалогов записываются в БД, секунды
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", 30))
+
+# Ключи user_data, которые сохраняются в БД; остальное восстанавливается из таблиц мира
+PERSISTED_USER_DATA_KEYS = ("user_id", "world_id", "game_year")
+
+
+def slim_user_data(user_data):
+    """Только ключи игры, без описаний и словарей, которые можно восстановить из БД."""
+    return {key: user_data[key] for key in PERSISTED_USER_DATA_KEYS if user_data.get(key) is not None}
+
+
+async def rehydrate_user_data(user_data):
+    """
+    Дозаполняет user_data из БД после перезапуска: описание мира, метрики, ресурсы и персонаж.
+
+    :param user_data: context.user_data игрока; изменяется на месте
+    :return: True, если данные подгружены из БД
+    """
+    world_id = user_data.get('world_id')
+    if not world_id or 'world_data' in user_data:
+        return False
+
+    world_state = await run_db(run_in_transaction, load_world_state, world_id, user_data.get('user_id'))
+    if world_state is None:
+        return False
+
+    # Стартовое описание мира хранится в истории мира, в worlds - последнее изменённое
+    history = await run_db(get_world_history, world_id)
+    restored = {
+        'world_data': (history or {}).get('base_description') or world_state.description,
+        'resources_dict': WorldResources(money=int(world_state.money or 0), people=world_state.people).model_dump(by_alias=True),
+    }
+    if world_state.metrics:
+        restored['metrics_dict'] = world_state.metrics
+    if world_state.character_description:
+        restored['character_description'] = world_state.character_description
+
+    user_data.update(restored)
+    user_data.setdefault('game_year', world_state.in_game_year)
+
+    logger.info(f"Состояние игры для мира {world_id} восстановлено из базы данных.")
+    return True
+
+
+class PostgresPersistence(BasePersistence):
+    def __init__(self, flush_interval=PERSISTENCE_FLUSH_INTERVAL):
+        # Храним только user_data и диалоги: chat_data, bot_data и callback_data игра не использует
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval
+        )
+        self._dirty_user_data = {}
+        self._dirty_conversations = {}
+        self._flush_task = None
+
+    async def get_user_data(self):
+        return await run_db(load_bot_user_data)
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return await run_db(load_bot_conversations, name)
+
+    async def update_user_data(self, user_id, data):
+        self._dirty_user_data[user_id] = slim_user_data(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._dirty_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        self._dirty_conversations[(name, key)] = new_state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    # Перед каждым обновлением игрока: после перезапуска подгружаем его игру из таблиц мира
+    async def refresh_user_data(self, user_id, user_data):
+        try:
+            await rehydrate_user_data(user_data)
+        except Exception as e:
+            logger.error(f"Ошибка при восстановлении состояния игрока {user_id}: {e}")
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # Application вызывает update_* для всех изменений разом; запись откладываем до конца прохода,
+    # чтобы все изменения ушли одной транзакцией
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        await asyncio.sleep(0)
+
+        user_data, self._dirty_user_data = self._dirty_user_data, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        if not user_data and not conversations:
+            return
+
+        try:
+            written = await run_db(save_bot_state, user_data, conversations)
+            logger.info(f"Состояние бота записано в базу данных: {written} записей.")
+        except Exception as e:
+            # Возвращаем изменения в очередь, не затирая более свежие
+            for user_id, data in user_data.items():
+                self._dirty_user_data.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self._dirty_conversations.setdefault(key, state)
+            logger.error(f"Ошибка при записи состояния бота: {e}")
+
+    # При остановке приложения: дописываем всё накопленное
+    async def flush(self):
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+        await self._write()
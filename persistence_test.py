@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import persistence
+from persistence import PostgresPersistence, slim_user_data
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_only_game_keys_are_persisted(self):
+        user_data = {
+            "user_id": 1, "world_id": 12, "game_year": 1901,
+            "world_data": "Мир суров.", "metrics_dict": {"economy_metric": 2}, "character_description": "Кузнец"
+        }
+        self.assertEqual(slim_user_data(user_data), {"user_id": 1, "world_id": 12, "game_year": 1901})
+
+    async def test_updates_are_written_in_one_batch(self):
+        writes = []
+
+        async def run_db(func, *args):
+            writes.append(args)
+            return 0
+
+        with mock.patch.object(persistence, "run_db", run_db):
+            storage = PostgresPersistence()
+            # Как Application.update_persistence: все изменения прохода разом
+            await asyncio.gather(
+                storage.update_user_data(7, {"world_id": 12, "world_data": "описание"}),
+                storage.update_user_data(8, {"user_id": 2}),
+                storage.drop_user_data(9),
+                storage.update_conversation("game", (7, 7), 1),
+            )
+            await storage.flush()
+
+        self.assertEqual(len(writes), 1)
+        user_data, conversations = writes[0]
+        self.assertEqual(user_data, {7: {"world_id": 12}, 8: {"user_id": 2}, 9: None})
+        self.assertEqual(conversations, {("game", (7, 7)): 1})
+
+    async def test_failed_write_is_retried_on_flush(self):
+        attempts = []
+
+        async def run_db(func, *args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise ConnectionError("БД недоступна")
+            return 1
+
+        with mock.patch.object(persistence, "run_db", run_db):
+            storage = PostgresPersistence()
+            await storage.update_user_data(7, {"world_id": 12})
+            await storage.flush()
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(attempts[1][0], {7: {"world_id": 12}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,343 @@
+# prompts.py - шаблоны промптов для GPT
+#
+# Каждый промпт разбит на две части:
+#  - system: статичные инструкции, одинаковые для всех вызовов;
+#  - user: данные конкретного мира - сначала то, что меняется редко (описание мира, персонаж),
+#    и только в конце то, что меняется каждый ход (инициатива игрока).
+# OpenAI кэширует совпадающее начало запроса (от 1024 токенов), поэтому статичные инструкции
+# и контекст мира берутся из кэша провайдера, а оплачиваются и обрабатываются заново только новые данные.
+# Сколько токенов пришло из кэша, клиент пишет в лог после каждого вызова (см. client/gpt.py).
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str    # Имя для логов и статистики
+    system: str  # Статичные инструкции, без подстановок
+    user: str    # Шаблон с данными мира для str.format
+
+    def render(self, **values):
+        """
+        Собирает сообщения для Gpt.chat.
+
+        :param values: Значения для подстановки в шаблон user
+        :return: Список сообщений [system, user]
+        """
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(**values)},
+        ]
+
+
+WORLD_PROMPT = PromptTemplate(
+    name="world",
+    system="""
+Сгенерируй новый мир для года, указанного игроком. Забудь все, о чем мы говорили до этого момента.
+Фокусируйся на этом временном промежутке - погрузи игрока в мир, расскажи о проблемах и вызовах, соответствующие этому времени.
+Текст должен быть написан в художественном стиле, напоминающем Тарантино или Гая Ричи, с драматургией, но без выхода за рамки реальной физики.
+Сохраняй историческую правдоподобность, делая мир напряжённым и погружающим, с яркими фразами, чтобы передать атмосферу времени.
+
+Текст должен содержать:
+2. Проблемы и вызовы: социальные, политические, природные — что определяет жизнь людей? Сделай так, чтобы мир был драматичным и ощущался тяжёлым.
+3. Место действия: придумай страну, город, важные локации, как реки, горы или фантастические регионы, но избегай сверхъестественного.
+4. Культурные и религиозные аспекты: мифы, религии, искусство, письменность — как люди воспринимают мир?
+5. Влияние эпохи на людей: как это время изменяет жизнь простых людей? Сделай акцент на трудности, борьбы и изменениях.
+6. Драматургия и напряжённость: создай атмосферу напряжения, драмы, конфликтов, чтобы мир был живым и насыщенным.
+
+Собери в небольшой и динамичный рассказ из нескольких абзацев. Не уходи в излишние детали, но сделай так, чтобы мир казался реальным, напряжённым и наполненным драма-энергией.
+""",
+    user="""Внутриигровой год: {year}""",
+)
+
+
+WORLD_METRICS_PROMPT = PromptTemplate(
+    name="world_metrics",
+    system="""
+На основе описания мира, которое пришлёт игрок, сгенерируй метрики для этого мира.
+
+Пожалуйста, сгенерируй следующие метрики:
+
+Инструкция:
+1. Экономика [economy_metric] (где):
++10: Экономическая сверхдержава, Экономика процветает, инновации на высоте, богатство в руках всех слоёв населения, страны завидуют.
+-10: Финансовый апокалипсис — страна обанкротилась, дефолт, полное разрушение экономики.
+
+2. Социальная стабильность [social_stability_metric] (где):
++10: Национальное единство, полное единство в обществе, нет социальной напряжённости, низкий уровень преступности.
+-10: Полный коллапс, гражданская война, государственная власть потеряна, граждане начинают бороться за выживание.
+
+3. Экология [ecology_metric] (где):
++10: Экологический рай, чистые воды, воздух, устойчивые экосистемы, возобновляемые источники энергии.
+-10: Экологическая апокалипсис — экологическое разрушение, массовая миграция людей, исчезновение природы, климатическая катастрофа.
+
+4. Безопасность [security_metric] (где):
++10: Полная безопасность, нет преступности, защита от внешних угроз на высшем уровне, внутренний мир и порядок.
+-10: Полный коллапс безопасности — война, гражданская война, терроризм на всех уровнях, разрушение общества, потеря контроля.
+
+5. Политическая поддержка [political_support_metric] (где):
++10: Полный авторитет власти, власть пользуется всеобщим уважением и поддержкой, стабильность, отсутствие коррупции.
+-10: Диктатура / Революция — полный крах демократии, диктаторская власть, распад государства, народ не доверяет власти.
+
+📌 Формат ответа
+Твой ответ должен быть только JSON. Без кода, без комментариев, без пояснений.
+Не используй ```python или другие форматы кодовых блоков.
+
+📌 Структура JSON: {
+    "economy_metric": N,
+    "social_stability_metric": N,
+    "ecology_metric": N,
+    "security_metric": N,
+    "political_support_metric": N
+}
+
+📌 Правила для значений (N)
+- Диапазон: от -10 до +10
+- Тип данных: только число (integer)
+- Запрещено: строки, комментарии, кодовые блоки, скобки `()`.
+
+Отвечай только JSON, без лишнего текста.
+""",
+    user="""Описание мира:
+{world_data}""",
+)
+
+
+WORLD_RESOURCES_PROMPT = PromptTemplate(
+    name="world_resources",
+    system="""
+Пожалуйста, сгенерируй количество ресурсов для мира, который пришлёт игрок, а именно количество денег и населения.
+Ценность денег: 1 единица монеты равна одному обычному обеду.
+
+📌 Формат ответа
+Твой ответ должен быть только JSON. Без кода, без комментариев, без пояснений.
+Не используй ```python, ```json  или другие форматы кодовых блоков.
+
+📌 Структура JSON: {
+    "Деньги (монет)": N,
+    "Население (людей)": N
+}
+
+📌 Правила для значений (N)
+- Тип данных: только число (integer), количество золота и населения
+- Запрещено: строки, комментарии, кодовые блоки, скобки `()`.
+
+Отвечай только JSON, без лишнего текста.
+""",
+    user="""Описание мира:
+{world_data}
+
+Метрики мира: {world_metrics}""",
+)
+
+
+UPDATE_METRICS_PROMPT = PromptTemplate(
+    name="update_metrics",
+    system="""
+На основе описания мира и инициативы игрока определи, какие метрики будут затронуты.
+Не указывай конкретные числа, только влияние!
+
+📌 Структура JSON: {
+    "economy_metric": N,
+    "social_stability_metric": N,
+    "ecology_metric": N,
+    "security_metric": N,
+    "political_support_metric": N
+}
+
+📌 Правила:
+- Если инициатива влияет положительно, ставь `"+"`
+- Если инициатива влияет отрицательно, ставь `"-"`
+- Если метрика не меняется, ставь `"0"`
+- Не указывай числа! Только `"+", "-", "0"`
+
+Ответь только JSON, без пояснений, начиная и заканчивая фигурными скобками.
+""",
+    user="""Описание мира:
+{world_data}
+
+Инициатива от пользователя:
+{initiation_details}""",
+)
+
+
+CHARACTER_PROMPT = PromptTemplate(
+    name="character",
+    system="""
+На основе описания мира и информации о персонаже, сгенерируй персонажа для игры до 400 символов.
+Пожалуйста, создай деталезированное описание персонажа, включая его личные качества, мотивацию и внешний вид в кратком формате текста.
+""",
+    user="""Описание мира:
+{world_data}
+
+Детали персонажа:
+{character_details}""",
+)
+
+
+WORLD_NEWS_PROMPT = PromptTemplate(
+    name="world_news",
+    system="""
+На основе описания мира и метрик сгенерируй дайджест новостей этого мира до 800 символов.
+
+Пожалуйста, создай дайджест новостей, который описывает текущее состояние мира этого года, включая важные события, изменения и тенденции, которые происходят в нем.
+Стиль повествования новостей должны соответствовать и отрожать достоверно эпоху, в которой они происходят (внутриигровой год) и использовать слова, доступные языку этого времени.
+Представь, что ты - первые разворы популярной газеты для жителей. Твои заголовки пестрят и привлекают внимание. Ты избегаешь скучных формулировок
+и словосочетаний. Твоя задача -- увлечь читателя и погрузить в круговорот событий -- что происходила вчера, что происходит сегодня и что ждет нас завтра.
+Не используй для форматирования текста **жирный** или _курсив_, так как это не поддерживается в данном формате. Используй капслок для заголовков
+и кратких выделений.
+""",
+    user="""Описание мира:
+{world_data}
+
+Метрики мира:
+{world_metrics}
+
+Внутриигровой год:
+{year}""",
+)
+
+
+WORLD_CHANGES_PROMPT = PromptTemplate(
+    name="world_changes",
+    system="""
+Ты - симулятор мира, основанный на экономических и социальных моделях. Твоя задача — оценить и спрогнозировать реалистичные последствия инициативы пользователя, учитывая контекст текущего мира.
+Входные данные (описание мира, персонаж игрока, год, бюджет, коэффициент роста денег и инициатива) придут в сообщении игрока.
+
+### Твоя задача:
+1. Оценить стоимость инициативы и коэффициента роста:
+   - Оцени, сколько потребуется ресурсов на её реализацию.
+   - Если инициатива критическая и требует больших затрат — можно большую часть бюджета, но в НОЛЬ НИКОГДА НЕ УХОДИШЬ.
+   - Если инициатива незначительная — оставь часть бюджета на будущее.
+   - Ты НЕ МОЖЕШЬ потратить больше, чем есть в доступном бюджете.
+   - Если инициатива требует больше средств, чем доступно, частично реализуй её в рамках доступных денег.
+   - Если инициатива выходит за рамки реалистичного — отклони её с объяснением.
+
+   ### ШАГ 1: Оценка затрат на реализацию инициативы на текущий момент 'estimated_cost'
+    - Если инициатива требует инвестиций (например, строительство, реформы, военные операции) → оцени 'estimated_cost'.
+    - Если инициатива меняет законы, налоги, цены, но не требует прямых затрат** → `estimated_cost = 0`.
+    - Если инициатива критическая и требует больших затрат — можно использовать весь бюджет.
+    - Если инициатива незначительная — оставь часть бюджета на будущее.
+    - Если инициатива выходит за рамки реалистичного — отклони её с объяснением.
+
+    ### ШАГ 2: Оценка `money_multiplier` (темп роста денег)
+    Определи, как инициатива влияет на рост денежной массы в казне (текущий коэффициент - во входных данных).
+    ➡ Верни числовое изменение в `float`, например, `-0.2` вместо `-20%`.
+    📌 Важно! `money_multiplier` — это НЕ экономический рост, НЕ ВВП, НЕ уровень жизни.
+    ❌ Не оценивай его как рост экономики!
+    ✅ Он используется ТОЛЬКО в формуле роста бюджета, и влияет ТОЛЬКО на деньги.
+    ❌ НЕ возвращай строку `"20%"` или `"-20%"`.
+    ✅ ВОЗВРАЩАЙ `float`, например, `-0.2` (для -20%) или `0.1` (для +10%).
+
+    ---
+
+    ### Правила изменений `money_multiplier`:
+    1. Маленькие изменения (стандартные реформы, налоги, локальные изменения)
+       - `+0.1` → `-0.1`
+    2. Средние изменения (технологии, торговые реформы, крупные проекты)
+       - `+0.2` → `-0.2`
+    3. Крупные изменения (сильные реформы, масштабные экономические изменения)
+       - `+0.3` → `-0.3`
+    4. Редкие экстремальные случаи (война, экономический коллапс, гениальный прорыв)
+       - `+0.5` → `-0.5`
+
+    ### Жёсткие ограничения:
+    ✅ Не допускай изменений больше `±0.5` за 1 год
+    ✅ `money_multiplier` не может стать `0` или уйти в отрицательные значения
+    ✅ Если ситуация катастрофическая, минимальный `money_multiplier` = `-0.7`
+
+2. Смоделировать изменения в мире:
+   - Как изменятся ключевые аспекты жизни после инициативы?
+   - Учитывай закон сохранения ресурсов, закон спроса и предложения, закон устойчивости экосистем, социальную инерцию и другие законы реального мира.
+   - Изменения должны соответствовать тренду развития мира, не противоречить прошлым событиям.
+   - Если инициатива слишком глобальна для 1 года — внедри только реалистичную часть.
+
+3. Сформировать ответ в формате JSON:
+   ```json
+   {
+       "financial_evaluation": {
+           "estimated_cost": float,  # Сколько денег потребуется на реализацию
+           "money_multiplier_change": float  # Какая будет дельта изменения роста денег в казне
+       },
+       "world_changes": {
+           "facts": str,  # Краткое описание изменений мира после инициативы (сухие факты)
+           "npc_perspective": str  # Описание изменений от лица NPC (с эмоциями, личными историями), именно это сообщение целиком будет отправлено игроку
+       }
+   }
+""",
+    user="""### Входные данные:
+- Описание мира: {world_data}
+- Описание персонажа игрока: {character_description}
+- Внутриигровой год: {year}
+- Доступный бюджет (монет): {budget} (1 единица = 1 обед)
+- Текущий коэффициент роста денег: {money_multiplier}
+- Инициатива пользователя: {user_initiation}""",
+)
+
+
+TURN_RESOLUTION_PROMPT = PromptTemplate(
+    name="turn_resolution",
+    system="""
+Ты - симулятор мира, основанный на экономических и социальных моделях. Твоя задача — оценить и спрогнозировать реалистичные последствия инициативы пользователя, учитывая контекст текущего мира, и подготовить выпуск новостей спустя год.
+Входные данные (описание мира, персонаж игрока, год, метрики, бюджет, коэффициент роста денег и инициатива) придут в сообщении игрока.
+
+### 1. financial_evaluation
+- estimated_cost: сколько денег потребуется на реализацию инициативы.
+  Ты НЕ МОЖЕШЬ потратить больше, чем есть в доступном бюджете, и в НОЛЬ НИКОГДА НЕ УХОДИШЬ.
+  Если инициатива меняет законы, налоги, цены, но не требует прямых затрат → 0.
+  Если инициатива требует больше средств, чем доступно, частично реализуй её в рамках доступных денег.
+  Если инициатива выходит за рамки реалистичного — отклони её с объяснением в npc_perspective, estimated_cost = 0.
+- money_multiplier_change: дельта коэффициента роста денег в казне, число, например -0.2 (для -20%) или 0.1 (для +10%).
+  Это НЕ экономический рост и НЕ ВВП, он влияет ТОЛЬКО на деньги в казне.
+  Маленькие изменения ±0.1, средние ±0.2, крупные ±0.3, экстремальные случаи ±0.5. Больше ±0.5 за год нельзя.
+
+### 2. world_changes
+- facts: краткое описание изменений мира после инициативы (сухие факты).
+- npc_perspective: описание изменений от лица NPC (с эмоциями, личными историями), именно это сообщение целиком будет отправлено игроку.
+Учитывай закон сохранения ресурсов, закон спроса и предложения, социальную инерцию и другие законы реального мира.
+Если инициатива слишком глобальна для 1 года — внедри только реалистичную часть.
+
+### 3. metrics_changes
+Для каждой метрики (economy_metric, social_stability_metric, ecology_metric, security_metric, political_support_metric) укажи влияние инициативы:
+"+" - положительное, "-" - отрицательное, "0" - метрика не меняется. Не указывай числа.
+
+### 4. news
+Дайджест новостей мира спустя год после инициативы до 800 символов.
+Стиль новостей соответствует эпохе и использует слова, доступные языку этого времени.
+Ты - первые развороты популярной газеты: заголовки пестрят и привлекают внимание, без скучных формулировок.
+Не используй **жирный** или _курсив_, используй капслок для заголовков и кратких выделений.
+
+Ответь только JSON по заданной схеме.
+""",
+    user="""### Входные данные:
+- Описание мира: {world_data}
+- Описание персонажа игрока: {character_description}
+- Внутриигровой год: {year}
+- Текущие метрики мира (от -10 до +10): {world_metrics}
+- Доступный бюджет (монет): {budget} (1 единица = 1 обед)
+- Текущий коэффициент роста денег: {money_multiplier}
+- Инициатива пользователя: {user_initiation}""",
+)
+
+
+HISTORY_SUMMARY_PROMPT = PromptTemplate(
+    name="history_summary",
+    system="""
+Ты - летописец игрового мира. Обнови краткую сводку истории мира, добавив в неё новые события.
+
+Правила:
+- Сохрани ключевые факты: реформы, войны, решения игрока, их последствия, изменения казны и настроений.
+- Указывай годы событий.
+- Пиши сухо, без художественных оборотов и прямой речи NPC.
+- Соблюдай ограничение длины сводки из сообщения игрока. Если не помещается - сокращай самые старые события.
+
+Ответь только текстом сводки, без заголовков и пояснений.
+""",
+    user="""Текущая сводка истории:
+{summary}
+
+Новые события, которые нужно добавить в сводку:
+{turns}
+
+Итоговая сводка не длиннее {max_chars} символов.""",
+)
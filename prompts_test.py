@@ -0,0 +1,38 @@
+import unittest
+
+import prompts
+from prompts import PromptTemplate, TURN_RESOLUTION_PROMPT
+
+
+class MyTestCase(unittest.TestCase):
+    def test_static_instructions_come_first(self):
+        first = TURN_RESOLUTION_PROMPT.render(
+            world_data="Мир", character_description="Вася", year="100 год н.э.", world_metrics={},
+            budget=100, money_multiplier=1, user_initiation="Построить мост"
+        )
+        second = TURN_RESOLUTION_PROMPT.render(
+            world_data="Мир", character_description="Вася", year="101 год н.э.", world_metrics={},
+            budget=90, money_multiplier=1, user_initiation="Снизить налоги"
+        )
+
+        self.assertEqual(first[0], {"role": "system", "content": TURN_RESOLUTION_PROMPT.system})
+        self.assertEqual(first[0], second[0])
+        # Контекст мира идёт раньше данных хода - общий префикс длиннее системного сообщения
+        self.assertTrue(first[1]["content"].startswith("### Входные данные:\n- Описание мира: Мир\n- Описание персонажа игрока: Вася"))
+        self.assertTrue(first[1]["content"].endswith("Построить мост"))
+
+    def test_all_templates_render(self):
+        templates = [value for value in vars(prompts).values() if isinstance(value, PromptTemplate)]
+        self.assertGreaterEqual(len(templates), 9)
+
+        for template in templates:
+            values = {name: "x" for name in ("year", "world_data", "world_metrics", "initiation_details",
+                                             "character_details", "character_description", "budget",
+                                             "money_multiplier", "user_initiation", "summary", "turns", "max_chars")}
+            messages = template.render(**values)
+            self.assertEqual([message["role"] for message in messages], ["system", "user"], template.name)
+            self.assertNotIn("{", messages[1]["content"], template.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
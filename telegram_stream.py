@@ -0,0 +1,98 @@
+# telegram_stream.py - модуль для вывода потоковой генерации GPT в сообщение Telegram
+#
+# Текст от GPT приходит кусками, и мы постепенно дописываем его в одно сообщение через edit_text.
+# Telegram ограничивает частоту правок (примерно одна в секунду на чат), поэтому правки
+# прореживаются: не чаще STREAM_EDIT_INTERVAL секунд и только если текст изменился.
+
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между правками одного сообщения, секунды
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+# Максимальная длина сообщения в Telegram
+MESSAGE_MAX_LENGTH = 4096
+# Знак, который показываем в конце текста, пока генерация не закончилась
+STREAM_CURSOR = " ▌"
+
+
+# Сообщение, которое постепенно дописывается по мере генерации
+class StreamingMessage:
+    def __init__(self, message, interval=STREAM_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self.sent_text = None
+        self.next_edit_at = 0.0
+
+    # Правим сообщение, если прошло достаточно времени с прошлой правки
+    async def update(self, text):
+        if time.monotonic() < self.next_edit_at:
+            return
+
+        await self._edit(text[:MESSAGE_MAX_LENGTH - len(STREAM_CURSOR)] + STREAM_CURSOR)
+
+    # Финальная правка без курсора; то, что не влезло в одно сообщение, отправляем следом
+    async def finish(self, text):
+        first, rest = text[:MESSAGE_MAX_LENGTH], text[MESSAGE_MAX_LENGTH:]
+
+        # Финальную правку не пропускаем, а ждём окончания ограничения
+        delay = self.next_edit_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        await self._edit(first, final=True)
+
+        while rest:
+            await self.message.reply_text(rest[:MESSAGE_MAX_LENGTH])
+            rest = rest[MESSAGE_MAX_LENGTH:]
+
+    async def _edit(self, text, final=False):
+        # Пустой и неизменившийся текст Telegram не принимает
+        if not text.strip() or text == self.sent_text:
+            return
+
+        try:
+            await self.message.edit_text(text)
+            self.sent_text = text
+            self.next_edit_at = time.monotonic() + self.interval
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            logger.warning(f"Telegram просит подождать {retry_after} с перед следующей правкой сообщения.")
+            self.next_edit_at = time.monotonic() + retry_after
+
+            if final:
+                await asyncio.sleep(retry_after)
+                await self._edit(text, final=True)
+        except BadRequest as e:
+            # Такой же текст уже в сообщении - это не ошибка
+            if "not modified" not in str(e).lower():
+                raise
+
+
+async def stream_to_message(message, chunks, interval=STREAM_EDIT_INTERVAL):
+    """
+    Дописывает текст из потока в сообщение Telegram по мере генерации.
+
+    :param message: Сообщение Telegram, которое будем править (например, заглушка "Мир создаётся...")
+    :param chunks: Асинхронный итератор кусков текста, например client.prompt_stream(...)
+    :param interval: Минимальный интервал между правками, секунды
+    :return: Полный текст, собранный из потока
+    """
+    streaming_message = StreamingMessage(message, interval)
+    text = ""
+
+    async for chunk in chunks:
+        text += chunk
+        await streaming_message.update(text)
+
+    text = text.strip()
+    await streaming_message.finish(text)
+
+    return text
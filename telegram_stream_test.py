@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from telegram_stream import MESSAGE_MAX_LENGTH, STREAM_CURSOR, stream_to_message
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+        self.replies = []
+
+    async def edit_text(self, text):
+        self.edits.append(text)
+        return self
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+        return FakeMessage()
+
+
+async def chunks_of(parts, delay=0.0):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+class MyTestCase(unittest.TestCase):
+    def test_edits_are_throttled(self):
+        message = FakeMessage()
+        parts = ["Год ", "выдался ", "тяжёлым", "."]
+
+        text = asyncio.run(stream_to_message(message, chunks_of(parts), interval=0.2))
+
+        self.assertEqual(text, "Год выдался тяжёлым.")
+        # Первая правка сразу, остальные куски пришли раньше интервала - только финальная правка без курсора
+        self.assertEqual(message.edits, ["Год " + STREAM_CURSOR, "Год выдался тяжёлым."])
+
+    def test_every_chunk_is_shown_without_throttling(self):
+        message = FakeMessage()
+
+        asyncio.run(stream_to_message(message, chunks_of(["А", "Б", "В"]), interval=0))
+
+        self.assertEqual(message.edits, ["А" + STREAM_CURSOR, "АБ" + STREAM_CURSOR, "АБВ" + STREAM_CURSOR, "АБВ"])
+
+    def test_long_text_is_split(self):
+        message = FakeMessage()
+        text = "x" * (MESSAGE_MAX_LENGTH + 10)
+
+        asyncio.run(stream_to_message(message, chunks_of([text]), interval=0))
+
+        self.assertEqual(message.edits[-1], "x" * MESSAGE_MAX_LENGTH)
+        self.assertEqual(message.replies, ["x" * 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# update_processor.py - параллельная обработка обновлений с порядком внутри одного игрока
+#
+# По умолчанию Application обрабатывает обновления по одному: пока один игрок ждёт ответа GPT
+# на свою инициативу, все остальные стоят в очереди за ним. PerChatUpdateProcessor обрабатывает
+# обновления разных игроков параллельно (до UPDATE_CONCURRENCY одновременно), а обновления одного
+# игрока - строго по очереди, в порядке поступления: двойное нажатие "Начать историю" не запустит
+# две генерации мира наперегонки, а второе сообщение не обгонит первое в ConversationHandler.
+# Место в общем лимите обновление занимает, только дождавшись своей очереди у игрока: иначе серия
+# сообщений одного игрока заняла бы все места ожиданием его же блокировки, и остальные игроки стояли бы.
+#
+# Нажатия кнопок подтверждаются сразу (callback_query.answer), не дожидаясь очереди игрока.
+# Повторное нажатие той же кнопки под тем же сообщением, пока первое ещё обрабатывается, новую
+# обработку не запускает: оно присоединяется к уже идущей и завершается вместе с ней. Иначе каждое
+# лишнее нажатие "Начать историю" - это ещё одна цепочка запросов к GPT и ещё одна строка в worlds.
+# Блокировки и нажатия в обработке живут в памяти процесса, поэтому бот работает в одном экземпляре
+# (см. database/instance_lock.py).
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений обрабатываем одновременно (обновления, ждущие своей очереди у игрока, место не занимают)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 64))
+
+
+# Чьи обновления нельзя обрабатывать параллельно: игрок (Telegram ID), иначе чат
+def update_key(update):
+    if not isinstance(update, Update):
+        return None
+
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+
+    return None
+
+
+# Нажатие кнопки: (игрок, действие, сообщение с кнопкой); None - обновление не нажатие кнопки
+def callback_key(update):
+    if not isinstance(update, Update) or update.callback_query is None:
+        return None
+
+    query = update.callback_query
+    message_id = query.message.message_id if query.message is not None else query.inline_message_id
+    return query.from_user.id, query.data, message_id
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates=UPDATE_CONCURRENCY):
+        super().__init__(max_concurrent_updates)
+        # Общий лимит берём сами, после блокировки игрока (см. process_update)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # Блокировка на каждого игрока с обновлениями в работе: key -> [lock, сколько обновлений её держат или ждут]
+        self._locks = {}
+        # Нажатия кнопок в обработке: callback_key -> событие окончания обработки
+        self._callbacks_in_flight = {}
+
+    @asynccontextmanager
+    async def _locked(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    # BaseUpdateProcessor.process_update занимает место в общем лимите до do_process_update, то есть до
+    # блокировки игрока, поэтому переопределяем его: место занимается в _process, уже под блокировкой
+    async def process_update(self, update, coroutine):
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update, coroutine):
+        callback = callback_key(update)
+        if callback is None:
+            await self._process(update, coroutine)
+            return
+
+        # Убираем "часики" на кнопке сразу, даже если игрок ждёт своей очереди
+        try:
+            await update.callback_query.answer()
+        except TelegramError as e:
+            logger.warning(f"Не удалось подтвердить нажатие кнопки {callback[1]}: {e}")
+
+        running = self._callbacks_in_flight.get(callback)
+        if running is not None:
+            logger.info(f"Повторное нажатие {callback[1]} игроком {callback[0]}: ждём уже идущую обработку.")
+            coroutine.close()
+            await running.wait()
+            return
+
+        done = asyncio.Event()
+        self._callbacks_in_flight[callback] = done
+        try:
+            await self._process(update, coroutine)
+        finally:
+            del self._callbacks_in_flight[callback]
+            done.set()
+
+    async def _process(self, update, coroutine):
+        key = update_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        # asyncio.Lock будит ожидающих по очереди, поэтому обновления игрока идут в порядке поступления
+        async with self._locked(key):
+            async with self._slots:
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._locks:
+            logger.warning(f"Остановка обработки обновлений: у {len(self._locks)} игроков остались обновления в работе.")
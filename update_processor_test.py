@@ -0,0 +1,132 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from telegram import CallbackQuery, Chat, Message, Update, User
+from telegram.ext import SimpleUpdateProcessor
+
+from update_processor import PerChatUpdateProcessor
+
+# Время "запроса к GPT" в обработчике, секунды
+HANDLER_DELAY = 0.02
+
+
+def make_update(update_id, telegram_id):
+    user = User(id=telegram_id, first_name="игрок", is_bot=False)
+    chat = Chat(id=telegram_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=None, chat=chat, from_user=user, text=str(update_id))
+    return Update(update_id=update_id, message=message)
+
+
+def make_press(update_id, telegram_id, action, message_id=100):
+    user = User(id=telegram_id, first_name="игрок", is_bot=False)
+    message = Message(message_id=message_id, date=None, chat=Chat(id=telegram_id, type=Chat.PRIVATE))
+    query = CallbackQuery(id=str(update_id), from_user=user, chat_instance="1", message=message, data=action)
+    return Update(update_id=update_id, callback_query=query)
+
+
+# Прогоняем обновления через процессор так же, как Application: задача на каждое обновление в порядке поступления
+# Возвращает пик одновременных обработок по каждому игроку, пик по всем игрокам и порядок обработки
+async def run_updates(processor, updates):
+    running = {}
+    peak = {}
+    overall_peak = 0
+    handled = []
+
+    async def handler(update):
+        nonlocal overall_peak
+        key = update.effective_user.id
+        running[key] = running.get(key, 0) + 1
+        peak[key] = max(peak.get(key, 0), running[key])
+        overall_peak = max(overall_peak, sum(running.values()))
+        await asyncio.sleep(HANDLER_DELAY)
+        handled.append((key, update.update_id))
+        running[key] -= 1
+
+    await asyncio.gather(*[
+        asyncio.create_task(processor.process_update(update, handler(update))) for update in updates
+    ])
+    return peak, overall_peak, handled
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_one_player_updates_run_one_at_a_time_in_order(self):
+        # Двойные и тройные нажатия одного игрока вперемешку с другими
+        updates = [make_update(i, telegram_id=i % 3) for i in range(12)]
+
+        processor = PerChatUpdateProcessor(16)
+        peak, _, handled = await run_updates(processor, updates)
+
+        self.assertEqual(max(peak.values()), 1)
+        self.assertEqual(processor._locks, {})  # Блокировки игроков без обновлений в работе не копятся
+        for key in range(3):
+            order = [update_id for handled_key, update_id in handled if handled_key == key]
+            self.assertEqual(order, sorted(order))
+
+    async def test_repeated_press_joins_running_handler(self):
+        processor = PerChatUpdateProcessor(16)
+        answered = []
+        handled = []
+
+        async def answer(query, *args, **kwargs):
+            answered.append((query.id, time.monotonic()))
+
+        async def start_game(update):
+            await asyncio.sleep(0.1)  # Генерация мира
+            handled.append(update.update_id)
+
+        # Три нажатия "Начать историю" под одним сообщением и одно под другим
+        presses = [make_press(1, 7, "start_game"), make_press(2, 7, "start_game"),
+                   make_press(3, 7, "start_game"), make_press(4, 7, "start_game", message_id=101)]
+
+        with mock.patch.object(CallbackQuery, "answer", answer):
+            started = time.monotonic()
+            await asyncio.gather(*[
+                asyncio.create_task(processor.process_update(press, start_game(press))) for press in presses
+            ])
+
+        self.assertEqual(handled, [1, 4])
+        # Все нажатия подтверждены сразу, не дожидаясь генерации мира
+        self.assertEqual(len(answered), 4)
+        self.assertLess(max(at for _, at in answered) - started, 0.05)
+        self.assertEqual(processor._callbacks_in_flight, {})
+
+    async def test_players_are_processed_concurrently(self):
+        # 50 игроков по 3 обновления: последовательно - по одному, по игрокам - все 50 сразу
+        updates = [make_update(turn * 50 + player, telegram_id=player) for turn in range(3) for player in range(50)]
+
+        _, sequential_peak, _ = await run_updates(SimpleUpdateProcessor(1), updates)
+        peak, overall_peak, handled = await run_updates(PerChatUpdateProcessor(64), updates)
+
+        self.assertEqual(sequential_peak, 1)
+        self.assertEqual(overall_peak, 50)
+        self.assertEqual(max(peak.values()), 1)
+        # Каждый "ход" всех игроков заканчивается раньше, чем начинается следующий
+        turns = [update_id // 50 for _, update_id in handled]
+        self.assertEqual(turns, sorted(turns))
+
+    async def test_burst_of_one_player_does_not_starve_others(self):
+        # Два места на всех: 10 сообщений одного игрока, затем одно от другого
+        updates = [make_update(i, telegram_id=1) for i in range(10)] + [make_update(10, telegram_id=2)]
+
+        processor = PerChatUpdateProcessor(2)
+        peak, overall_peak, handled = await run_updates(processor, updates)
+
+        # Сообщения первого игрока ждут его блокировки, не занимая мест, и второй игрок идёт сразу
+        self.assertIn((2, 10), handled[:2])
+        self.assertEqual(overall_peak, 2)
+        self.assertEqual(max(peak.values()), 1)
+        self.assertEqual(processor._slots._value, 2)
+
+    async def test_concurrency_limit_is_kept(self):
+        updates = [make_update(player, telegram_id=player) for player in range(10)]
+
+        _, overall_peak, handled = await run_updates(PerChatUpdateProcessor(3), updates)
+
+        self.assertEqual(overall_peak, 3)
+        self.assertEqual(len(handled), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
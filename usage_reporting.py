@@ -0,0 +1,153 @@
+# usage_reporting.py - модуль отчётности по расходу GPT
+#
+# Клиент GPT (game_world.client) записывает токены и время ответа каждого вызова в client.usage.
+# Здесь эти записи:
+#  - пачками сохраняются в таблицу gpt_usage фоновой задачей (в разрезе игрока, мира и хода),
+#  - отдаются админам командой /stats,
+#  - отдаются в формате Prometheus по HTTP на METRICS_PORT (если порт задан; в режиме webhook - на /metrics сервера webhook).
+
+import asyncio
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from database import run_db, db_stats, save_gpt_usage
+from game_world import client
+from write_behind import write_behind
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Telegram ID админов через запятую: им доступна команда /stats
+ADMIN_TELEGRAM_IDS = {int(telegram_id) for telegram_id in os.getenv("ADMIN_TELEGRAM_IDS", "").split(",") if telegram_id.strip()}
+# Как часто сохраняем накопленные записи о вызовах GPT в БД, секунды
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", 15))
+# Порт HTTP для метрик Prometheus (0 - не поднимать)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+
+# Сохраняет записи о вызовах GPT в БД в фоне
+class UsageWriter:
+    def __init__(self, usage, interval=USAGE_FLUSH_INTERVAL):
+        self.usage = usage
+        self.interval = interval
+        self._task = None
+
+    # Сохраняем всё накопленное; если БД недоступна, записи возвращаются в очередь до следующей попытки
+    async def flush(self):
+        saved = 0
+
+        while True:
+            records = self.usage.drain()
+            if not records:
+                return saved
+
+            try:
+                saved += await run_db(save_gpt_usage, records)
+            except Exception as e:
+                self.usage.requeue(records)
+                logger.error(f"Ошибка при сохранении расхода GPT: {e}")
+                return saved
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    # Запуск фонового сохранения (из post_init приложения)
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Остановка с последним сохранением (из post_shutdown приложения, пока пул БД ещё открыт)
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self.flush()
+
+
+usage_writer = UsageWriter(client.usage)
+
+
+# Все метрики в формате Prometheus: расход GPT, запросы в полёте, кэш ответов, очередь к БД и отложенная запись
+def render_metrics():
+    lines = [
+        "# HELP gpt_in_flight Запросы к GPT, которые идут прямо сейчас",
+        "# TYPE gpt_in_flight gauge",
+        f"gpt_in_flight {client.in_flight}",
+    ]
+
+    cache_stats = client.cache.stats()
+    lines += [
+        "# HELP gpt_response_cache_total Обращения к кэшу ответов GPT",
+        "# TYPE gpt_response_cache_total counter",
+        f'gpt_response_cache_total{{result="hit"}} {cache_stats["hits"]}',
+        f'gpt_response_cache_total{{result="miss"}} {cache_stats["misses"]}',
+    ]
+
+    executor_stats = db_stats()
+    lines += [
+        "# HELP db_executor_queued Запросы к БД в очереди",
+        "# TYPE db_executor_queued gauge",
+        f"db_executor_queued {executor_stats['queued']}",
+        "# HELP db_executor_running Запросы к БД, которые выполняются сейчас",
+        "# TYPE db_executor_running gauge",
+        f"db_executor_running {executor_stats['running']}",
+    ]
+
+    return "\n".join(lines) + "\n" + write_behind.render_prometheus() + client.usage.render_prometheus()
+
+
+# Команда /stats: сводка расхода GPT с момента запуска (только для админов)
+async def stats(update: Update, context: CallbackContext):
+    telegram_id = update.message.from_user.id
+
+    if telegram_id not in ADMIN_TELEGRAM_IDS:
+        logger.info(f"Пользователь {telegram_id} запросил /stats без прав админа.")
+        return
+
+    cache_stats = client.cache.stats()
+    text = (
+        f"{client.usage.format_report()}\n\n"
+        f"Запросов к GPT сейчас: {client.in_flight}\n"
+        f"Кэш ответов: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']} "
+        f"({cache_stats['hit_rate'] * 100:.0f}%)\n"
+        f"Отложенная запись: в очереди {write_behind.pending}, записано {write_behind.rows_written}, "
+        f"последняя пачка {write_behind.last_flush_duration * 1000:.0f} мс"
+    )
+
+    await update.message.reply_text(text)
+
+
+# Минимальный HTTP-сервер для Prometheus: на любой GET отдаёт render_metrics()
+async def _handle_metrics_request(reader, writer):
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = render_metrics().encode("utf-8")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port=METRICS_PORT):
+    if not port:
+        return None
+
+    server = await asyncio.start_server(_handle_metrics_request, port=port)
+    logger.info(f"Метрики Prometheus доступны на порту {port}.")
+    return server
@@ -1,11 +1,9 @@
 import os
-import json
+import asyncio
 import random
-import re
 import logging
 
 from dotenv import load_dotenv
-from decimal import Decimal
 from typing import Dict
 
 # Импорты из библиотеки Telegram
@@ -17,19 +15,35 @@ from telegram.ext import (
 
 # Импорты из базы данных
 from database import (
-    create_user, save_world_metrics_to_db, save_chatacters_to_db, get_db_connection,
-    get_user_id_by_telegram_id, save_world_news_to_db,
-    get_latest_world_metrics, save_world_resources_to_db, get_current_money_from_db,
-    get_current_money_multiplier_from_db, save_new_money_to_db, save_new_money_multiplier_to_db
+    create_user, run_db, run_in_transaction, get_user_id_by_telegram_id,
+    get_latest_world_metrics, get_current_resources_for_update,
+    save_resource_snapshot, save_world_metrics_batch, load_world_state
 )
 
 from database.worlds import World
+from world_history import history_manager
+from world_setup import world_setup_manager, WorldSetupError
+from world_pool import world_pool
+from write_behind import write_behind, WRITE_NEWS, WRITE_CHARACTERS
+from economy import EconomyState, advance
+from metrics_simulator import metrics_simulator
+from world_events import record_world_event, turn_payload, metrics_payload, EVENT_TURN, EVENT_METRICS
 
 # Импорты игровых функций
 from game_world import (
-    generate_world_from_gpt, generate_world_metrics, generate_character,
-    generate_world_news, generate_world_changes, update_world_metrics,
-    generate_world_resources
+    generate_character, generate_world_changes, update_world_metrics,
+    resolve_turn, stream_world_from_gpt, stream_world_news
+)
+
+# Вывод потоковой генерации в сообщение Telegram
+from telegram_stream import stream_to_message
+
+# Ошибки клиента GPT
+from client import GptError, set_usage_context
+
+# Импорты разбора ответов GPT
+from gpt_responses import (
+    InitiativeResult, MetricsChanges, ResponseParseError, parse_response
 )
 
 # Импорты состояний для бота
@@ -56,8 +70,8 @@ else:
 
 print(f"Using bot API: {TELEGRAM_API_KEY}")  # Для проверки, какой ключ используется
 
-# Получаем соединение c БД
-conn = get_db_connection()
+# Режим разрешения хода: "combined" - один структурированный запрос к GPT, "legacy" - старая цепочка из трёх запросов
+TURN_RESOLUTION_MODE = os.getenv("TURN_RESOLUTION_MODE", "combined")
 
 # Создаем экземпляр класса, будем обращаться к этому экземпляру при операциях с данными мира
 world_storage = World()
@@ -71,13 +85,13 @@ async def start(update: Update, context: CallbackContext):
     logger.info(f"Команда /start от пользователя {update.message.from_user.username}")
 
     # Получаем user_id из базы данных по telegram_id
-    user_id = get_user_id_by_telegram_id(telegram_id)
+    user_id = await run_db(get_user_id_by_telegram_id, telegram_id)
 
     # Сохраняем user_id в контексте, чтобы передать на следующем шаге
     context.user_data['user_id'] = user_id
 
     # Создаем пользователя при запуске бота
-    create_user(telegram_id, username)
+    await run_db(create_user, telegram_id, username)
 
     # Отправляем приветственное сообщение
     intro_text = (
@@ -95,34 +109,54 @@ async def start(update: Update, context: CallbackContext):
 # Обработчик нажатия на кнопку "Начать историю"
 async def start_game(update: Update, context: CallbackContext):
     logger.info("Обработка нажатия кнопки 'Начать историю'...")
+    set_usage_context(update.effective_user.id)  # Расход GPT на генерацию мира - на этого игрока
 
     try:
-        # Генерация мира через GPT
-        logger.info("Попытка вызвать генерацию мира через GPT...")
+        # Берём готовый мир из пула: описание, метрики, ресурсы и новости уже в базе данных
+        pooled_world = await world_pool.claim()
 
-        # Генерируем случайный год от -10 000 (первые общины) до 2025 (наши дни)
-        game_year = random.randint(-2000, 2025)
+        if pooled_world:
+            world_id, game_year, world_data = pooled_world
+            await update.callback_query.message.edit_text(f"{world_data}")
+        else:
+            # Пул пуст - генерация мира через GPT
+            logger.info("Попытка вызвать генерацию мира через GPT...")
 
-        # Сохраняем world_id в контексте, чтобы передать на следующем шаге
-        context.user_data['game_year'] = game_year
+            # Генерируем случайный год от -10 000 (первые общины) до 2025 (наши дни)
+            game_year = random.randint(-2000, 2025)
+
+            # Показываем описание мира по мере генерации, не дожидаясь конца ответа GPT
+            await update.callback_query.message.edit_text("Мир создаётся...")
+            world_data = await stream_to_message(update.callback_query.message, stream_world_from_gpt(game_year))  # Получаем описание мира
 
-        world_data = await generate_world_from_gpt(game_year)  # Получаем описание мира
+            if not world_data:
+                await update.callback_query.message.edit_text("Произошла ошибка при генерации мира.")
+                return
 
-        # Записываем описание мира в базу данных
-        world_id = world_storage.save(game_year, world_data)  # Вставка в таблицу worlds
+            # Записываем описание мира в базу данных
+            world_id = await run_db(world_storage.save, game_year, world_data)  # Вставка в таблицу worlds
 
-        if not world_id:
-            await update.callback_query.message.edit_text("Ошибка при записи мира в базу данных.")
-            return
+            if not world_id:
+                await update.callback_query.message.edit_text("Ошибка при записи мира в базу данных.")
+                return
 
-        context.user_data['world_id'] = world_id    # Сохраняем world_id в контексте, чтобы передать на следующем шаге
-        context.user_data['world_data'] = world_data  # Сохраняем описание мира в контексте
+            # Метрики, ресурсы и первые новости готовятся в фоне, пока игрок придумывает персонажа
+            set_usage_context(update.effective_user.id, world_id, game_year)
+            world_setup_manager.start(world_id, game_year, world_data)
+
+        # Заводим историю мира, в неё будут записываться ходы игрока
+        await history_manager.create(world_id, world_data)
 
         # Логируем успешный вызов
         logger.info(f"Мир с ID {world_id} успешно записан в базу данных.")
 
-        # Выводим описания мира пользователю без ожидания генерации метрик
-        await update.callback_query.message.edit_text(f"{world_data}")
+        # Сохраняем данные мира в контексте, чтобы передать на следующем шаге.
+        # Метрики и ресурсы попадут в контекст только готовыми - в receive_character_details
+        context.user_data['game_year'] = game_year
+        context.user_data['world_id'] = world_id
+        context.user_data['world_data'] = world_data
+        context.user_data.pop('metrics_dict', None)
+        context.user_data.pop('resources_dict', None)
 
         # Второе сообщение с текстом "Давай сделаем персонажа"
         intro_text = "Давай теперь создадим персонажа!"
@@ -135,53 +169,10 @@ async def start_game(update: Update, context: CallbackContext):
         # Отправляем сообщение о создании персонажа
         await update.callback_query.message.reply_text(intro_text, reply_markup=reply_markup)
 
-        # Генерация метрик для мира
-        logger.info("Попытка вызвать генерацию метрик для мира...")
-        gpt_response = await generate_world_metrics(world_data)  # Генерация метрик от GPT
-        print(f"Метрики мира: {gpt_response}")
-
-        if not gpt_response:
-            await update.callback_query.message.edit_text("Ошибка при генерации метрик для мира.")
-            return
-
-        # Распаршеваем ответ от ГПТ
-        gpt_response_cleaned = re.sub(r"```python|```", "", gpt_response).strip()   # Убираем кодовый блок и излишние пробелы/символы
-
-        # Преобразуем строку в словарь
-        try:
-            metrics_dict = json.loads(gpt_response_cleaned)
-            print("Метрики успешно распарсены:", metrics_dict)
-        except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON: {e}")
-
-        # Записываем метрики мира в базу данных
-        save_world_metrics_to_db(world_id, metrics_dict)  # Вставка в таблицу world_metrics
-        context.user_data['metrics_dict'] = metrics_dict  # Сохраняем описание мира в контексте
-        logger.info(f"Метрики мира с ID мира {world_id} успешно записаны в базу данных.")
-
-        # Генерация ресурсов для мира
-        logger.info("Попытка вызвать генерацию ресурсов для мира...")
-        gpt_response = await generate_world_resources(metrics_dict, world_data)  # Генерация ресурсов от GPT
-        print(f"Ресурсы мира: {gpt_response}")
-
-        if not gpt_response:
-            await update.callback_query.message.edit_text("Ошибка при генерации ресурсов для мира.")
-            return
-
-        # Распаршеваем ответ от ГПТ
-        gpt_response_cleaned = re.sub(r"```python|```", "", gpt_response).strip()   # Убираем кодовый блок и излишние пробелы/символы
-
-        # Преобразуем строку в словарь
-        try:
-            resources_dict = json.loads(gpt_response_cleaned)
-            print("Ресурсы успешно распарсены:", resources_dict)
-        except json.JSONDecodeError as e:
-            print(f"Ошибка парсинга JSON: {e}")
-
-        # Записываем ресурсы мира в базу данных
-        save_world_resources_to_db(world_id, resources_dict)  # Вставка в таблицу world_metrics
-        context.user_data['resources_dict'] = resources_dict  # Сохраняем ресурсы мира в контексте
-        logger.info(f"Ресурсы мира с ID мира {world_id} успешно записаны в базу данных.")
+    except GptError as e:
+        await update.callback_query.message.edit_text("Не удалось сгенерировать мир: GPT сейчас недоступен. Попробуй ещё раз через минуту: /start")
+        logger.error(f"Ошибка GPT при генерации мира: {e}")
+        return
 
     except Exception as e:
         await update.callback_query.message.edit_text("Произошла ошибка при генерации мира в обработчике нажатия кнопки 'Начать историю'.")
@@ -201,6 +192,7 @@ async def start_character_creation(update: Update, context: CallbackContext):
 # Эта функция срабатывает, когда пользователь отправляет описание своего персонажа
 async def receive_character_details(update: Update, context: CallbackContext):
     character_details = update.message.text  # Получаем текст от пользователя
+    world_pool.note_activity()  # Пока игроки активны, пул миров не пополняется в фоне
     logger.info("Получили описание персонажа от пользователя...")
 
     # Сохраняем данные в context, чтобы использовать их для генерации персонажа
@@ -210,46 +202,62 @@ async def receive_character_details(update: Update, context: CallbackContext):
     world_id = context.user_data.get('world_id')
     user_id = context.user_data.get('user_id')
 
+    # Мир ещё не создан (например, генерация мира завершилась ошибкой)
+    if not world_id:
+        await update.message.reply_text("Мир ещё не создан. Начни историю заново: /start")
+        return ConversationHandler.END
+
+    # Расход GPT дальше записывается на этого игрока, мир и год
+    set_usage_context(update.effective_user.id, world_id, context.user_data.get('game_year'))
+
     # Отправляем подтверждение пользователю
     await update.message.reply_text(f"Спасибо! Ты выбрал: {character_details}. Теперь я создам персонажа.")
 
-    # Генерация персонажа с помощью GPT
+    # Генерация персонажа с помощью GPT, пока в фоне дозревают метрики, ресурсы и новости мира
     world_data = context.user_data.get('world_data')    # Получаем world_data из context
-    character_description = await generate_character(world_data, character_details)
+    game_year = context.user_data.get('game_year')      # Получаем game_year из context
+    try:
+        character_description = await generate_character(world_data, character_details)
+    except GptError:
+        await update.message.reply_text("Не удалось создать персонажа: GPT сейчас недоступен. Попробуй описать персонажа ещё раз.")
+        return WAITING_FOR_CHARACTER_DETAILS
     context.user_data['character_description'] = character_description  # Сохраняем описание персонажа в context
 
     # Сохраняем персонажа в базу данных
-    save_chatacters_to_db(world_id, user_id, character_description)  # Вставка в таблицу characters
+    write_behind.put(WRITE_CHARACTERS, world_id, (world_id, user_id, character_description))  # Вставка в таблицу characters в фоне
 
     # Отправляем сгенерированное описание персонажа
     await update.message.reply_text(f"Вот твой персонаж: {character_description}")
 
+    # Дожидаемся фоновой подготовки мира
+    try:
+        world_setup = await world_setup_manager.wait(world_id, game_year, world_data)
+    except WorldSetupError as e:
+        await update.message.reply_text(f"{e} Попробуй начать историю заново: /start")
+        return ConversationHandler.END
+
+    context.user_data['metrics_dict'] = world_setup.metrics  # Сохраняем метрики мира в контексте
+    context.user_data['resources_dict'] = world_setup.resources  # Сохраняем ресурсы мира в контексте
+
     # Выводим дайджест актуальных новостей
     intro_text = "Вот твоя подборка актуальных новостей!"
 
     # Отправляем сообщение пользователю
     await update.message.reply_text(intro_text)
 
-    # Подготавливаем дайджест новостей для пользователя
-    logger.info("Попытка вызвать генерацию новостей для мира...")
-    world_data = context.user_data.get('world_data')    # Получаем world_data из context
-    world_id = context.user_data.get('world_id')        # Получаем world_id из context
-    world_metrics = context.user_data.get('metrics_dict')  # Получаем актуальные метрики мира из контекста
-
-    # Генерация новостей через GPT
-    game_year = context.user_data.get('game_year')      # Получаем game_year из context
-    world_news = await generate_world_news(game_year, world_data, world_metrics)  # Генерация новостей с использованием await
-    logger.info(f"Генерация новостей завершена: {world_news}")
-
-    # Отправляем новости пользователю
-    if world_news:
+    if world_setup.news:
+        # Новости уже сгенерированы и сохранены во время подготовки мира
+        world_news = world_setup.news
         await update.message.reply_text(world_news)
+    else:
+        # Подготовка новостей не удалась - генерируем их сейчас
+        logger.info("Попытка вызвать генерацию новостей для мира...")
+        world_news = await send_streamed_news(update, stream_world_news(game_year, world_data, world_setup.metrics))
 
         # Сохраняем новости в базу данных
-        save_world_news_to_db(world_id, world_news)  # Вставка в таблицу world_news
-
-    else:
-        await update.message.reply_text("Не удалось получить новости. Попробуй позже.")
+        if world_news:
+            write_behind.put(WRITE_NEWS, world_id, (world_id, world_news))  # Вставка в таблицу world_metrics в фоне
+    logger.info(f"Генерация новостей завершена: {world_news}")
 
     # Отправляем отчёт на текущий год пользователю
     resources_dict = context.user_data.get('resources_dict', {})
@@ -278,8 +286,7 @@ async def start_initiation(update: Update, context: CallbackContext):
     await update.callback_query.message.edit_text(
         "Опиши свою инициативу! Можешь поделиться любыми деталями, которыми захочется!\nНаример, какие проблемы ты видишь в мире, какие изменения хочешь внести, какие идеи у тебя есть.\nА если не хочется ничего придумывать, просто напиши 'Любой'!"
     )
-    # Подтверждаем, что callback_query обработан
-    await update.callback_query.answer()
+    # Нажатие кнопки уже подтверждено в PerChatUpdateProcessor (update_processor.py)
 
     return WAITING_FOR_INITIATIVE  # Ожидаем текст инициативы
 
@@ -287,77 +294,104 @@ async def start_initiation(update: Update, context: CallbackContext):
 async def receive_initiative_details(update: Update, context: CallbackContext):
     # Получаем текст инициативы от пользователя
     initiation_details = update.message.text
+    world_pool.note_activity()  # Пока игроки активны, пул миров не пополняется в фоне
 
     # Получаем данные из telegram context
     world_id = context.user_data.get('world_id')  # Получаем world_id из context
-    world_id = context.user_data.get('world_id')  # Получаем world_data из context
+    user_id = context.user_data.get('user_id')  # Получаем user_id из context
     next_game_year = context.user_data.get('game_year') + 1  # Получаем game_year из context
     world_data = context.user_data.get('world_data')  # Получаем world_data из context
-    world_metrics = context.user_data.get('metrics_dict')  # Получаем актуальные метрики мира из контекста
-    # world_resources = context.user_data.get('resources_dict')    # Получаем ресурсы из context
 
-    # Отправляем подтверждение пользователю
-    await update.message.reply_text(f"Спасибо! Твоя инициатива: {initiation_details}.")
+    # Расход GPT на этот ход записывается на игрока, мир и новый год
+    set_usage_context(update.effective_user.id, world_id, next_game_year)
 
-    # Генерация изменений мира на основе инициативы от GPT
+    # История мира для промптов: описание, сводка старых ходов и последние ходы дословно
+    world_history = await history_manager.get(world_id, world_data)
+    world_context = world_history.render()
 
-    print(f"Текущий айди мира {world_id}")
-    character_description = context.user_data.get('character_description')  # Получаем character_description из context
-    initiate_result = await generate_initiative_result_and_resources(
-        world_id,
-        world_data,
-        character_description,
-        next_game_year,
-        initiation_details
-    )
+    # Снимок мира на начало хода одним запросом: ресурсы, метрики, персонаж.
+    # Строки прошлого хода, которые ещё ждут отложенной записи, сначала дописываем
+    if not await write_behind.wait_for_world(world_id):
+        logger.warning(f"Не все отложенные строки мира {world_id} записаны: новости или персонаж могут быть устаревшими.")
+    world_state = await run_db(run_in_transaction, load_world_state, world_id, user_id)
+    if world_state is None:
+        await update.message.reply_text("Не удалось загрузить мир. Попробуй начать историю заново: /start")
+        return ConversationHandler.END
 
-    # Отправляем сгенерированное изменение мира
-    await update.message.reply_text(f"{initiate_result}")
+    world_metrics = world_state.metrics or context.user_data.get('metrics_dict')  # Актуальные метрики мира
+    character_description = world_state.character_description or context.user_data.get('character_description')
 
-    # Отправляем сгенерированное изменение мира
-    current_money = get_current_money_from_db(conn, world_id)
-    await update.message.reply_text(f"Казна на конец года: {current_money}")
-
-    # Апдейт метрик для мира после инициативы пользователя
-    logger.info("Попытка вызвать обновление метрик для мира...")
-    gpt_response = await update_world_metrics(world_data, initiation_details)  # Генерация метрик от GPT
-    print(f"Изменения метрик нового мира: {gpt_response}")
-
-    if not gpt_response:
-        await update.callback_query.message.edit_text("Ошибка при генерации обновления метрик для мира.")
-        return
+    # Отправляем подтверждение пользователю
+    await update.message.reply_text(f"Спасибо! Твоя инициатива: {initiation_details}.")
 
-    # Удаляем ```json и ``` с помощью регулярного выражения
-    cleaned_response = re.sub(r"```json|```", "", gpt_response).strip()
-    print(f"Ответ GPT после очистки: {cleaned_response}")  # Логируем после очистки
+    print(f"Текущий айди мира {world_id}")
 
-    # Преобразуем строку в словарь
+    # Разрешаем ход одним запросом к GPT: изменения мира, финансы, метрики и новости
     try:
-        metrics_dict = json.loads(cleaned_response)
-        print("Изменения метрик успешно распарсены:", metrics_dict)
-    except json.JSONDecodeError as e:
-        print(f"Ошибка парсинга JSON: {e}")
+        resolution = None
+        if TURN_RESOLUTION_MODE == "combined":
+            resolution = await resolve_turn(
+                world_state.budget,
+                world_state.money_multiplier,
+                character_description,
+                next_game_year,
+                world_context,
+                world_metrics,
+                initiation_details
+            )
+
+        # Метрики следующего года считаем до записи хода: событие метрик ложится в журнал
+        # одной транзакцией с событием хода. Влияние инициативы оценивает GPT, итоговые значения - модель, если она загружена
+        if resolution:
+            initiate_result = resolution.world_changes.npc_perspective
+            updated_metrics = await next_year_metrics(
+                world_id, world_metrics, resolution.metrics_changes.model_dump(), world_context, initiation_details
+            )
+            current_money = await apply_initiative_changes(
+                world_id,
+                resolution.world_changes.facts,
+                resolution.financial_evaluation.estimated_cost,
+                resolution.financial_evaluation.money_multiplier_change,
+                user_id=user_id,
+                game_year=next_game_year,
+                initiative=initiation_details,
+                npc_response=resolution.world_changes.npc_perspective,
+                metrics=updated_metrics
+            )
+            world_news = resolution.news
+        else:
+            # Старая цепочка из трёх запросов, если одним запросом не получилось
+            updated_metrics = await next_year_metrics(world_id, world_metrics, None, world_context, initiation_details)
+            initiate_result, current_money = await generate_initiative_result_and_resources(
+                world_id,
+                world_context,
+                character_description,
+                next_game_year,
+                initiation_details,
+                world_state,
+                user_id,
+                metrics=updated_metrics
+            )
+            world_news = None
+    except GptError:
+        # Ход не применён: ни мир, ни казна не изменились, инициативу можно отправить заново
+        await update.message.reply_text("GPT сейчас недоступен, год не наступил. Попробуй отправить инициативу ещё раз через минуту.")
+        return WAITING_FOR_INITIATIVE
+    except ResponseParseError:
+        # Ответ не разобрался - ход тоже не применён: ни история, ни год, ни метрики не меняются
+        await update.message.reply_text("Не удалось разобрать ответ GPT, год не наступил. Попробуй отправить инициативу ещё раз.")
+        return WAITING_FOR_INITIATIVE
 
-    # Определяем, какие изменения вносим в метрики(суммируем старые и новые значения)
-    updated_metrics = {}
+    # Отправляем сгенерированное изменение мира
+    await update.message.reply_text(f"{initiate_result}")
 
-    # Преобразуем строковые значения "+" и "-" в числа (1 и -1 соответственно)
-    for key in world_metrics:
-        if metrics_dict[key] == "+":
-            updated_metrics[key] = world_metrics[key] + 1
-        elif metrics_dict[key] == "-":
-            updated_metrics[key] = world_metrics[key] - 1
-        elif metrics_dict[key] == "0":
-            updated_metrics[key] = world_metrics[key]
-        else:
-            # Если пришло число, просто складываем
-            updated_metrics[key] = world_metrics[key] + int(metrics_dict.get(key, 0))
+    # Отправляем остаток казны после хода
+    await update.message.reply_text(f"Казна на конец года: {current_money}")
 
     print(f"Обновленные метрики: {updated_metrics}")
 
-    # Обновляем метрики в БД
+    # Метрики уже записаны в БД вместе с ходом (apply_initiative_result)
     context.user_data['metrics_dict'] = updated_metrics  # Сохраняем описание метрик в context
-    save_world_metrics_to_db(world_id, updated_metrics)
 
     print(f"✅ Метрики обновлены для мира {world_id}: {updated_metrics}")
 
@@ -367,22 +401,21 @@ async def receive_initiative_details(update: Update, context: CallbackContext):
     # Отправляем сообщение пользователю
     await update.message.reply_text(intro_text)
 
-    # Генерация новостей через GPT
-    world_news = await generate_world_news(next_game_year, initiate_result, updated_metrics)  # Генерация новостей с использованием await
-    logger.info(f"Генерация новостей завершена: {world_news}")
-
-    # Отправляем новости пользователю
-    if world_news:
+    # Генерация новостей через GPT, если они не пришли вместе с разрешением хода
+    if world_news is None:
+        world_news = await send_streamed_news(update, stream_world_news(next_game_year, initiate_result, updated_metrics))
+    elif world_news:
         await update.message.reply_text(world_news)
-
-        # Сохраняем новости в базу данных
-        # save_world_news_to_db(world_id, world_news)  # Вставка в таблицу world_new
-
     else:
         await update.message.reply_text("Не удалось получить новости. Попробуй позже.")
+    logger.info(f"Генерация новостей завершена: {world_news}")
 
-    # Обновляем контекст и заносим в краткосрочную память
-    context.user_data['world_data'] += f"\n\n Год: {next_game_year}\n Инициатива игрока: {initiation_details}\n Изменения: {initiate_result}"
+    # Сохраняем новости в базу данных в фоне
+    if world_news:
+        write_behind.put(WRITE_NEWS, world_id, (world_id, world_news))
+
+    # Записываем ход в историю мира, старые ходы свернутся в сводку в фоне
+    await history_manager.add_turn(world_history, next_game_year, initiation_details, initiate_result)
     context.user_data['initiation_details'] = initiation_details
     context.user_data['game_year'] = next_game_year  # Перезаписываем next_game_year в context
 
@@ -401,96 +434,160 @@ async def receive_initiative_details(update: Update, context: CallbackContext):
     return WAITING_FOR_INITIATIVE  # Ожидаем следующий ввод инициативы
 
 
-async def generate_initiative_result_and_resources(world_id, world_data, character_description, next_game_year, initiation_details):
-    # получить последнюю запись из таблицы ресурсов (current)
-    current_money = get_current_money_from_db (conn, world_id)
-    current_multiplier = get_current_money_multiplier_from_db (conn, world_id)
+# Выводим новости по мере генерации в отдельное сообщение
+async def send_streamed_news(update: Update, chunks):
+    news_message = await update.message.reply_text("Свежий выпуск готовится...")
+
+    try:
+        world_news = await stream_to_message(news_message, chunks)
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой генерации новостей: {e}")
+        world_news = None
+
+    if not world_news:
+        await news_message.edit_text("Не удалось получить новости. Попробуй позже.")
+
+    return world_news
+
+
+async def generate_initiative_result_and_resources(world_id, world_data, character_description, next_game_year, initiation_details, world_state=None, user_id=None,
+                                                   metrics=None):
+    # снимок мира на начало хода; казна из него нужна только для промпта,
+    # при записи значения перечитываются под блокировкой
+    if world_state is None:
+        world_state = await run_db(run_in_transaction, load_world_state, world_id)
+
+    current_multiplier = world_state.money_multiplier
 
     # рассчитать доступные ресурсы умножив текущий баланс на множитель
-    budget = current_money * current_multiplier
+    budget = world_state.budget
 
     # передать полученные цифры в промпт для генерации изменений после инициативы юзера
     initiate_result = await generate_world_changes(budget, current_multiplier, character_description, next_game_year, world_data, initiation_details)
 
-    # записываем, как изменился мир в бд
-    new_world_description = await clean_and_parse_json(initiate_result, ["world_changes", "facts"])
-    world_storage.update_description(world_id, new_world_description)
+    # разбираем ответ один раз; если не вышло - ResponseParseError уходит обработчику, мир и казна не меняются
+    result = parse_response(initiate_result, InitiativeResult)
+
+    # списываем затраты, меняем коэффициент и описание мира
+    new_money = await apply_initiative_changes(
+        world_id,
+        result.world_changes.facts,
+        result.financial_evaluation.estimated_cost,
+        result.financial_evaluation.money_multiplier_change,
+        user_id=user_id,
+        game_year=next_game_year,
+        initiative=initiation_details,
+        npc_response=result.world_changes.npc_perspective,
+        metrics=metrics
+    )
 
-    # записываем новый остаток денег для мира
-    response_cost = await clean_and_parse_json(initiate_result, ["financial_evaluation", "estimated_cost"])
+    # вернуть ответ нпс
+    return result.world_changes.npc_perspective, new_money
+
+# Применяем оценку GPT к миру одной транзакцией. Возвращает новый остаток казны
+async def apply_initiative_changes(world_id, new_world_description, response_cost, new_multiplier_delta,
+                                   user_id=None, game_year=None, initiative=None, npc_response=None, metrics=None):
     print(f"Оценка затрат {response_cost}")
-    if response_cost is None or response_cost == "":
-        response_cost = 0
-    new_money = budget - Decimal(response_cost)
-    print(f"Новый бюджет {new_money}")
-    save_new_money_to_db(conn, world_id, new_money)
-
-    # записываем новый коэффициент денег для мира
-    new_multiplier_delta = await clean_and_parse_json(initiate_result,["financial_evaluation", "money_multiplier_change"])
     print(f"new multiplier delta {new_multiplier_delta}")
 
-    # проверяем, что оно не None и не пустая строка
-    if new_multiplier_delta is None or new_multiplier_delta == "":
-        print("Ошибка: `new_multiplier_delta` отсутствует, устанавливаем 0.0")
-        new_multiplier_delta = 0.0
-    else:
-        try:
-            # Преобразуем в float
-            new_multiplier_delta = float(new_multiplier_delta)
-        except ValueError:
-            print(f"Ошибка: `new_multiplier_delta` содержит некорректное значение: {new_multiplier_delta}, устанавливаем 0.0")
-            new_multiplier_delta = 0.0
+    # списываем затраты, меняем коэффициент и описание мира одной транзакцией
+    return await run_db(
+        run_in_transaction,
+        apply_initiative_result,
+        world_id,
+        new_world_description,
+        response_cost,
+        new_multiplier_delta,
+        user_id,
+        game_year,
+        initiative,
+        npc_response,
+        metrics
+    )
 
-    # вычисляем новый коэффициент роста
-    current_multiplier = Decimal(current_multiplier)    # Убедимся, что current_multiplier — Decimal
-    new_multiplier_delta = Decimal(str(new_multiplier_delta))  # Убедимся, что new_multiplier_delta — тоже Decimal
+# Применяем результат инициативы к миру. Вызывается внутри run_in_transaction:
+# либо записывается всё (деньги, коэффициент, описание, метрики, события хода и метрик в журнале мира), либо ничего
+def apply_initiative_result(conn, world_id, new_world_description, response_cost, new_multiplier_delta,
+                            user_id=None, game_year=None, initiative=None, npc_response=None, metrics=None):
+    # перечитываем казну под блокировкой, чтобы параллельный ход по этому же миру не затёр наши изменения
+    current_money, current_multiplier, current_people, people_multiplier = get_current_resources_for_update(conn, world_id)
+
+    # год экономики: казна и население растут, затраты списываются, коэффициент сдвигается в допустимых пределах
+    economy = advance(
+        EconomyState(current_money, current_multiplier, current_people, people_multiplier),
+        response_cost,
+        new_multiplier_delta
+    )
+    new_money, new_multiplier = economy.money, economy.money_multiplier
+    logger.info(f"Мир {world_id}: казна {current_money} -> {new_money}, коэффициент роста {current_multiplier} -> {new_multiplier}, "
+                f"население {current_people} -> {economy.people}")
+
+    # деньги, коэффициент и население одной новой строкой истории ресурсов
+    save_resource_snapshot(conn, world_id, new_money, new_multiplier, economy.people)
+
+    # записываем, как изменился мир
+    world_storage.update_description(world_id, new_world_description, conn=conn)
+
+    # ход - неизменяемое событие журнала мира (см. world_events.py)
+    if game_year is not None:
+        record_world_event(
+            conn, world_id, user_id, game_year, EVENT_TURN,
+            turn_payload(new_world_description, new_money, new_multiplier, response_cost, new_multiplier_delta),
+            initiative, npc_response
+        )
+
+    # метрики следующего года - состояние игры: строка истории и событие журнала в той же транзакции
+    if metrics is not None:
+        save_world_metrics_batch(conn, [(world_id, metrics)])
+        if game_year is not None:
+            record_world_event(conn, world_id, user_id, game_year, EVENT_METRICS, metrics_payload(metrics))
+
+    return new_money
+
+# Метрики мира на следующий год.
+# metrics_dict - влияние инициативы (MetricsChanges), если оно пришло вместе с разрешением хода;
+# иначе сначала спрашиваем его у GPT отдельным запросом. Влияние - вход модели метрик (см. metrics_simulator.py),
+# а без модели оно просто прибавляется к текущим метрикам
+async def next_year_metrics(world_id, world_metrics, metrics_dict, world_context, initiation_details):
+    if metrics_dict is None:
+        # Апдейт метрик для мира после инициативы пользователя
+        logger.info("Попытка вызвать обновление метрик для мира...")
+        # Разбираем ответ от ГПТ; если не вышло - инициатива на метрики не влияет
+        try:
+            gpt_response = await update_world_metrics(world_context, initiation_details)  # Генерация метрик от GPT
+            print(f"Изменения метрик нового мира: {gpt_response}")
 
-    new_multiplier = current_multiplier + new_multiplier_delta
-    print(f"new multiplier {new_multiplier}")
+            metrics_dict = parse_response(gpt_response, MetricsChanges).model_dump()
+            print("Изменения метрик успешно распарсены:", metrics_dict)
+        except (GptError, ResponseParseError):
+            metrics_dict = {}
 
-    # сохраняем в базу данных
-    save_new_money_multiplier_to_db(conn, world_id, new_multiplier)
+    if metrics_simulator.available:
+        try:
+            return await asyncio.to_thread(metrics_simulator.predict, world_metrics, metrics_dict)
+        except Exception as e:
+            logger.error(f"Ошибка модели метрик для мира {world_id}, метрики считаются без неё: {e}")
 
-    # вернуть ответ нпс
-    nps_response = await clean_and_parse_json(initiate_result, ["world_changes", "npc_perspective"])
+    # Определяем, какие изменения вносим в метрики (суммируем старые и новые значения)
+    return apply_metrics_changes(world_metrics, metrics_dict)
 
-    return nps_response
+# Применяем влияние инициативы к метрикам: "+" и "-" сдвигают метрику на 1, число складывается как есть
+def apply_metrics_changes(world_metrics, metrics_changes):
+    updated_metrics = {}
 
-async def clean_and_parse_json(gpt_response, key_path):
-    """
-    Очищает JSON-ответ от GPT, убирает лишние символы и парсит нужное поле.
+    for key in world_metrics:
+        change = metrics_changes.get(key, "0")
+        if change == "+":
+            updated_metrics[key] = world_metrics[key] + 1
+        elif change == "-":
+            updated_metrics[key] = world_metrics[key] - 1
+        elif change == "0":
+            updated_metrics[key] = world_metrics[key]
+        else:
+            # Если пришло число, просто складываем
+            updated_metrics[key] = world_metrics[key] + int(change)
 
-    :param gpt_response: Ответ от GPT в виде строки (возможно, с обертками ```json)
-    :param key_path: Список ключей для извлечения нужного значения (пример: ["world_changes", "npc_perspective"])
-    :return: Значение по ключу или сообщение об ошибке
-    """
-    try:
-        # Проверяем, что ответ не пустой
-        if not gpt_response or not isinstance(gpt_response, str):
-            print("Ошибка: Пустой или некорректный ответ от GPT.")
-            return "Ошибка при обработке данных."
-
-        # Убираем возможные обертки ```json ... ```
-        cleaned_response = re.sub(r"```json|```", "", gpt_response).strip()
-
-        # Парсим JSON
-        data = json.loads(cleaned_response)
-
-        # Проходим по ключам, чтобы добраться до нужного значения
-        for key in key_path:
-            if key not in data:
-                print(f"Ошибка: Ключ '{key}' отсутствует в JSON-ответе.")
-                return "Ошибка при обработке данных."
-            data = data[key]
-
-        return data  # Возвращаем найденное значение
-
-    except json.JSONDecodeError as e:
-        print(f"Ошибка при обработке JSON: {e}\nОтвет от GPT: {gpt_response}")
-        return "Ошибка при обработке данных."
-    except (KeyError, TypeError) as e:
-        print(f"Ошибка доступа к данным JSON: {e}\nОтвет от GPT: {gpt_response}")
-        return "Ошибка при обработке данных."
+    return updated_metrics
 
 async def get_resources_report(game_year: int, resources_dict: Dict[str, int]) -> str:
     # Форматируем год для отображения "до или после нашей эры"
@@ -1,8 +1,18 @@
+import json
 import logging
+import os
+import tempfile
 import unittest
 
-from user_interaction import generate_initiative_result_and_resources
-from unittest import IsolatedAsyncioTestCase
+os.environ.setdefault("OPENAI_API_KEY", "test")  # game_world создаёт клиента GPT при импорте
+
+from database import WorldState
+from gpt_responses import ResponseParseError
+from user_interaction import generate_initiative_result_and_resources, next_year_metrics
+from unittest import IsolatedAsyncioTestCase, mock
+
+from metrics_simulator import MetricsSimulator
+from metrics_simulator_test import METRICS, train_model
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +29,7 @@ class MyTestCase(IsolatedAsyncioTestCase):
 
         initiation_details = "Поднять налоги на 10 пунктов"
 
-        response = await generate_initiative_result_and_resources(
+        response, new_money = await generate_initiative_result_and_resources(
             world_id,
             world_data,
             character_description,
@@ -29,9 +39,38 @@ class MyTestCase(IsolatedAsyncioTestCase):
 
 
         logger.info(response)
+        logger.info(new_money)
 
         self.assertEqual(True, True)  # add assertion here
 
+    async def test_unparsed_world_changes_abort_turn(self):
+        world_state = WorldState(world_id=1, in_game_year=1600, description="Франция 16й век", money=1000)
+
+        with mock.patch("user_interaction.generate_world_changes", mock.AsyncMock(return_value="не json")), \
+                mock.patch("user_interaction.apply_initiative_changes", mock.AsyncMock()) as apply:
+            with self.assertRaises(ResponseParseError):
+                await generate_initiative_result_and_resources(
+                    1, "Франция 16й век", "Король Артур", 1601, "Поднять налоги", world_state
+                )
+
+        apply.assert_not_awaited()  # Ни казна, ни мир не изменились
+
+    async def test_legacy_metrics_feed_gpt_changes_into_simulator(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            train_model(model_dir)
+            simulator = MetricsSimulator(model_dir)
+            self.assertTrue(simulator.load())
+
+        # Разрешение хода пришло без метрик (раздельный режим): влияние инициативы спрашиваем у GPT
+        gpt_response = json.dumps({"economy_metric": "+", "security_metric": -2})
+        with mock.patch("user_interaction.metrics_simulator", simulator), \
+                mock.patch("user_interaction.update_world_metrics", mock.AsyncMock(return_value=gpt_response)) as update:
+            result = await next_year_metrics(1, METRICS, None, "Франция 16й век", "Поднять налоги на 10 пунктов")
+
+        update.assert_awaited_once()
+        self.assertEqual(result["economy_metric"], METRICS["economy_metric"] + 1)
+        self.assertEqual(result["security_metric"], METRICS["security_metric"] - 2)
+
 
 if __name__ == '__main__':
     unittest.main()
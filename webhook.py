@@ -0,0 +1,154 @@
+# webhook.py - запуск бота в режиме webhook
+#
+# В продакшене Telegram присылает обновления POST-запросами на WEBHOOK_URL, а не бот забирает их
+# long-polling'ом: меньше задержка и нет постоянного опроса.
+# Экземпляр бота на базу - только один: очереди игроков, подготовка миров, кеш историй и состояние
+# диалогов живут в памяти процесса, поэтому горизонтально бот не масштабируется. Второй экземпляр
+# не запустится, пока работает первый (см. database/instance_lock.py); при выкатке новый ждёт,
+# пока старый остановится, а обновления за это время Telegram доставит повторно.
+# Сервер на aiohttp:
+#  - POST WEBHOOK_PATH - обновления от Telegram, с проверкой заголовка X-Telegram-Bot-Api-Secret-Token,
+#  - GET /healthz - проверка живости (503, пока экземпляр останавливается),
+#  - GET /metrics - метрики в формате Prometheus (см. usage_reporting.py).
+# По SIGTERM экземпляр перестаёт принимать обновления, дорабатывает начатые и дожидается
+# запросов к GPT, которые ещё идут, и только потом останавливается.
+
+import asyncio
+import hmac
+import logging
+import os
+import signal
+import time
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from game_world import client
+from usage_reporting import render_metrics
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Публичный адрес бота, на который Telegram будет слать обновления (например, https://bot.example.com)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# Путь для обновлений от Telegram
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Секрет, который Telegram присылает в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Адрес и порт HTTP-сервера
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+# Сколько секунд при остановке ждём запросы к GPT, которые ещё идут
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 60))
+
+
+class WebhookServer:
+    def __init__(self, application: Application, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.application = application
+        self.path = path
+        self.secret = secret
+        self.draining = False  # Экземпляр останавливается и новые обновления не принимает
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        return app
+
+    # Обновление от Telegram: проверяем секрет и ставим в очередь приложения
+    async def handle_update(self, request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if self.secret and not hmac.compare_digest(token, self.secret):
+            logger.warning("Запрос на webhook с неверным секретом.")
+            return web.Response(status=403)
+
+        # Telegram повторит доставку позже, её примет следующий экземпляр
+        if self.draining:
+            return web.Response(status=503)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            logger.error(f"Не удалось разобрать обновление от Telegram: {e}")
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request):
+        if self.draining or not self.application.running:
+            return web.Response(status=503, text="stopping")
+
+        return web.Response(text="ok")
+
+    async def handle_metrics(self, request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+
+# Ждём, пока закончатся запросы к GPT, но не дольше timeout
+async def drain_gpt_calls(timeout=SHUTDOWN_DRAIN_TIMEOUT):
+    deadline = time.monotonic() + timeout
+
+    while client.in_flight and time.monotonic() < deadline:
+        logger.info(f"Остановка: ждём запросы к GPT ({client.in_flight})...")
+        await asyncio.sleep(0.5)
+
+    if client.in_flight:
+        logger.warning(f"Остановка: {client.in_flight} запросов к GPT не успели завершиться.")
+
+
+async def run_webhook(application: Application):
+    """
+    Запускает бота в режиме webhook и работает до SIGTERM/SIGINT.
+
+    Порядок как у run_polling: initialize -> post_init -> start ... stop -> shutdown -> post_shutdown.
+    """
+    if not WEBHOOK_URL:
+        raise RuntimeError("Для режима webhook нужна переменная окружения WEBHOOK_URL.")
+    if not WEBHOOK_SECRET:
+        # Без секрета обновление от имени любого игрока может прислать кто угодно, кто знает адрес
+        raise RuntimeError("Для режима webhook нужна переменная окружения WEBHOOK_SECRET.")
+
+    server = WebhookServer(application)
+    runner = web.AppRunner(server.make_app())
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        await application.start()
+
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+        logger.info(f"Webhook слушает {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}.")
+
+        await stop_event.wait()
+
+        # Перестаём принимать обновления, дорабатываем очередь и ждём запросы к GPT.
+        # Вебхук в Telegram не снимаем - недоставленные обновления Telegram повторит следующему экземпляру
+        logger.info("Остановка: новые обновления не принимаются.")
+        server.draining = True
+        await application.stop()
+        await drain_gpt_calls()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+
+        if application.post_shutdown:
+            await application.post_shutdown(application)
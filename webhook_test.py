@@ -0,0 +1,56 @@
+import asyncio
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from aiohttp.test_utils import TestClient, TestServer
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # game_world создаёт клиента GPT при импорте
+
+from webhook import WebhookServer, run_webhook
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"}, "text": "привет"}}
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.application = SimpleNamespace(bot=None, running=True, update_queue=asyncio.Queue())
+        self.server = WebhookServer(self.application, path="/telegram", secret="s3cret")
+        self.client = TestClient(TestServer(self.server.make_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_update_with_valid_secret_is_queued(self):
+        response = await self.client.post("/telegram", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+
+        self.assertEqual(response.status, 200)
+        update = self.application.update_queue.get_nowait()
+        self.assertEqual(update.message.text, "привет")
+
+    async def test_wrong_secret_is_rejected(self):
+        response = await self.client.post("/telegram", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "guess"})
+
+        self.assertEqual(response.status, 403)
+        self.assertTrue(self.application.update_queue.empty())
+
+    async def test_draining_instance_refuses_updates_and_fails_health_check(self):
+        self.assertEqual((await self.client.get("/healthz")).status, 200)
+
+        self.server.draining = True
+        response = await self.client.post("/telegram", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+
+        self.assertEqual(response.status, 503)
+        self.assertEqual((await self.client.get("/healthz")).status, 503)
+
+    @mock.patch("webhook.WEBHOOK_SECRET", None)
+    @mock.patch("webhook.WEBHOOK_URL", "https://bot.example.com")
+    async def test_webhook_without_secret_does_not_start(self):
+        with self.assertRaises(RuntimeError):
+            await run_webhook(self.application)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# world_events.py - журнал ходов мира (event sourcing)
+#
+# Раньше мир жил только последним описанием в worlds.world_description: каждый ход его перезаписывал,
+# и узнать, каким мир был пять лет назад, можно было только заново спросив GPT.
+# Теперь каждый ход - неизменяемое событие в world_statistics, а раз в SNAPSHOT_EVERY_EVENTS событий
+# сохраняется снимок состояния (world_snapshots). Состояние мира на любой год собирается
+# из ближайшего снимка и нескольких событий после него (rebuild_world_state) - для отката хода,
+# повтора партии и аналитики без запросов к GPT.
+#
+# Событие хранит значения мира после хода, а не приращения: свёртка - просто наложение событий по порядку.
+# Журнал начинается с события создания мира (EVENT_GENESIS), поэтому состояние собирается и без снимков.
+
+import logging
+import os
+
+from database import save_world_event, save_world_snapshot, load_world_events, load_world_state
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Раз в сколько событий сохраняем снимок мира (за ход пишется два события: ход и метрики)
+SNAPSHOT_EVERY_EVENTS = int(os.getenv("WORLD_SNAPSHOT_EVERY_EVENTS", 20))
+
+# Типы событий
+EVENT_GENESIS = "genesis"  # Мир создан: стартовые описание, деньги, коэффициент роста и метрики
+EVENT_TURN = "turn"        # Инициатива применена: описание мира, деньги и коэффициент роста после хода
+EVENT_METRICS = "metrics"  # Метрики мира после хода
+
+
+# Событие создания мира: всё стартовое состояние
+def genesis_payload(description, money, money_multiplier, metrics):
+    return {
+        "description": description,
+        "money": str(money),
+        "money_multiplier": str(money_multiplier),
+        "metrics": dict(metrics or {}),
+    }
+
+
+# Событие хода: новое описание мира и казна после списания затрат
+def turn_payload(description, money, money_multiplier, cost=None, multiplier_delta=None):
+    # Деньги храним строкой, чтобы Decimal из базы не терял точность в JSON
+    return {
+        "description": description,
+        "money": str(money),
+        "money_multiplier": str(money_multiplier),
+        "cost": None if cost is None else str(cost),
+        "multiplier_delta": None if multiplier_delta is None else str(multiplier_delta),
+    }
+
+
+# Событие метрик: метрики мира после хода
+def metrics_payload(metrics):
+    return {"metrics": dict(metrics)}
+
+
+def apply_event(state, event):
+    """
+    Накладывает одно событие на состояние мира. Исходное состояние не изменяется.
+
+    :param state: Состояние мира: {"year", "description", "money", "money_multiplier", "metrics"}
+    :param event: Событие: {"type", "year", "payload"}
+    :return: Новое состояние мира
+    """
+    new_state = dict(state)
+    payload = event.get("payload") or {}
+
+    if event["type"] == EVENT_GENESIS:
+        new_state = {key: payload.get(key) for key in ("description", "money", "money_multiplier")}
+        new_state["metrics"] = dict(payload.get("metrics") or {})
+    elif event["type"] == EVENT_TURN:
+        for key in ("description", "money", "money_multiplier"):
+            if payload.get(key) is not None:
+                new_state[key] = payload[key]
+    elif event["type"] == EVENT_METRICS:
+        new_state["metrics"] = dict(payload.get("metrics") or {})
+    else:
+        logger.warning(f"Неизвестный тип события {event['type']}, пропускаем.")
+        return new_state
+
+    if event.get("year") is not None:
+        new_state["year"] = event["year"]
+
+    return new_state
+
+
+# Состояние мира из снимка и событий после него
+def rebuild_state(snapshot_state, events):
+    state = dict(snapshot_state or {})
+    for event in events:
+        state = apply_event(state, event)
+    return state
+
+
+def record_world_event(connection, world_id, user_id, year, event_type, payload, initiative_description=None, gpt_response=None):
+    """
+    Записывает событие в журнал мира и, если с прошлого снимка накопилось SNAPSHOT_EVERY_EVENTS событий,
+    сохраняет новый снимок. Вызывается внутри run_in_transaction, вместе с изменениями, которые событие описывает.
+
+    :return: change_id записанного события
+    """
+    change_id = save_world_event(
+        connection, world_id, user_id, year, event_type, payload, initiative_description, gpt_response
+    )
+
+    snapshot, events = load_world_events(connection, world_id)
+    if len(events) >= SNAPSHOT_EVERY_EVENTS:
+        state = rebuild_state(snapshot["state"] if snapshot else None, events)
+        save_world_snapshot(connection, world_id, events[-1]["change_id"], events[-1]["year"], state)
+
+    return change_id
+
+
+def record_world_genesis(connection, world_id, year):
+    """
+    Записывает событие создания мира: стартовое состояние, как оно лежит в базе после подготовки мира.
+    Вызывается внутри run_in_transaction, когда стартовые метрики и ресурсы уже сохранены.
+
+    :return: change_id записанного события или None, если мира нет
+    """
+    world_state = load_world_state(connection, world_id)
+    if world_state is None:
+        return None
+
+    payload = genesis_payload(world_state.description, world_state.money, world_state.money_multiplier, world_state.metrics)
+    return record_world_event(connection, world_id, None, year, EVENT_GENESIS, payload)
+
+
+def rebuild_world_state(connection, world_id, year=None):
+    """
+    Собирает состояние мира на конец года year из ближайшего снимка и событий после него.
+
+    :param connection: Соединение с базой данных
+    :param world_id: ID мира
+    :param year: Игровой год. None - последнее состояние
+    :return: Состояние мира или None, если до этого года событий не было
+    """
+    snapshot, events = load_world_events(connection, world_id, year)
+    if snapshot is None and not events:
+        return None
+
+    return rebuild_state(snapshot["state"] if snapshot else None, events)
@@ -0,0 +1,61 @@
+import unittest
+
+from world_events import (
+    apply_event, rebuild_state, genesis_payload, turn_payload, metrics_payload, EVENT_GENESIS, EVENT_TURN, EVENT_METRICS
+)
+
+
+def turn(year, description, money, multiplier):
+    return {"type": EVENT_TURN, "year": year, "payload": turn_payload(description, money, multiplier)}
+
+
+def metrics(year, values):
+    return {"type": EVENT_METRICS, "year": year, "payload": metrics_payload(values)}
+
+
+class MyTestCase(unittest.TestCase):
+    def test_apply_event_does_not_change_state(self):
+        state = {"year": 1000, "description": "старый мир", "money": "100", "metrics": {"economy_metric": 5}}
+
+        new_state = apply_event(state, turn(1001, "новый мир", 90, 1.1))
+
+        self.assertEqual(state["description"], "старый мир")
+        self.assertEqual(new_state["description"], "новый мир")
+        self.assertEqual(new_state["money"], "90")
+        self.assertEqual(new_state["year"], 1001)
+        self.assertEqual(new_state["metrics"], {"economy_metric": 5})  # Ход метрики не трогает
+
+    def test_rebuild_from_snapshot_matches_full_replay(self):
+        events = [
+            turn(1001, "мир 1", 90, 1.1), metrics(1001, {"economy_metric": 6}),
+            turn(1002, "мир 2", 80, 1.2), metrics(1002, {"economy_metric": 4}),
+            turn(1003, "мир 3", 70, 1.3),
+        ]
+
+        full = rebuild_state(None, events)
+        snapshot = rebuild_state(None, events[:3])
+
+        self.assertEqual(rebuild_state(snapshot, events[3:]), full)
+        self.assertEqual(full["description"], "мир 3")
+        self.assertEqual(full["metrics"], {"economy_metric": 4})
+        self.assertEqual(full["year"], 1003)
+
+    def test_replay_starts_from_genesis(self):
+        genesis = {"type": EVENT_GENESIS, "year": 1000,
+                   "payload": genesis_payload("новый мир", 100, 1.5, {"economy_metric": 5})}
+
+        state = rebuild_state(None, [genesis, turn(1001, "мир 1", 90, 1.1), metrics(1001, {"economy_metric": 6})])
+        self.assertEqual(state, {"year": 1001, "description": "мир 1", "money": "90", "money_multiplier": "1.1",
+                                 "metrics": {"economy_metric": 6}})
+
+        # Состояние на год создания - стартовое, без снимков
+        self.assertEqual(rebuild_state(None, [genesis])["money_multiplier"], "1.5")
+
+    def test_unknown_event_is_skipped(self):
+        state = {"year": 1000, "description": "мир"}
+
+        self.assertEqual(apply_event(state, {"type": "undo", "year": 1001, "payload": {}}), state)
+
+
+if __name__ == '__main__':
+    unittest.main()
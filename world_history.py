@@ -0,0 +1,152 @@
+# world_history.py - модуль для работы с историей мира, которая уходит в промпты GPT
+#
+# Раньше каждый ход дописывался в context.user_data['world_data'] целиком, и промпты росли вместе с игрой.
+# Теперь последние KEEP_TURNS ходов хранятся дословно, а всё, что старше, в фоне сворачивается
+# в краткую сводку через GPT. Размер промпта не зависит от того, сколько лет прошло.
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from database import run_db, save_world_history, get_world_history
+from game_world import summarize_world_history
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько последних ходов передаём в промпт дословно
+KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", 3))
+# Максимальная длина сводки в символах
+SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", 1500))
+# Сколько историй миров держим в памяти
+CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", 1000))
+# Если сжатие раз за разом не удаётся, в промпт идут только столько последних ходов. Остальные не теряются:
+# они хранятся и сворачиваются в сводку, когда GPT снова доступен, не больше стольких за раз
+MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", 10))
+
+
+# История одного мира: стартовое описание, сводка старых ходов и последние ходы дословно
+class WorldHistory:
+    def __init__(self, world_id, base_description, summary="", recent_turns=None, summarized_turns=0):
+        self.world_id = world_id
+        self.base_description = base_description
+        self.summary = summary
+        self.recent_turns = list(recent_turns or [])
+        self.summarized_turns = summarized_turns
+
+    # Записываем ход игрока
+    def add_turn(self, year, initiative, changes):
+        self.recent_turns.append({"year": year, "initiative": initiative, "changes": changes})
+
+        if len(self.recent_turns) > MAX_TURNS:
+            logger.warning(f"История мира {self.world_id} не сжата вовремя: несвёрнутых ходов {len(self.recent_turns)}, "
+                           f"в промпт идут последние {MAX_TURNS}.")
+
+    # Ходы, которые пора свернуть в сводку: самые старые, но не больше MAX_TURNS за раз
+    def turns_to_fold(self):
+        if len(self.recent_turns) <= KEEP_TURNS:
+            return []
+        return self.recent_turns[:min(len(self.recent_turns) - KEEP_TURNS, MAX_TURNS)]
+
+    # Заменяем сводку и убираем свёрнутые в неё ходы
+    def fold(self, new_summary, folded_count):
+        self.summary = new_summary[:SUMMARY_MAX_CHARS]
+        self.recent_turns = self.recent_turns[folded_count:]
+        self.summarized_turns += folded_count
+
+    # Текст истории для промптов
+    def render(self):
+        parts = [self.base_description or ""]
+
+        if self.summary:
+            parts.append(f"Краткая история мира:\n{self.summary}")
+
+        # Страховка от бесконечного роста промпта, если сжатие не проходит: дословно не больше MAX_TURNS ходов
+        for turn in self.recent_turns[-MAX_TURNS:]:
+            parts.append(f" Год: {turn['year']}\n Инициатива игрока: {turn['initiative']}\n Изменения: {turn['changes']}")
+
+        return "\n\n".join(parts)
+
+
+# Держит истории миров в памяти, подгружает их из БД и в фоне сворачивает старые ходы
+class HistoryManager:
+    def __init__(self):
+        self._histories = OrderedDict()
+        self._compactions = {}
+
+    def _remember(self, history):
+        self._histories[history.world_id] = history
+        self._histories.move_to_end(history.world_id)
+
+        # Самые давно не использованные истории вытесняем, в БД они уже сохранены
+        while len(self._histories) > CACHE_SIZE:
+            self._histories.popitem(last=False)
+
+    # Новая история для только что созданного мира
+    async def create(self, world_id, base_description):
+        history = WorldHistory(world_id, base_description)
+        self._remember(history)
+        await self.save(history)
+        return history
+
+    # История мира: из памяти, из БД или, если её ещё нет, из переданного описания
+    async def get(self, world_id, base_description=None):
+        history = self._histories.get(world_id)
+        if history is not None:
+            self._histories.move_to_end(world_id)
+            return history
+
+        stored = await run_db(get_world_history, world_id)
+        if stored:
+            history = WorldHistory(world_id, **stored)
+        else:
+            history = WorldHistory(world_id, base_description)
+
+        self._remember(history)
+        return history
+
+    async def save(self, history):
+        return await run_db(
+            save_world_history,
+            history.world_id,
+            history.base_description,
+            history.summary,
+            history.recent_turns,
+            history.summarized_turns
+        )
+
+    # Записываем ход и, если ходов накопилось больше KEEP_TURNS, сворачиваем старые в фоне
+    async def add_turn(self, history, year, initiative, changes):
+        history.add_turn(year, initiative, changes)
+        await self.save(history)
+
+        if history.turns_to_fold() and history.world_id not in self._compactions:
+            task = asyncio.create_task(self._compact(history))
+            self._compactions[history.world_id] = task
+            task.add_done_callback(lambda _: self._compactions.pop(history.world_id, None))
+
+    async def _compact(self, history):
+        turns = history.turns_to_fold()
+        if not turns:
+            return
+
+        new_summary = await summarize_world_history(history.summary, turns, SUMMARY_MAX_CHARS)
+        if not new_summary:
+            logger.warning(f"Не удалось сжать историю мира {history.world_id}, попробуем на следующем ходу.")
+            return
+
+        # Пока GPT думал, в конец могли добавиться новые ходы - убираем только те, что свернули
+        history.fold(new_summary, len(turns))
+        await self.save(history)
+
+        logger.info(f"История мира {history.world_id} сжата: свёрнуто ходов {history.summarized_turns}.")
+
+    # Дождаться фонового сжатия (нужно при остановке бота)
+    async def wait_compactions(self):
+        if self._compactions:
+            await asyncio.gather(*self._compactions.values(), return_exceptions=True)
+
+
+history_manager = HistoryManager()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # game_world создаёт клиента GPT при импорте
+
+from world_history import HistoryManager, WorldHistory
+
+
+async def fake_run_db(func, *args, **kwargs):
+    return None
+
+
+def make_history(turns):
+    history = WorldHistory(1, "Франция 16й век")
+    for year in range(1601, 1601 + turns):
+        history.add_turn(year, f"инициатива {year}", f"изменения {year}")
+    return history
+
+
+@mock.patch("world_history.KEEP_TURNS", 3)
+@mock.patch("world_history.MAX_TURNS", 5)
+@mock.patch("world_history.run_db", fake_run_db)
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_keeps_last_turns_verbatim(self):
+        history = make_history(3)
+        self.assertEqual(history.turns_to_fold(), [])
+
+        history.add_turn(1604, "инициатива 1604", "изменения 1604")
+        self.assertEqual([turn["year"] for turn in history.turns_to_fold()], [1601])
+
+    def test_fold_replaces_summary_and_keeps_newer_turns(self):
+        history = make_history(5)
+
+        with mock.patch("world_history.SUMMARY_MAX_CHARS", 10):
+            history.fold("сводка первых двух лет", 2)
+
+        self.assertEqual(history.summary, "сводка пер")
+        self.assertEqual([turn["year"] for turn in history.recent_turns], [1603, 1604, 1605])
+        self.assertEqual(history.summarized_turns, 2)
+        self.assertIn("Краткая история мира:\nсводка пер", history.render())
+
+    def test_failed_compaction_keeps_turns_but_caps_prompt(self):
+        history = make_history(8)
+
+        # Ни один ход не потерян, но в промпт идут только последние MAX_TURNS
+        self.assertEqual(len(history.recent_turns), 8)
+        self.assertEqual(history.summarized_turns, 0)
+        self.assertNotIn("1603", history.render())
+        self.assertIn("1604", history.render())
+
+        # Когда GPT снова отвечает, сворачиваются самые старые ходы, не больше MAX_TURNS за раз
+        self.assertEqual([turn["year"] for turn in history.turns_to_fold()], [1601, 1602, 1603, 1604, 1605])
+
+    async def test_background_compaction_folds_only_summarized_turns(self):
+        manager = HistoryManager()
+        history = make_history(3)
+        release = asyncio.Event()
+
+        async def summarize(summary, turns, max_chars):
+            self.assertEqual([turn["year"] for turn in turns], [1601])
+            await release.wait()
+            return "сводка"
+
+        with mock.patch("world_history.summarize_world_history", summarize):
+            await manager.add_turn(history, 1604, "инициатива 1604", "изменения 1604")
+            self.assertIn(1, manager._compactions)  # Сжатие идёт в фоне, ход не ждёт GPT
+            await asyncio.sleep(0)  # Сжатие взяло ходы и ждёт GPT
+
+            # Ход, пришедший во время сжатия, не попадает в свёрнутые
+            await manager.add_turn(history, 1605, "инициатива 1605", "изменения 1605")
+            release.set()
+            await manager.wait_compactions()
+
+        self.assertEqual(history.summary, "сводка")
+        self.assertEqual([turn["year"] for turn in history.recent_turns], [1602, 1603, 1604, 1605])
+        self.assertEqual(manager._compactions, {})
+
+    async def test_failed_summary_keeps_history(self):
+        manager = HistoryManager()
+        history = make_history(3)
+
+        with mock.patch("world_history.summarize_world_history", mock.AsyncMock(return_value=None)):
+            await manager.add_turn(history, 1604, "инициатива 1604", "изменения 1604")
+            await manager.wait_compactions()
+
+        self.assertEqual(history.summary, "")
+        self.assertEqual(len(history.recent_turns), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
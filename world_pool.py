@@ -0,0 +1,188 @@
+# world_pool.py - модуль пула заранее сгенерированных миров
+#
+# Генерация мира - это несколько запросов к GPT (описание, метрики, ресурсы, новости), и новый игрок
+# ждал их все после нажатия "Начать историю". Теперь в таблице worlds заранее лежат полностью готовые
+# миры (pool_status = 'ready'), разложенные по эпохам, и start_game просто забирает один из них
+# одним запросом к БД. Пул пополняется в фоне: когда игроков нет - спокойно, по одному миру
+# с паузами, а когда пул почти пуст - и под нагрузкой, но всё равно не чаще заданного интервала.
+# При запуске и затем раз в WORLD_POOL_CLEANUP_INTERVAL пул удаляет миры, подготовка которых
+# оборвалась (см. WORLD_POOL_STALE_AFTER): бот могли остановить или GPT мог отказать посреди подготовки.
+
+import asyncio
+import logging
+import os
+import random
+import time
+
+from database import run_db
+from database.worlds import World
+from client import GptError
+from game_world import generate_world_from_gpt
+from world_setup import setup_world
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько готовых миров держим в пуле (0 - пул выключен, миры генерируются при нажатии кнопки)
+WORLD_POOL_SIZE = int(os.getenv("WORLD_POOL_SIZE", 10))
+# Если готовых миров в эпохе меньше стольких, пополняем её даже при активных игроках
+WORLD_POOL_LOW_WATERMARK = int(os.getenv("WORLD_POOL_LOW_WATERMARK", 1))
+# Сколько секунд без активности игроков считаем затишьем
+WORLD_POOL_IDLE_SECONDS = float(os.getenv("WORLD_POOL_IDLE_SECONDS", 60))
+# Минимальная пауза между генерациями миров, секунды
+WORLD_POOL_GENERATION_INTERVAL = float(os.getenv("WORLD_POOL_GENERATION_INTERVAL", 30))
+# Как часто проверяем, не пора ли пополнить пул, секунды
+WORLD_POOL_CHECK_INTERVAL = float(os.getenv("WORLD_POOL_CHECK_INTERVAL", 10))
+# Мир, который готовится дольше стольких секунд, считаем брошенным (бот остановили посреди подготовки)
+WORLD_POOL_STALE_AFTER = float(os.getenv("WORLD_POOL_STALE_AFTER", 3600))
+# Как часто ищем брошенные миры, секунды
+WORLD_POOL_CLEANUP_INTERVAL = float(os.getenv("WORLD_POOL_CLEANUP_INTERVAL", 600))
+
+# Эпохи, по которым раскладываем миры: диапазоны лет, как у random.randint(-2000, 2025) в start_game
+WORLD_POOL_ERAS = (
+    (-2000, -1001),
+    (-1000, -1),
+    (0, 999),
+    (1000, 1699),
+    (1700, 2025),
+)
+
+
+# Держит пул готовых миров и пополняет его в фоне
+class WorldPool:
+    def __init__(self, size=WORLD_POOL_SIZE, eras=WORLD_POOL_ERAS):
+        self.size = size
+        self.eras = eras
+        self.world_storage = World()
+        self._task = None
+        self._last_activity = 0.0
+        self._last_generation = 0.0
+        self._last_cleanup = None
+
+    # Сколько миров держим в каждой эпохе
+    @property
+    def target_per_era(self):
+        return -(-self.size // len(self.eras))
+
+    # Отмечаем активность игроков: пока они играют, пул пополняется только при нехватке
+    def note_activity(self):
+        self._last_activity = time.monotonic()
+
+    def is_idle(self):
+        return time.monotonic() - self._last_activity >= WORLD_POOL_IDLE_SECONDS
+
+    async def claim(self):
+        """
+        Забирает готовый мир из пула: из случайной эпохи, а если она пуста - из любой.
+
+        :return: (world_id, in_game_year, world_description) или None, если пул пуст или выключен
+        """
+        if self.size <= 0:
+            return None
+
+        self.note_activity()
+
+        min_year, max_year = random.choice(self.eras)
+        try:
+            world = await run_db(self.world_storage.claim_from_pool, min_year, max_year)
+            if world is None:
+                world = await run_db(self.world_storage.claim_from_pool)
+        except Exception as e:
+            logger.error(f"Ошибка при выдаче мира из пула: {e}")
+            return None
+
+        if world:
+            logger.info(f"Мир с ID {world[0]} выдан из пула.")
+
+        return world
+
+    # Генерируем один мир для пула в заданной эпохе
+    async def generate_world(self, min_year, max_year):
+        game_year = random.randint(min_year, max_year)
+        try:
+            world_data = await generate_world_from_gpt(game_year)
+        except GptError as e:
+            logger.warning(f"Не удалось сгенерировать мир для пула ({game_year} год): {e}")
+            return None
+
+        world_id = await run_db(self.world_storage.save, game_year, world_data, "generating")
+        if not world_id:
+            return None
+
+        try:
+            await setup_world(world_id, game_year, world_data)
+        except Exception as e:
+            logger.error(f"Ошибка при подготовке мира {world_id} для пула: {e}")
+            await run_db(self.world_storage.set_pool_status, world_id, "failed")
+            return None
+
+        await run_db(self.world_storage.set_pool_status, world_id, "ready")
+        logger.info(f"Мир с ID {world_id} ({game_year} год) добавлен в пул.")
+
+        return world_id
+
+    # Пополняем пул на один мир, если пора; возвращает True, если мир был сгенерирован
+    async def refill_once(self):
+        if time.monotonic() - self._last_generation < WORLD_POOL_GENERATION_INTERVAL:
+            return False
+
+        counts = await run_db(self.world_storage.count_pool, self.eras)
+
+        # Эпоха, в которой готовых миров меньше всего
+        count, era = min(zip(counts, self.eras))
+        if count >= self.target_per_era:
+            return False
+
+        # Под нагрузкой не отнимаем у игроков запросы к GPT, пока пул не почти пуст
+        if not self.is_idle() and count >= WORLD_POOL_LOW_WATERMARK:
+            return False
+
+        self._last_generation = time.monotonic()
+        await self.generate_world(*era)
+        return True
+
+    # Убираем миры, подготовка которых оборвалась при прошлых запусках или уже в этом
+    async def delete_stale(self):
+        self._last_cleanup = time.monotonic()
+        try:
+            return await run_db(self.world_storage.delete_stale_pool_worlds, WORLD_POOL_STALE_AFTER)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении брошенных миров пула: {e}")
+            return 0
+
+    # Чистим брошенные миры сразу при запуске, а затем не чаще WORLD_POOL_CLEANUP_INTERVAL
+    async def cleanup_once(self):
+        if self._last_cleanup is not None and time.monotonic() - self._last_cleanup < WORLD_POOL_CLEANUP_INTERVAL:
+            return 0
+
+        return await self.delete_stale()
+
+    async def _run(self):
+        logger.info(f"Пул миров запущен: {self.size} миров, эпох {len(self.eras)}.")
+
+        while True:
+            try:
+                await self.cleanup_once()
+                await self.refill_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при пополнении пула миров: {e}")
+
+            await asyncio.sleep(WORLD_POOL_CHECK_INTERVAL)
+
+    # Запуск фонового пополнения (из post_init приложения)
+    def start(self):
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Остановка фонового пополнения (из post_shutdown приложения)
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+world_pool = WorldPool()
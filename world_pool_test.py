@@ -0,0 +1,41 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # game_world создаёт клиента GPT при импорте
+
+from world_pool import WorldPool
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_stale_worlds_are_deleted_periodically(self):
+        pool = WorldPool(size=5)
+        calls = []
+
+        async def fake_run_db(func, *args, **kwargs):
+            calls.append(func)
+            return 0
+
+        with mock.patch("world_pool.run_db", fake_run_db), \
+                mock.patch("world_pool.WORLD_POOL_CLEANUP_INTERVAL", 600), \
+                mock.patch("world_pool.time.monotonic") as monotonic:
+            monotonic.return_value = 1000.0
+            await pool.cleanup_once()  # При запуске - сразу
+            monotonic.return_value = 1300.0
+            await pool.cleanup_once()  # Интервал не прошёл
+            monotonic.return_value = 1600.0
+            await pool.cleanup_once()
+
+        self.assertEqual(calls, [pool.world_storage.delete_stale_pool_worlds] * 2)
+
+    async def test_cleanup_error_does_not_stop_pool(self):
+        pool = WorldPool(size=5)
+
+        with mock.patch("world_pool.run_db", mock.AsyncMock(side_effect=RuntimeError("база недоступна"))):
+            self.assertEqual(await pool.cleanup_once(), 0)
+
+        self.assertIsNotNone(pool._last_cleanup)  # Следующая попытка - через интервал, а не на каждой проверке
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+# world_setup.py - модуль фоновой подготовки только что созданного мира
+#
+# После генерации описания мира нужны ещё стартовые метрики, ресурсы и первый дайджест новостей.
+# Раньше start_game ждал их по очереди, и всё это время игрок ничего не мог сделать.
+# Теперь подготовка идёт в фоновой задаче, пока игрок придумывает персонажа:
+# сначала метрики (от них зависят остальные шаги), затем ресурсы и новости параллельно.
+# Обработчики, которым нужен результат, дожидаются его через world_setup_manager.wait().
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import psycopg2
+
+from database import (
+    run_db, run_in_transaction, load_world_state, DbExecutorBusyError, DbCallTimeoutError,
+    save_world_metrics_to_db, save_world_resources_to_db, save_world_news_to_db, get_latest_world_news
+)
+from database.connection import PoolTimeoutError
+from game_world import generate_world_metrics, generate_world_resources, generate_world_news
+from client import GptError
+from gpt_responses import WorldMetrics, WorldResources, ResponseParseError, parse_response
+from world_events import record_world_genesis
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько завершённых подготовок держим в памяти, пока их не забрал обработчик
+SETUP_CACHE_SIZE = int(os.getenv("WORLD_SETUP_CACHE_SIZE", 1000))
+
+
+# Ошибки БД при подготовке мира: для игрока это такая же неудачная подготовка, как и ошибка GPT
+DB_ERRORS = (psycopg2.Error, PoolTimeoutError, DbExecutorBusyError, DbCallTimeoutError)
+
+
+class WorldSetupError(Exception):
+    """Не удалось подготовить стартовые метрики или ресурсы мира."""
+
+
+# Всё, что нужно игре после генерации описания мира
+@dataclass
+class WorldSetup:
+    world_id: int
+    metrics: Dict[str, int]
+    resources: Dict[str, int]
+    news: Optional[str] = None
+
+
+async def setup_world(world_id, game_year, world_data):
+    """
+    Генерирует и сохраняет стартовые метрики, ресурсы и первые новости мира.
+
+    :param world_id: ID мира
+    :param game_year: Внутриигровой год
+    :param world_data: Описание мира
+    :return: WorldSetup
+    :raises WorldSetupError: Если метрики или ресурсы не удалось получить или сохранить
+    """
+    try:
+        return await _setup_world(world_id, game_year, world_data)
+    except DB_ERRORS as e:
+        raise WorldSetupError("Не удалось сохранить мир в базе данных.") from e
+
+
+async def _setup_world(world_id, game_year, world_data):
+    # Генерация метрик для мира
+    logger.info(f"Подготовка мира {world_id}: генерация метрик...")
+    try:
+        gpt_response = await generate_world_metrics(world_data)
+        metrics_dict = parse_response(gpt_response, WorldMetrics).model_dump()
+    except (GptError, ResponseParseError) as e:
+        raise WorldSetupError("Ошибка при генерации метрик для мира.") from e
+
+    await run_db(save_world_metrics_to_db, world_id, metrics_dict)
+    logger.info(f"Метрики мира с ID мира {world_id} успешно записаны в базу данных.")
+
+    # Ресурсы и новости зависят только от метрик - генерируем их одновременно
+    logger.info(f"Подготовка мира {world_id}: генерация ресурсов и новостей...")
+    resources_response, world_news = await asyncio.gather(
+        generate_world_resources(metrics_dict, world_data),
+        generate_world_news(game_year, world_data, metrics_dict),
+        return_exceptions=True
+    )
+
+    try:
+        if isinstance(resources_response, BaseException):
+            raise resources_response
+        resources_dict = parse_response(resources_response, WorldResources).model_dump(by_alias=True)
+    except (GptError, ResponseParseError) as e:
+        raise WorldSetupError("Ошибка при генерации ресурсов для мира.") from e
+
+    await run_db(save_world_resources_to_db, world_id, resources_dict)
+    logger.info(f"Ресурсы мира с ID мира {world_id} успешно записаны в базу данных.")
+
+    # Стартовое состояние - первое событие журнала мира (см. world_events.py)
+    try:
+        await run_db(run_in_transaction, record_world_genesis, world_id, game_year)
+    except Exception as e:
+        logger.error(f"Ошибка при записи создания мира {world_id} в журнал: {e}")
+
+    # Без новостей мир всё равно готов - их сгенерируют, когда игрок до них дойдёт
+    if isinstance(world_news, BaseException):
+        logger.warning(f"Не удалось подготовить новости мира {world_id}: {world_news}")
+        world_news = None
+    elif world_news:
+        await run_db(save_world_news_to_db, world_id, world_news)
+
+    return WorldSetup(world_id, metrics_dict, resources_dict, world_news)
+
+
+# Подготовка мира по данным из БД (мир из пула или перезапуск бота, когда фоновая задача потеряна)
+async def load_world_setup(world_id):
+    world_state = await run_db(run_in_transaction, load_world_state, world_id)
+
+    if world_state is None or world_state.metrics is None or world_state.money is None:
+        return None
+
+    resources_dict = {"Деньги (монет)": int(world_state.money), "Население (людей)": world_state.people}
+    world_news = await run_db(get_latest_world_news, world_id)
+    return WorldSetup(world_id, world_state.metrics, resources_dict, world_news)
+
+
+# Держит фоновые подготовки миров, пока обработчики не заберут результат
+class WorldSetupManager:
+    def __init__(self):
+        self._tasks = OrderedDict()
+
+    # Запускаем подготовку мира в фоне
+    def start(self, world_id, game_year, world_data):
+        task = asyncio.create_task(setup_world(world_id, game_year, world_data))
+        task.add_done_callback(self._log_failure)
+        self._tasks[world_id] = task
+
+        # Вытесняем самые старые завершённые подготовки, которые так никто и не забрал
+        for stale_id in [key for key, stale in self._tasks.items() if stale.done()]:
+            if len(self._tasks) <= SETUP_CACHE_SIZE:
+                break
+            del self._tasks[stale_id]
+
+        return task
+
+    async def wait(self, world_id, game_year=None, world_data=None):
+        """
+        Дожидается подготовки мира.
+
+        Если фоновой задачи нет, берём подготовку из БД, а если и там пусто - запускаем заново.
+
+        :param world_id: ID мира
+        :param game_year: Внутриигровой год (нужен для повторного запуска)
+        :param world_data: Описание мира (нужно для повторного запуска)
+        :return: WorldSetup
+        :raises WorldSetupError: Если подготовка не удалась
+        """
+        task = self._tasks.get(world_id)
+
+        if task is None:
+            try:
+                setup = await load_world_setup(world_id)
+            except DB_ERRORS as e:
+                raise WorldSetupError("Не удалось загрузить мир из базы данных.") from e
+            if setup is not None:
+                return setup
+
+            logger.warning(f"Подготовка мира {world_id} не найдена, запускаем заново.")
+            task = self.start(world_id, game_year, world_data)
+
+        try:
+            # Отмена ждущего обработчика не отменяет саму подготовку: результат заберёт следующий
+            return await asyncio.shield(task)
+        finally:
+            # Результат забран, держать его больше незачем
+            if task.done() and self._tasks.get(world_id) is task:
+                del self._tasks[world_id]
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка при подготовке мира: {task.exception()}")
+
+    # Дождаться фоновых подготовок (нужно при остановке бота)
+    async def wait_all(self):
+        pending = [task for task in self._tasks.values() if not task.done()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+world_setup_manager = WorldSetupManager()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # game_world создаёт клиента GPT при импорте
+
+from database import DbExecutorBusyError
+from world_events import record_world_genesis
+from world_setup import WorldSetup, WorldSetupError, WorldSetupManager, setup_world
+
+METRICS = {
+    "economy_metric": 3,
+    "social_stability_metric": -2,
+    "ecology_metric": 0,
+    "security_metric": 7,
+    "political_support_metric": -10,
+}
+RESOURCES = {"Деньги (монет)": 1000, "Население (людей)": 50}
+
+
+class MyTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db_calls = []
+        self.started = []
+
+        async def fake_run_db(func, *args, **kwargs):
+            self.db_calls.append(args[0] if args and callable(args[0]) else func)
+
+        # Ресурсы и новости отвечают, только когда запрошены оба: так проверяем, что они идут одновременно
+        both_requested = asyncio.Event()
+
+        async def generate(name, result):
+            self.started.append(name)
+            if len(self.started) == 3:
+                both_requested.set()
+            if name != "metrics":
+                await asyncio.wait_for(both_requested.wait(), 1)
+            return result
+
+        self.patches = [
+            mock.patch("world_setup.run_db", fake_run_db),
+            mock.patch("world_setup.generate_world_metrics", lambda *a: generate("metrics", json.dumps(METRICS))),
+            mock.patch("world_setup.generate_world_resources", lambda *a: generate("resources", json.dumps(RESOURCES))),
+            mock.patch("world_setup.generate_world_news", lambda *a: generate("news", "НОВОСТИ")),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    async def test_setup_generates_resources_and_news_together_and_records_genesis(self):
+        setup = await setup_world(1, 1600, "Франция 16й век")
+
+        self.assertEqual(setup, WorldSetup(1, METRICS, RESOURCES, "НОВОСТИ"))
+        self.assertEqual(self.started[0], "metrics")  # Остальное зависит от метрик
+        self.assertIn(record_world_genesis, self.db_calls)
+
+    async def test_metrics_failure_stops_setup(self):
+        with mock.patch("world_setup.generate_world_metrics", mock.AsyncMock(return_value="не json")):
+            with self.assertRaises(WorldSetupError):
+                await setup_world(1, 1600, "Франция 16й век")
+
+        self.assertEqual(self.started, [])  # Ресурсы и новости не запрашивались
+
+    async def test_db_errors_become_setup_error(self):
+        with mock.patch("world_setup.run_db", mock.AsyncMock(side_effect=DbExecutorBusyError("очередь полна"))):
+            with self.assertRaises(WorldSetupError):
+                await setup_world(1, 1600, "Франция 16й век")
+
+            # Подготовки нет в памяти, а чтение из БД тоже упало
+            with self.assertRaises(WorldSetupError):
+                await WorldSetupManager().wait(2, 1600, "Франция 16й век")
+
+    async def test_cancelled_waiter_does_not_cancel_setup(self):
+        manager = WorldSetupManager()
+        task = manager.start(1, 1600, "Франция 16й век")
+
+        waiter = asyncio.create_task(manager.wait(1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+
+        self.assertFalse(task.cancelled())
+        self.assertEqual((await manager.wait(1)).news, "НОВОСТИ")
+        self.assertEqual(manager._tasks, {})  # Забранный результат больше не хранится
+
+    async def test_missing_task_falls_back_to_database(self):
+        stored = WorldSetup(1, METRICS, RESOURCES)
+        with mock.patch("world_setup.load_world_setup", mock.AsyncMock(return_value=stored)):
+            self.assertIs(await WorldSetupManager().wait(1), stored)
+
+        self.assertEqual(self.started, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+# write_behind.py - отложенная пакетная запись некритичных строк в БД
+#
+# Новости и персонажи раньше писались прямо в обработчике игрока: на каждую строку
+# своё соединение и свой коммит, и игрок ждал их, прежде чем получить следующий ответ.
+# Теперь обработчик кладёт строку в очередь (put) и сразу идёт дальше, а очередь пишет накопленное
+# многострочными INSERT, по транзакции на вид строк:
+#  - когда набралось WRITE_BEHIND_BATCH_SIZE строк,
+#  - или раз в WRITE_BEHIND_FLUSH_INTERVAL секунд.
+# Метрики сюда не попадают: это состояние игры, они пишутся в транзакции хода (user_interaction.apply_initiative_result).
+#
+# Если БД недоступна, строки возвращаются в очередь и пишутся при следующей попытке. Если пачку отвергла
+# сама база (битая строка), строки вида пишутся по одной, и отбрасывается только та, что не записалась
+# WRITE_BEHIND_MAX_ATTEMPTS раз. При остановке бота (stop) очередь дописывается до конца.
+#
+# Перед тем как читать мир из БД, обработчик зовёт wait_for_world: если у мира есть
+# незаписанные строки, они записываются сразу, и чтение их видит. wait_for_world возвращает False,
+# если строки мира записать не удалось.
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+from database import run_db, run_in_transaction, save_world_news_batch, save_characters_batch
+from database.connection import is_connection_error
+
+# Включаем логирование
+logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько строк копим до внеочередной записи
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))
+# Как часто записываем накопленное, секунды
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 1))
+# После стольких неудачных попыток записи строка отбрасывается, чтобы одна битая строка не держала очередь
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", 5))
+
+# Виды строк
+WRITE_NEWS = "news"              # (world_id, world_news)
+WRITE_CHARACTERS = "characters"  # (world_id, user_id, character_description)
+
+
+class WriteBehindQueue:
+    def __init__(self, writers, batch_size=WRITE_BEHIND_BATCH_SIZE, interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_attempts=WRITE_BEHIND_MAX_ATTEMPTS):
+        """
+        :param writers: Вид строки -> функция (connection, rows) записи пачки внутри транзакции
+        """
+        self.writers = writers
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+
+        self._pending = []  # (вид, world_id, строка, неудачных попыток) в порядке поступления
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._flush_task = None
+        self._lost_worlds = set()  # Миры, чьи строки отброшены и ещё не сообщены wait_for_world
+
+        # Статистика для /metrics
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.errors = 0
+        self.flush_duration = 0.0
+        self.max_flush_duration = 0.0
+        self.last_flush_duration = 0.0
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    # Кладём строку в очередь; обработчик не ждёт записи
+    def put(self, kind, world_id, row):
+        if kind not in self.writers:
+            raise ValueError(f"Неизвестный вид строки для отложенной записи: {kind}")
+
+        self._pending.append((kind, world_id, row, 0))
+
+        if len(self._pending) >= self.batch_size:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    # Перед чтением мира из БД: дописываем его строки, если они ещё в очереди или пишутся прямо сейчас.
+    # Возвращает False, если строки мира остались незаписанными или были отброшены
+    async def wait_for_world(self, world_id):
+        if self._lock.locked() or any(entry[1] == world_id for entry in self._pending):
+            await self.flush()
+
+        lost = world_id in self._lost_worlds
+        self._lost_worlds.discard(world_id)
+        return not lost and not any(entry[1] == world_id for entry in self._pending)
+
+    async def flush(self):
+        """
+        Записывает всё накопленное: каждый вид строк своей транзакцией, чтобы ошибка одного вида не задевала другие.
+
+        :return: Сколько строк записано
+        """
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            # Группируем по виду, порядок строк внутри вида сохраняется
+            groups = OrderedDict()
+            for entry in batch:
+                groups.setdefault(entry[0], []).append(entry)
+
+            started = time.perf_counter()
+            written = 0
+            retry = []
+            for kind, entries in groups.items():
+                ok, failed = await self._write_group(kind, entries)
+                written += ok
+                retry.extend(failed)
+
+            # Незаписанное - в начало очереди, перед строками, пришедшими во время записи
+            self._pending = retry + self._pending
+
+            duration = time.perf_counter() - started
+            self.flushes += 1
+            self.rows_written += written
+            self.flush_duration += duration
+            self.last_flush_duration = duration
+            self.max_flush_duration = max(self.max_flush_duration, duration)
+
+            logger.info(f"Отложенная запись: {written} из {len(batch)} строк за {duration * 1000:.0f} мс.")
+            return written
+
+    # Пишем строки одного вида; возвращает (сколько записано, строки для повтора)
+    async def _write_group(self, kind, entries):
+        try:
+            await run_db(run_in_transaction, self.writers[kind], [entry[2] for entry in entries])
+            return len(entries), []
+        except Exception as e:
+            self.errors += 1
+            # Ошибка самой базы на данных (не обрыв соединения и не переполненная очередь к БД) - ищем битую строку
+            if len(entries) > 1 and isinstance(e, psycopg2.Error) and not is_connection_error(e):
+                logger.error(f"Отложенная запись: база отвергла пачку {kind} ({e}), пишем по одной строке.")
+                written, retry = 0, []
+                for entry in entries:
+                    ok, failed = await self._write_group(kind, [entry])
+                    written += ok
+                    retry.extend(failed)
+                return written, retry
+
+            logger.error(f"Ошибка отложенной записи {len(entries)} строк {kind}, повторим позже: {e}")
+            return 0, self._count_failure(entries)
+
+    # Увеличиваем счётчик попыток; строки, исчерпавшие попытки, отбрасываем
+    def _count_failure(self, entries):
+        retry = []
+        for kind, world_id, row, attempts in entries:
+            if attempts + 1 >= self.max_attempts:
+                self.rows_dropped += 1
+                self._lost_worlds.add(world_id)
+                logger.error(f"Отложенная запись: строка {kind} мира {world_id} отброшена после {self.max_attempts} неудачных попыток.")
+            else:
+                retry.append((kind, world_id, row, attempts + 1))
+        return retry
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    # Запуск фоновой записи (из post_init приложения)
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Остановка с записью всего накопленного (из post_shutdown приложения, пока пул БД ещё открыт)
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+        await self.flush()
+        if self._pending:
+            logger.error(f"Отложенная запись: при остановке не записаны {len(self._pending)} строк.")
+
+    # Статистика в формате Prometheus
+    def render_prometheus(self):
+        lines = [
+            "# HELP write_behind_pending Строки в очереди отложенной записи",
+            "# TYPE write_behind_pending gauge",
+            f"write_behind_pending {self.pending}",
+            "# HELP write_behind_rows_total Строки отложенной записи",
+            "# TYPE write_behind_rows_total counter",
+            f'write_behind_rows_total{{result="written"}} {self.rows_written}',
+            f'write_behind_rows_total{{result="dropped"}} {self.rows_dropped}',
+            "# HELP write_behind_errors_total Неудачные попытки записи",
+            "# TYPE write_behind_errors_total counter",
+            f"write_behind_errors_total {self.errors}",
+            "# HELP write_behind_flush_seconds Время записи пачки",
+            "# TYPE write_behind_flush_seconds summary",
+            f"write_behind_flush_seconds_count {self.flushes}",
+            f"write_behind_flush_seconds_sum {self.flush_duration:.6f}",
+            "# HELP write_behind_flush_seconds_max Самая долгая запись пачки",
+            "# TYPE write_behind_flush_seconds_max gauge",
+            f"write_behind_flush_seconds_max {self.max_flush_duration:.6f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+write_behind = WriteBehindQueue({
+    WRITE_NEWS: save_world_news_batch,
+    WRITE_CHARACTERS: save_characters_batch,
+})
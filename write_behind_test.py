@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import psycopg2
+
+from write_behind import WriteBehindQueue
+
+
+# Вместо пула потоков и транзакции: зовём запись сразу, без соединения
+async def fake_run_db(func, write, rows):
+    return write(None, rows)
+
+
+async def failing_run_db(func, write, rows):
+    raise ConnectionError("БД недоступна")
+
+
+# База отвергает любую пачку, где есть битая строка
+async def rejecting_run_db(func, write, rows):
+    if any("битая" in str(row) for row in rows):
+        raise psycopg2.DataError("invalid input")
+    return write(None, rows)
+
+
+class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.written = []
+        writer = lambda kind: lambda connection, rows: self.written.append((kind, list(rows)))
+        self.queue = WriteBehindQueue({"news": writer("news"), "metrics": writer("metrics")},
+                                      batch_size=3, interval=60, max_attempts=2)
+
+    @mock.patch("write_behind.run_db", fake_run_db)
+    def test_flushes_batch_by_size_grouped_by_kind(self):
+        async def scenario():
+            self.queue.put("news", 1, (1, "новость 1"))
+            self.queue.put("metrics", 1, (1, {"economy_metric": 5}))
+            self.assertEqual(self.written, [])  # Обработчик не ждёт записи
+            self.queue.put("news", 2, (2, "новость 2"))
+            await self.queue._flush_task
+
+        asyncio.run(scenario())
+
+        self.assertEqual(self.written, [
+            ("news", [(1, "новость 1"), (2, "новость 2")]),
+            ("metrics", [(1, {"economy_metric": 5})]),
+        ])
+        self.assertEqual(self.queue.pending, 0)
+        self.assertEqual(self.queue.rows_written, 3)
+        self.assertEqual(self.queue.flushes, 1)
+
+    def test_failed_flush_keeps_order_then_drops(self):
+        async def scenario():
+            self.queue.put("news", 1, (1, "старая"))
+            with mock.patch("write_behind.run_db", failing_run_db):
+                await self.queue.flush()
+                self.queue.put("news", 1, (1, "новая"))
+                self.assertEqual([entry[2] for entry in self.queue._pending], [(1, "старая"), (1, "новая")])
+
+                await self.queue.flush()  # Вторая неудача старой строки - она отброшена, новая ждёт
+                self.assertEqual([entry[2] for entry in self.queue._pending], [(1, "новая")])
+                self.assertEqual(self.queue.rows_dropped, 1)
+
+                # Обработчик перед чтением мира пробует ещё раз и узнаёт о потере
+                self.assertFalse(await self.queue.wait_for_world(1))
+
+        asyncio.run(scenario())
+
+        self.assertEqual(self.queue.pending, 0)
+        self.assertEqual(self.queue.rows_dropped, 2)
+        self.assertEqual(self.queue.errors, 3)
+
+    @mock.patch("write_behind.run_db", rejecting_run_db)
+    def test_bad_row_does_not_poison_batch(self):
+        async def scenario():
+            self.queue.put("news", 1, (1, "новость"))
+            self.queue.put("news", 2, (2, "битая"))
+            self.queue.put("metrics", 3, (3, {"economy_metric": 5}))
+            await self.queue.flush()
+            await self.queue.flush()  # Битая строка исчерпала попытки
+            return await self.queue.wait_for_world(1), await self.queue.wait_for_world(2)
+
+        self.assertEqual(asyncio.run(scenario()), (True, False))
+
+        self.assertEqual(self.written, [
+            ("news", [(1, "новость")]),
+            ("metrics", [(3, {"economy_metric": 5})]),
+        ])
+        self.assertEqual(self.queue.rows_written, 2)
+        self.assertEqual(self.queue.rows_dropped, 1)
+        self.assertEqual(self.queue.pending, 0)
+
+    @mock.patch("write_behind.run_db", fake_run_db)
+    def test_wait_for_world_flushes_only_its_rows(self):
+        async def scenario():
+            self.queue.put("news", 1, (1, "новость"))
+            await self.queue.wait_for_world(2)
+            self.assertEqual(self.queue.pending, 1)
+            await self.queue.wait_for_world(1)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(self.written, [("news", [(1, "новость")])])
+
+    def test_unknown_kind_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.queue.put("characters", 1, (1, 1, "персонаж"))
+
+
+if __name__ == '__main__':
+    unittest.main()